@@ -1,15 +1,32 @@
+import hashlib
 from datetime import datetime
 from rest_framework import generics, status, views, permissions
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.contrib.auth import authenticate, login, logout
+from django.http import HttpResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from django.db.models import Count, Q
 from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView, SpectacularSwaggerView
+from .batching import BatchError, execute_batch, validate_operations
+from .bundles import BundleError, import_course_bundle, import_course_manifest, stream_json_bundle, stream_zip_bundle
+from .cloning import clone_course
+from .consumers import broadcast_chat_message, outbound_metrics
+from .fast_serializers import *
+from .leaderboards import get_course_leaderboards
+from .mixins import ConditionalGetMixin, ExpandablePrefetchMixin, FastListMixin, ResponseCacheMixin
 from .models import *
+from .pagination import RankedPagination
+from .schema import get_schema_artifact
+from .search import highlight_courses, search_courses
 from .serializers import *
 from .tasks import *
 
@@ -52,27 +69,26 @@ class UserLogoutView(views.APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 @extend_schema(tags=["Users"])
-class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = User.objects.prefetch_related(
-        "enrollments",
-        "status_updates",
-        "course_reviews"
-    )
+class UserDetailView(ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = User.objects.all()
     serializer_class = UserSerializer
 
     def perform_update(self, serializer):
-        user = serializer.save()
-        if "profile_picture" in serializer.validated_data:
+        kwargs = {}
+        picture_changed = "profile_picture" in serializer.validated_data
+        if picture_changed:
+            # The variants are the previous picture's until resize_profile_picture renders the new one
+            kwargs["profile_picture_variants"] = {}
+        user = serializer.save(**kwargs)
+        if picture_changed and user.profile_picture:
             resize_profile_picture.delay(user.pk)
 
 @extend_schema(tags=["Users"])
-class UserListView(generics.ListAPIView):
-    queryset = User.objects.prefetch_related(
-        "enrollments",
-        "status_updates",
-        "course_reviews"
-    )
+class UserListView(FastListMixin, ExpandablePrefetchMixin, generics.ListAPIView):
+    queryset = User.objects.all()
+    cursor_ordering = ("-date_joined", "-id")
     serializer_class = UserSerializer
+    fast_serializer = user_values_serializer
 
 @extend_schema(tags=["Status Updates"])
 class StatusUpdateDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -140,20 +156,34 @@ class UserBlockView(
 
 
 # Courses
+def save_course(serializer, **kwargs) -> Course:
+    """Saves a CourseSerializer, rendering the cover's variants in the background when a new one was sent"""
+    course = serializer.save(**kwargs)
+    if "cover_image" in serializer.validated_data:
+        course.clear_cover_variants()
+        if course.cover_image:
+            process_course_cover.delay(course.pk)
+    return course
+
 @extend_schema(tags=["Courses"])
-class CourseListCreateView(generics.ListCreateAPIView):
-    queryset = Course.objects.prefetch_related(
-        "modules",
-        "modules__lessons",
-        "modules__assignments",
-        "enrollments__student",
-        "status_updates",
-    )
+class CourseListCreateView(FastListMixin, ExpandablePrefetchMixin, generics.ListCreateAPIView):
+    queryset = Course.objects.all()
     serializer_class = CourseSerializer
+    fast_serializer = course_values_serializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 20
+
+    def get_queryset(self):
+        queryset = super().get_queryset().with_status()
+        course_status = self.request.query_params.get("status")
+        if course_status:
+            if course_status not in CourseQuerySet.STATUSES:
+                raise DRFValidationError({"status": f"Must be one of: {', '.join(CourseQuerySet.STATUSES)}"})
+            queryset = queryset.filter_status(course_status)
+        return queryset
 
     def perform_create(self, serializer):
-        serializer.save(taught_by=self.request.user)
+        save_course(serializer, taught_by=self.request.user)
 
     def create(self, request, *args, **kwargs):
         user = self.request.user
@@ -165,16 +195,43 @@ class CourseListCreateView(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 @extend_schema(tags=["Courses"])
-class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Course.objects.prefetch_related(
-        "modules",
-        "modules__lessons",
-        "modules__assignments",
-        "enrollments__student",
-        "status_updates",
-    )
+class CourseSearchView(generics.ListAPIView):
+    """Ranked full-text search over published courses, with the matched terms highlighted. Query with ?q="""
+    serializer_class = CourseSearchResultSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RankedPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            return Course.objects.none()
+        queryset = Course.objects.filter(is_published=True).exclude(
+            taught_by__in=self.request.user.get_blocked_by()
+        ).only("id", "title", "description", "taught_by", "start_date", "end_date")
+        return highlight_courses(search_courses(queryset, query), query)
+
+@extend_schema(tags=["Courses"])
+class TrendingCoursesView(views.APIView):
+    """Precomputed course leaderboards: most enrolled in the last 7 and 30 days, highest rated and newest"""
+    permission_classes = [permissions.AllowAny]
+    boards = ("most_enrolled_7d", "most_enrolled_30d", "highest_rated", "newest")
+
+    def get(self, request):
+        leaderboards = get_course_leaderboards()
+        blocked_by = set()
+        if request.user.is_authenticated:
+            blocked_by = {user.pk for user in request.user.get_blocked_by()}
+        data = {"generated_at": leaderboards["generated_at"]}
+        for board in self.boards:
+            data[board] = [course for course in leaderboards[board] if course["taught_by"]["id"] not in blocked_by]
+        return Response(data, status=status.HTTP_200_OK)
+
+@extend_schema(tags=["Courses"])
+class CourseDetailView(ConditionalGetMixin, ResponseCacheMixin, ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Course.objects.with_status()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 15
 
     def update(self, request, *args, **kwargs):
         user = self.request.user
@@ -183,6 +240,68 @@ class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
             return Response({"error": "Only the course's teacher can edit this course"}, status=status.HTTP_403_FORBIDDEN)
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        save_course(serializer)
+
+@extend_schema(tags=["Courses"])
+class CourseBundleView(views.APIView):
+    """
+    Exports the course's modules, lessons and assignments as a streamed bundle (?bundle=zip, the default, or
+    ?bundle=json), or imports a bundle into the course: a ZIP/JSON file uploaded as "bundle", or a JSON body
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    content_types = {"zip": "application/zip", "json": "application/json"}
+
+    def get_course(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if request.user != course.taught_by:
+            return None
+        return course
+
+    def get(self, request, pk):
+        course = self.get_course(request, pk)
+        if course is None:
+            return Response({"error": "Only the course's teacher can export this course"}, status=status.HTTP_403_FORBIDDEN)
+        kind = request.query_params.get("bundle", "zip")
+        if kind not in self.content_types:
+            return Response({"error": "bundle must be one of: zip, json"}, status=status.HTTP_400_BAD_REQUEST)
+
+        stream = stream_zip_bundle(course) if kind == "zip" else stream_json_bundle(course)
+        response = StreamingHttpResponse(stream, content_type=self.content_types[kind])
+        response["Content-Disposition"] = f'attachment; filename="course-{course.pk}.{kind}"'
+        return response
+
+    def post(self, request, pk):
+        course = self.get_course(request, pk)
+        if course is None:
+            return Response({"error": "Only the course's teacher can import into this course"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            if "bundle" in request.FILES:
+                counts = import_course_bundle(course, request.FILES["bundle"])
+            else:
+                counts = import_course_manifest(course, request.data)
+        except BundleError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
+
+@extend_schema(
+    tags=["Courses"],
+    request=CourseCloneSerializer,
+    responses={201: CourseSerializer, 403: MessageSerializer}
+)
+class CourseCloneView(views.APIView):
+    """Copies the course's modules, lessons and assignments into a new, unpublished run with the given dates"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        course = get_object_or_404(Course, pk=pk)
+        if request.user != course.taught_by:
+            return Response({"error": "Only the course's teacher can clone this course"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = CourseCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        clone = clone_course(course, **serializer.validated_data)
+        return Response(CourseSerializer(Course.objects.with_status().get(pk=clone.pk)).data, status=status.HTTP_201_CREATED)
+
 @extend_schema(tags=["Enrollments"])
 class EnrollmentDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Enrollment.objects.all()
@@ -200,8 +319,11 @@ class EnrollmentDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(serializer.data)
 
 @extend_schema(tags=["Enrollments"])
-class EnrollmentListCreateView(generics.ListCreateAPIView):
+class EnrollmentListCreateView(FastListMixin, generics.ListCreateAPIView):
     serializer_class = EnrollmentSerializer
+    fast_serializer = enrollment_values_serializer
+    cursor_ordering = ("-activated_on", "-id")
+    query_budget = 15
 
     def get_queryset(self):
         course = get_object_or_404(Course, pk=self.kwargs.get("pk"))
@@ -251,8 +373,9 @@ class CourseReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CourseReviewSerializer
 
 @extend_schema(tags=["Course Reviews"])
-class CourseReviewListCreateView(generics.ListCreateAPIView):
+class CourseReviewListCreateView(FastListMixin, generics.ListCreateAPIView):
     serializer_class = CourseReviewSerializer
+    fast_serializer = course_review_values_serializer
 
     def get_queryset(self):
         course = get_object_or_404(Course, pk=self.kwargs.get("pk"))
@@ -271,23 +394,19 @@ class CourseReviewListCreateView(generics.ListCreateAPIView):
 
 # Modules
 @extend_schema(tags=["Modules"])
-class ModuleDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Module.objects.prefetch_related(
-        "lessons",
-        "assignments"
-    )
+class ModuleDetailView(ConditionalGetMixin, ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
+    course_lookup = "modules"
+    queryset = Module.objects.all()
     serializer_class = ModuleSerializer
     
 @extend_schema(tags=["Modules"])
-class ModuleListCreateView(generics.ListCreateAPIView):
+class ModuleListCreateView(ResponseCacheMixin, ExpandablePrefetchMixin, generics.ListCreateAPIView):
     serializer_class = ModuleSerializer
+    query_budget = 15
 
     def get_queryset(self):
         course = get_object_or_404(Course, pk=self.kwargs.get("pk"))
-        return Module.objects.filter(course=course).prefetch_related(
-            "lessons",
-            "assignments"
-        )
+        return Module.objects.filter(course=course)
     
     def perform_create(self, serializer):
         course = get_object_or_404(Course, pk=self.kwargs.get("pk"))
@@ -298,31 +417,28 @@ class ModuleListCreateView(generics.ListCreateAPIView):
 
 # Lessons
 @extend_schema(tags=["Lessons"])
-class LessonDetailView(generics.RetrieveUpdateDestroyAPIView):
+class LessonDetailView(ConditionalGetMixin, ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
+    course_lookup = "modules__lessons"
     serializer_class = LessonSerializer
 
     def get_queryset(self):
         user = self.request.user
         # If user is a student, return their progress in this lesson
         if user.role == User.UserRole.STUDENT:
-            return Lesson.objects.filter(user_progress__student=user).prefetch_related(
-                "user_progress",
-            )
+            return Lesson.objects.filter(user_progress__student=user)
         # If user is a teacher or admin, return all student's progress in this lesson
         else:
-            return Lesson.objects.prefetch_related(
-                "user_progress",
-            )
+            return Lesson.objects.all()
 
 @extend_schema(tags=["Lessons"])
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonListCreateView(ResponseCacheMixin, ExpandablePrefetchMixin, generics.ListCreateAPIView):
+    course_lookup = "modules"
     serializer_class = LessonSerializer
+    query_budget = 15
 
     def get_queryset(self):
         module = get_object_or_404(Module, pk=self.kwargs.get("pk"))
-        return Lesson.objects.filter(module=module).prefetch_related(
-            "user_progress"
-        )
+        return Lesson.objects.filter(module=module)
     
     def perform_create(self, serializer):
         module = get_object_or_404(Module, pk=self.kwargs.get("pk"))
@@ -367,21 +483,18 @@ class LessonProgressDetailView(
 
 # Assignments
 @extend_schema(tags=["Assignments"])
-class AssignmentDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Assignment.objects.prefetch_related(
-        "assignment_submissions",
-    )
+class AssignmentDetailView(ConditionalGetMixin, ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
+    course_lookup = "modules__assignments"
+    queryset = Assignment.objects.all()
     serializer_class = AssignmentSerializer
 
 @extend_schema(tags=["Assignments"])
-class AssignmentListCreateView(generics.ListCreateAPIView):
+class AssignmentListCreateView(ExpandablePrefetchMixin, generics.ListCreateAPIView):
     serializer_class = AssignmentSerializer
 
     def get_queryset(self):
         module = get_object_or_404(Module, pk=self.kwargs.get("pk"))
-        return Assignment.objects.filter(module=module).prefetch_related(
-            "assignment_submissions"
-        )
+        return Assignment.objects.filter(module=module)
     
     def perform_create(self, serializer):
         module = get_object_or_404(Module, pk=self.kwargs.get("pk"))
@@ -450,6 +563,7 @@ class AssignmentSubmissionGradeView(views.APIView):
 @extend_schema(tags=["Assignments"])
 class AssignmentSubmissionListCreateView(generics.ListCreateAPIView):
     serializer_class = AssignmentSubmissionSerializer
+    cursor_ordering = ("-submitted_on", "-id")
 
     def get_queryset(self):
         assignment = get_object_or_404(Assignment, pk=self.kwargs.get("pk"))
@@ -473,22 +587,18 @@ class AssignmentSubmissionListCreateView(generics.ListCreateAPIView):
 
 # Chats
 @extend_schema(tags=["Chats"])
-class ChatDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ChatDetailView(ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ChatSerializer
 
     def get_queryset(self):
-        return Chat.objects.filter(
-            participants__user=self.request.user
-        ).prefetch_related("chat_messages", "participants__user")
+        return Chat.objects.filter(participants__user=self.request.user)
 
 @extend_schema(tags=["Chats"])
-class ChatListCreateView(generics.ListCreateAPIView):
+class ChatListCreateView(ExpandablePrefetchMixin, generics.ListCreateAPIView):
     serializer_class = ChatSerializer
 
     def get_queryset(self):
-        return Chat.objects.filter(
-            participants__user=self.request.user
-        ).prefetch_related("chat_messages", "participants__user").distinct()
+        return Chat.objects.filter(participants__user=self.request.user).distinct()
     
     def create(self, request, *args, **kwargs):
         user_ids = request.data.get("user_ids")
@@ -537,13 +647,15 @@ class ChatListCreateView(generics.ListCreateAPIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 @extend_schema(tags=["Chats"])
-class ChatMessageDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ChatMessageDetailView(ExpandablePrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ChatMessage.objects.all()
     serializer_class = ChatMessageSerializer
 
 @extend_schema(tags=["Chats"])
-class ChatMessageListCreateView(generics.ListCreateAPIView):
+class ChatMessageListCreateView(ExpandablePrefetchMixin, generics.ListCreateAPIView):
     serializer_class = ChatMessageSerializer
+    cursor_ordering = ("-sent_at", "-id")
+    query_budget = 15
         
     def get_queryset(self):
         chat = get_object_or_404(
@@ -562,9 +674,18 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
             message = serializer.save(chat=chat, sender=user)
             for file in self.request.FILES.getlist('attachments'):
                 ChatMessageAttachments.objects.create(chat_message=message, attachment=file)
+            broadcast_chat_message(message)
         except DjangoValidationError as e:
             raise DRFValidationError(e.message)
 
+@extend_schema(tags=["Chats"])
+class ChatMetricsView(views.APIView):
+    """Outbound websocket queue metrics for this worker process"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(outbound_metrics.snapshot(), status=status.HTTP_200_OK)
+
 @extend_schema(tags=["Chats"])
 class ChatParticipantDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = ChatParticipant.objects.all()
@@ -573,6 +694,7 @@ class ChatParticipantDetailView(generics.RetrieveUpdateDestroyAPIView):
 @extend_schema(tags=["Chats"])
 class ChatParticipantListCreateView(generics.ListCreateAPIView):
     serializer_class = ChatParticipantSerializer
+    cursor_ordering = ("-id",)
 
     def get_queryset(self):
         chat = get_object_or_404(Chat, pk=self.kwargs.get("pk"))
@@ -585,6 +707,17 @@ class ChatParticipantListCreateView(generics.ListCreateAPIView):
         except DjangoValidationError as e:
             raise DRFValidationError(e.message)
 
+@extend_schema(tags=["Users"])
+class NotificationListView(FastListMixin, generics.ListAPIView):
+    """The current user's notifications, newest first"""
+    serializer_class = NotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    fast_serializer = notification_values_serializer
+    query_budget = 10
+
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user)
+
 @extend_schema(
     tags=["Users"],
     responses={200: MessageSerializer, 400: MessageSerializer}
@@ -599,4 +732,70 @@ class NotificationReadView(views.APIView):
             notification.save(update_fields=["read"])
             return Response({"message": "Notification dismissed successfully"}, status=status.HTTP_200_OK)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+# Batch
+@extend_schema(
+    tags=["Batch"],
+    request=BatchOperationSerializer(many=True),
+    responses={200: BatchResultSerializer(many=True), 400: MessageSerializer}
+)
+class BatchView(views.APIView):
+    """
+    Runs a list of relative GET/POST sub-requests in one round trip, in order and as the authenticated user,
+    returning a list of {status, headers, body} results. Sub-requests aren't atomic and can't be streamed
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    # Room for a full batch of sub-requests within their own budgets
+    query_budget = 300
+
+    def post(self, request, *args, **kwargs):
+        try:
+            operations = validate_operations(request.data)
+        except BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(execute_batch(request, operations), status=status.HTTP_200_OK)
+
+# Schema
+def strong_etag_response(request, content: bytes, digest: str, content_type: str):
+    """Serves content under a strong ETag of its digest, answering 304 while the client's copy is current"""
+    etag = quote_etag(digest)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type=content_type)
+    response["ETag"] = etag
+    # Clients may keep the schema but revalidate it on every use, which costs a 304 once it is unchanged
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+class SchemaView(SpectacularAPIView):
+    """
+    drf-spectacular's schema view, answering from the schema prebuilt by build_openapi_schema while it
+    matches the sources. Without a fresh build, or when asked for another language or API version, the
+    schema is generated live
+    """
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        artifact = get_schema_artifact()
+        if artifact is None or request.GET.keys() - {"format"}:
+            return super().get(request, *args, **kwargs)
+
+        renderer = request.accepted_renderer
+        content, digest = artifact[renderer.format]
+        response = strong_etag_response(request, content, digest, renderer.media_type)
+        response["Content-Disposition"] = f'inline; filename="{self._get_filename(request, None)}"'
+        return response
+
+class SwaggerView(SpectacularSwaggerView):
+    """
+    The Swagger UI page, rendered the same for everyone so it can carry a strong ETag: the page reads the
+    CSRF token from its cookie instead of having it rendered in
+    """
+    @extend_schema(exclude=True)
+    def get(self, request, *args, **kwargs):
+        context = super().get(request, *args, **kwargs).data
+        content = render_to_string(self.template_name, context).encode()
+        get_token(request)
+        response = strong_etag_response(request, content, hashlib.sha256(content).hexdigest(), "text/html; charset=utf-8")
+        response["Cross-Origin-Opener-Policy"] = "unsafe-none"
+        return response
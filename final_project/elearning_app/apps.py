@@ -6,4 +6,6 @@ class ElearningAppConfig(AppConfig):
     name = "elearning_app"
 
     def ready(self):
-        import elearning_app.signals
\ No newline at end of file
+        import elearning_app.checks
+        import elearning_app.signals
+        import elearning_app.metrics
\ No newline at end of file
@@ -0,0 +1,219 @@
+import io
+from channels.layers import get_channel_layer
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.exceptions import AuthenticationFailed, ParseError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .consumers import chat_group_name, chat_message_event
+from .fast_serializers import *
+from .models import *
+from .pagination import AsyncKeysetPagination
+from .renderers import FastJSONParser, FastJSONRenderer
+
+# Async-native versions of high-frequency, low-compute API endpoints. These are plain Django views with
+# coroutine handlers, served on the event loop under ASGI instead of in a worker thread like DRF's views. The
+# ORM calls are the async ones; DRF's authentication, parsing and pagination are redone here where they
+# would run queries synchronously
+
+_jwt_authentication = JWTAuthentication()
+
+def json_response(data, status: int = status.HTTP_200_OK) -> HttpResponse:
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type="application/json")
+
+async def aget_token_user(token) -> User:
+    """JWTAuthentication.get_user with the async ORM"""
+    try:
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except KeyError as e:
+        raise InvalidToken("Token contained no recognizable user identification") from e
+
+    user = await User.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).afirst()
+    if user is None:
+        raise AuthenticationFailed("User not found", code="user_not_found")
+    if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    if jwt_settings.CHECK_REVOKE_TOKEN and token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+        raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+    return user
+
+async def aauthenticate(request):
+    """
+    Authenticates like DEFAULT_AUTHENTICATION_CLASSES: a JWT bearer token if the request carries one, else the
+    session. Returns (user, whether the session authenticated it), raising AuthenticationFailed for a bad token
+    """
+    header = _jwt_authentication.get_header(request)
+    raw_token = _jwt_authentication.get_raw_token(header) if header is not None else None
+    if raw_token is not None:
+        # Validating an access token only checks its signature and claims, without queries
+        return await aget_token_user(_jwt_authentication.get_validated_token(raw_token)), False
+    return await request.auser(), True
+
+def enforce_csrf(request):
+    """SessionAuthentication.enforce_csrf: returns the reason a session request fails the CSRF check, or None"""
+    check = CSRFCheck(lambda request: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {})
+
+class AsyncAPIView(View):
+    """
+    Base of the async API views: authenticates the request (401 unless it succeeds) and, as DRF does, only
+    checks CSRF for session-authenticated unsafe requests, since bearer tokens aren't sent by browsers on
+    their own. Handlers are coroutines returning json_response()s
+    """
+    query_budget = 10
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # CsrfViewMiddleware would check token-authenticated requests too
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user, via_session = await aauthenticate(request)
+        except AuthenticationFailed as e:
+            return json_response({"error": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+        if not user.is_authenticated or not user.is_active:
+            return json_response({"error": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+        if via_session and request.method not in SAFE_METHODS:
+            reason = enforce_csrf(request)
+            if reason:
+                return json_response({"error": f"CSRF Failed: {reason}"}, status=status.HTTP_403_FORBIDDEN)
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    def parse_body(self, request) -> dict:
+        """The request's JSON object, or its form fields. Raises ParseError for anything else"""
+        if request.content_type == "application/json":
+            data = FastJSONParser().parse(io.BytesIO(request.body))
+            if not isinstance(data, dict):
+                raise ParseError("Expected a JSON object")
+            return data
+        return request.POST
+
+# Chats
+class AsyncChatMessageListCreateView(AsyncAPIView):
+    """
+    Async ChatMessageListCreateView: lists a chat's messages newest first, a keyset page at a time, and posts
+    messages (with optional multipart `attachments`), which are also sent to the chat's websocket clients
+    """
+    query_budget = 6
+
+    async def get_chat_id(self, request, pk):
+        return await Chat.objects.filter(pk=pk, participants__user=request.user).values_list("pk", flat=True).afirst()
+
+    async def get(self, request, pk):
+        if await self.get_chat_id(request, pk) is None:
+            return json_response({"error": "Chat not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        paginator = AsyncKeysetPagination(ordering=("-sent_at", "-id"))
+        try:
+            rows = await paginator.paginate_queryset(chat_message_values_serializer.values(ChatMessage.objects.filter(chat_id=pk)), request)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages = chat_message_values_serializer.render(rows, request=request)
+        attachments = {message["id"]: [] for message in messages}
+        attachment_rows = chat_message_attachment_values_serializer.values(
+            ChatMessageAttachments.objects.filter(chat_message_id__in=list(attachments)).order_by("id"),
+            extra=["chat_message_id"],
+        )
+        async for row in attachment_rows:
+            attachments[row["chat_message_id"]].extend(chat_message_attachment_values_serializer.render([row], request=request))
+        for message in messages:
+            message["attachments"] = attachments[message["id"]]
+        return json_response(paginator.get_paginated_data(messages))
+
+    async def post(self, request, pk):
+        if await self.get_chat_id(request, pk) is None:
+            return json_response({"error": "Chat not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            data = self.parse_body(request)
+        except ParseError as e:
+            return json_response({"error": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+
+        text = data.get("text")
+        max_length = ChatMessage._meta.get_field("text").max_length
+        if not isinstance(text, str) or not text.strip():
+            return json_response({"error": "A message needs some text"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(text) > max_length:
+            return json_response({"error": f"Messages can't be longer than {max_length} characters"}, status=status.HTTP_400_BAD_REQUEST)
+
+        message = await ChatMessage.objects.acreate(chat_id=pk, sender=request.user, text=text)
+        attachments = [
+            await ChatMessageAttachments.objects.acreate(chat_message=message, attachment=file)
+            for file in request.FILES.getlist("attachments")
+        ]
+
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            await channel_layer.group_send(chat_group_name(pk), chat_message_event(message))
+
+        data = chat_message_values_serializer.render([{
+            "id": message.pk, "chat": message.chat_id, "sender": message.sender_id, "sent_at": message.sent_at, "text": message.text,
+        }], request=request)[0]
+        data["attachments"] = chat_message_attachment_values_serializer.render(
+            [{"id": attachment.pk, "attachment": attachment.attachment.name} for attachment in attachments], request=request
+        )
+        return json_response(data, status=status.HTTP_201_CREATED)
+
+# Notifications
+class AsyncNotificationListView(AsyncAPIView):
+    """Async NotificationListView: the current user's notifications, newest first"""
+    # The session and user (or the token's user), then the page
+    query_budget = 3
+
+    async def get(self, request):
+        paginator = AsyncKeysetPagination(ordering=("-created_at", "-id"))
+        try:
+            rows = await paginator.paginate_queryset(
+                notification_values_serializer.values(Notification.objects.filter(user=request.user)), request
+            )
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return json_response(paginator.get_paginated_data(notification_values_serializer.render(rows, request=request)))
+
+class AsyncNotificationReadView(AsyncAPIView):
+    """Async NotificationReadView, in a single UPDATE. Only the user's own notifications can be dismissed"""
+    query_budget = 3
+
+    async def post(self, request, pk):
+        updated = await Notification.objects.filter(pk=pk, user=request.user).aupdate(read=True)
+        if not updated:
+            return json_response({"error": "Notification not found"}, status=status.HTTP_404_NOT_FOUND)
+        return json_response({"message": "Notification dismissed successfully"})
+
+# Lessons
+class AsyncLessonProgressView(AsyncAPIView):
+    """
+    Async LessonProgressDetailView.put: marks a lesson as completed (or not) for the current student, who must
+    be actively enrolled in the lesson's course
+    """
+    # The progress signals recompute the student's course progress and may complete their enrollment
+    query_budget = 30
+
+    async def put(self, request, pk):
+        if await request.user.arole() != User.UserRole.STUDENT:
+            return json_response({"message": "Only students can update their progress in a module"}, status=status.HTTP_403_FORBIDDEN)
+        course_id = await Lesson.objects.filter(pk=pk).values_list("module__course_id", flat=True).afirst()
+        if course_id is None:
+            return json_response({"error": "Lesson not found"}, status=status.HTTP_404_NOT_FOUND)
+        enrolled = Enrollment.objects.filter(student=request.user, course_id=course_id, status=Enrollment.EnrollmentStatus.ACTIVE)
+        if not await enrolled.aexists():
+            return json_response({"message": "Only students enrolled in the course can update their progress"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            data = self.parse_body(request)
+        except ParseError as e:
+            return json_response({"error": str(e.detail)}, status=status.HTTP_400_BAD_REQUEST)
+
+        completed = data.get("completed")
+        if not isinstance(completed, bool):
+            return json_response({"error": "completed must be true or false"}, status=status.HTTP_400_BAD_REQUEST)
+        await LessonProgress.objects.aupdate_or_create(student=request.user, lesson_id=pk, defaults={"completed": completed})
+        return json_response({"message": "User's lesson progress updated successfully"})
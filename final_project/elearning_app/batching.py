@@ -0,0 +1,123 @@
+import io
+import json
+from urllib.parse import urlsplit
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from .request_cache import clear_request_cache, request_cache_scope
+
+BATCH_METHODS = ("GET", "POST")
+# Headers of the sub-responses a client can act on, copied into the results
+BATCH_RESPONSE_HEADERS = ("ETag", "Last-Modified", "Location", "X-Cache")
+# Request metadata describing the batch itself, not its sub-requests
+EXCLUDED_META_PREFIXES = ("CONTENT_", "HTTP_IF_", "wsgi.input")
+
+class BatchError(Exception):
+    """Raised when a batch is malformed"""
+
+def validate_operations(operations) -> list:
+    """Checks a batch's sub-requests, returning them normalized with their URLs split into path and query"""
+    max_requests = getattr(settings, "API_BATCH_MAX_REQUESTS", 20)
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("The batch must be a non-empty list of requests")
+    if len(operations) > max_requests:
+        raise BatchError(f"A batch can hold at most {max_requests} requests")
+
+    normalized = []
+    for i, operation in enumerate(operations):
+        where = f"requests[{i}]"
+        if not isinstance(operation, dict):
+            raise BatchError(f"{where} must be an object")
+        method = operation.get("method", "GET")
+        if method not in BATCH_METHODS:
+            raise BatchError(f"{where}.method must be one of: {', '.join(BATCH_METHODS)}")
+        url = operation.get("url")
+        parts = urlsplit(url) if isinstance(url, str) else None
+        if parts is None or parts.scheme or parts.netloc or not parts.path.startswith("/api/"):
+            raise BatchError(f"{where}.url must be a relative /api/ path")
+        body = operation.get("body")
+        if method == "GET" and body is not None:
+            raise BatchError(f"{where} is a GET and can't have a body")
+        normalized.append({"method": method, "path": parts.path, "query": parts.query, "body": body})
+    return normalized
+
+def build_sub_request(request, operation) -> WSGIRequest:
+    """
+    Builds the Django request of a sub-request from the batch's own metadata. The batch's user is forced on
+    it, so DRF skips authentication (and the CSRF check the batch itself already passed) and never reloads
+    the user
+    """
+    body = b"" if operation["body"] is None else json.dumps(operation["body"]).encode()
+    environ = {key: value for key, value in request.META.items() if not key.startswith(EXCLUDED_META_PREFIXES)}
+    environ.update({
+        "REQUEST_METHOD": operation["method"],
+        "PATH_INFO": operation["path"],
+        "QUERY_STRING": operation["query"],
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.url_scheme": request.scheme,
+    })
+    sub_request = WSGIRequest(environ)
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    if hasattr(request, "session"):
+        sub_request.session = request.session
+    return sub_request
+
+def _result(status_code: int, body, headers=None) -> dict:
+    return {"status": status_code, "headers": headers or {}, "body": body}
+
+def response_result(response) -> dict:
+    """Turns a sub-response into its batch result, using a DRF response's data as is instead of rendering it"""
+    headers = {name: response[name] for name in BATCH_RESPONSE_HEADERS if response.has_header(name)}
+    if response.streaming:
+        return _result(406, {"error": "Streamed responses can't be batched"})
+    if isinstance(response, Response):
+        return _result(response.status_code, response.data, headers)
+
+    if hasattr(response, "render"):
+        response.render()
+    content = response.content.decode(response.charset)
+    if response.get("Content-Type", "").startswith("application/json") and content:
+        content = json.loads(content)
+    return _result(response.status_code, content, headers)
+
+def dispatch_operation(request, operation) -> dict:
+    """Resolves a sub-request's path and calls its view in-process, skipping the middleware"""
+    try:
+        match = resolve(operation["path"])
+    except Resolver404:
+        return _result(404, {"error": "Not found"})
+    if match.url_name == "api_batch":
+        return _result(400, {"error": "Batches can't be nested"})
+    if iscoroutinefunction(match.func):
+        # Async views return a coroutine and authenticate themselves from the request's own credentials
+        return _result(400, {"error": "Async endpoints can't be batched, use their synchronous /api/ versions"})
+
+    sub_request = build_sub_request(request, operation)
+    sub_request.resolver_match = match
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+    except Http404:
+        return _result(404, {"error": "Not found"})
+    return response_result(response)
+
+def execute_batch(request, operations) -> list:
+    """
+    Runs the validated sub-requests in order on behalf of the batch's user, returning their results. Course
+    versions, the user's blockers and the like are looked up once for the whole batch, and looked up anew
+    after each POST since it may have changed them. Sub-requests aren't atomic: each one commits or fails
+    on its own
+    """
+    results = []
+    with request_cache_scope():
+        for operation in operations:
+            results.append(dispatch_operation(request, operation))
+            if operation["method"] not in SAFE_METHODS:
+                clear_request_cache()
+    return results
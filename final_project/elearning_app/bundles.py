@@ -0,0 +1,347 @@
+import json
+import posixpath
+import zipfile
+import zlib
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.utils import validate_file_name
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from django.utils.text import Truncator
+from .caching import bump_course_content_version
+from .models import *
+from .search import schedule_course_search_update
+
+BUNDLE_FORMAT = "onlineu-course-bundle"
+BUNDLE_VERSION = 1
+BUNDLE_MANIFEST = "course.json"
+BUNDLE_FILES_DIR = "files/"
+
+class BundleError(Exception):
+    """Raised when a course bundle is malformed or would break the course's invariants"""
+
+def _lesson_file_field():
+    return Lesson._meta.get_field("lesson_file")
+
+# Reading and validating
+
+def read_bundle(source):
+    """
+    Reads a bundle from a binary file: either a ZIP archive holding course.json and the lesson files under
+    files/, or the bare course.json. Returns the manifest and the open archive (None for bare JSON)
+    """
+    if zipfile.is_zipfile(source):
+        try:
+            archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile:
+            raise BundleError("The ZIP archive is corrupt")
+        try:
+            max_bytes = getattr(settings, "COURSE_BUNDLE_MAX_BYTES", 500 * 1024 * 1024)
+            if sum(info.file_size for info in archive.infolist()) > max_bytes:
+                raise BundleError(f"The bundle unpacks to more than {max_bytes} bytes")
+            # Checks every member's CRC up front, so a corrupt file can't fail the import halfway through
+            if archive.testzip() is not None:
+                raise BundleError("The ZIP archive is corrupt")
+            manifest = json.loads(archive.read(BUNDLE_MANIFEST))
+        except KeyError:
+            archive.close()
+            raise BundleError(f"The archive has no {BUNDLE_MANIFEST} manifest")
+        except ValueError:
+            archive.close()
+            raise BundleError(f"{BUNDLE_MANIFEST} is not valid JSON")
+        except (zipfile.BadZipFile, zlib.error):
+            archive.close()
+            raise BundleError("The ZIP archive is corrupt")
+        except BundleError:
+            archive.close()
+            raise
+        return manifest, archive
+
+    source.seek(0)
+    try:
+        return json.load(source), None
+    except ValueError:
+        raise BundleError("The bundle is neither a ZIP archive nor JSON")
+
+def _text(entry: dict, key: str, where: str, max_length: int, required: bool = True):
+    value = entry.get(key)
+    if value in (None, ""):
+        if required:
+            raise BundleError(f"{where}.{key} is required")
+        return None
+    if not isinstance(value, str) or len(value) > max_length:
+        raise BundleError(f"{where}.{key} must be text of at most {max_length} characters")
+    return value
+
+def _list(entry: dict, key: str, where: str) -> list:
+    value = entry.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise BundleError(f"{where}.{key} must be a list of objects")
+    return value
+
+def _lesson_file(entry: dict, where: str, archive):
+    """
+    Validates a lesson's file reference: a member of the archive, or for bare JSON a file of one of the
+    teacher's lessons, which check_bundle_files verifies once the course is known
+    """
+    name = entry.get("file")
+    if not name:
+        return None
+    try:
+        validate_file_name(name, allow_relative_path=True)
+    except SuspiciousFileOperation:
+        raise BundleError(f"{where}.file is not a valid file name")
+    if archive is not None:
+        try:
+            archive.getinfo(BUNDLE_FILES_DIR + name)
+        except KeyError:
+            raise BundleError(f"{where}.file {name} is missing from the archive")
+    return name
+
+def validate_bundle(manifest, archive=None) -> list:
+    """
+    Checks a manifest's structure and every field against the models' constraints, returning its modules
+    normalized. Weights are checked against the course separately, see check_bundle_weights
+    """
+    if not isinstance(manifest, dict) or manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"Not a course bundle, expected format {BUNDLE_FORMAT}")
+    if manifest.get("version") != BUNDLE_VERSION:
+        raise BundleError(f"Unsupported bundle version {manifest.get('version')}, expected {BUNDLE_VERSION}")
+    modules = _list(manifest, "modules", "bundle")
+    if not modules:
+        raise BundleError("The bundle has no modules")
+
+    normalized = []
+    for i, module in enumerate(modules):
+        where = f"modules[{i}]"
+        lessons = []
+        for j, lesson in enumerate(_list(module, "lessons", where)):
+            lesson_where = f"{where}.lessons[{j}]"
+            description = _text(lesson, "description", lesson_where, 1000, required=False)
+            file = _lesson_file(lesson, lesson_where, archive)
+            if not (description or file):
+                raise BundleError(f"{lesson_where} must have one of description or file")
+            lessons.append({"title": _text(lesson, "title", lesson_where, 256), "description": description, "file": file})
+
+        assignments = []
+        for j, assignment in enumerate(_list(module, "assignments", where)):
+            assignment_where = f"{where}.assignments[{j}]"
+            weight = assignment.get("weight", 0.0)
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not 0.0 <= weight <= 100.0:
+                raise BundleError(f"{assignment_where}.weight must be a number between 0 and 100")
+            deadline = assignment.get("deadline")
+            if deadline is not None:
+                deadline = parse_datetime(deadline) if isinstance(deadline, str) else None
+                if deadline is None:
+                    raise BundleError(f"{assignment_where}.deadline must be an ISO 8601 datetime")
+            assignments.append({
+                "title": _text(assignment, "title", assignment_where, 256),
+                "description": _text(assignment, "description", assignment_where, 1000),
+                "deadline": deadline,
+                "weight": float(weight),
+            })
+
+        normalized.append({
+            "title": _text(module, "title", where, 256),
+            "description": _text(module, "description", where, 1000, required=False),
+            "lessons": lessons,
+            "assignments": assignments,
+        })
+    return normalized
+
+def check_bundle_weights(course: Course, modules: list):
+    """
+    The set-based counterpart of Assignment.clean: one aggregate over the course's existing assignments
+    instead of a sum per saved row
+    """
+    existing = Assignment.objects.filter(module__course=course).aggregate(total=Coalesce(Sum("weight"), 0.0))["total"]
+    added = sum(assignment["weight"] for module in modules for assignment in module["assignments"])
+    if existing + added > 100.0:
+        raise BundleError(
+            f"Total assignment weight for course '{course.title}' would be {existing + added:.2f}%. "
+            f"Assignments in the bundle can add at most {(100 - existing):.2f}%."
+        )
+
+def check_bundle_files(course: Course, modules: list):
+    """
+    A bare JSON bundle can only reference files the course's teacher already uses in their own lessons, like
+    the ones of a bundle they exported. Lesson files share storage with submissions and chat attachments, so
+    any other name would let the teacher download someone else's file through the imported lesson
+    """
+    names = {lesson["file"] for module in modules for lesson in module["lessons"] if lesson["file"]}
+    if not names:
+        return
+    owned = set(Lesson.objects.filter(
+        module__course__taught_by=course.taught_by_id, lesson_file__in=names
+    ).values_list("lesson_file", flat=True))
+    unknown = sorted(names - owned)
+    if unknown:
+        raise BundleError(f"{unknown[0]} isn't a file of your lessons, new lesson files can only be uploaded in a ZIP bundle")
+
+# Importing
+
+def _store_lesson_file(archive, name: str) -> str:
+    info = archive.getinfo(BUNDLE_FILES_DIR + name)
+    field = _lesson_file_field()
+    try:
+        with archive.open(info) as member:
+            content = File(member, name=posixpath.basename(name))
+            content.size = info.file_size
+            return field.storage.save(field.generate_filename(None, posixpath.basename(name)), content)
+    except (zipfile.BadZipFile, zlib.error):
+        raise BundleError(f"{name} is corrupt in the archive")
+
+def _send_import_digest(course: Course, counts: dict):
+    """A single notification per enrolled student, in place of the per-module and per-lesson ones"""
+    if not course.is_published:
+        return
+    content = Truncator(
+        f"{counts['modules']} modules, {counts['lessons']} lessons and {counts['assignments']} assignments "
+        f"added to course {course.title}"
+    ).chars(Notification._meta.get_field("content").max_length)
+    students = course.enrollments.exclude(status=Enrollment.EnrollmentStatus.CANCELED).values_list("student_id", flat=True)
+    Notification.objects.bulk_create([
+        Notification(user_id=student_id, related_course=course, content=content) for student_id in students
+    ])
+
+def import_course_manifest(course: Course, manifest, archive=None) -> dict:
+    """
+    Adds a bundle's modules, lessons and assignments to the course in one transaction with a fixed number of
+    queries. bulk_create skips the per-row signals, so the course's content version, search vector and the
+    students' notifications are updated once for the whole bundle. Returns the number of created rows
+    """
+    modules = validate_bundle(manifest, archive)
+    stored_files = []
+    try:
+        with transaction.atomic():
+            # Serializes concurrent imports into the same course, so the weight check stays valid
+            Course.objects.select_for_update().filter(pk=course.pk).first()
+            check_bundle_weights(course, modules)
+            if archive is None:
+                check_bundle_files(course, modules)
+
+            created_modules = Module.objects.bulk_create([
+                Module(course=course, title=module["title"], description=module["description"]) for module in modules
+            ])
+            lessons, assignments = [], []
+            for module, entry in zip(created_modules, modules):
+                for lesson in entry["lessons"]:
+                    file = lesson["file"]
+                    if file and archive is not None:
+                        file = _store_lesson_file(archive, file)
+                        stored_files.append(file)
+                    lessons.append(Lesson(module=module, title=lesson["title"], description=lesson["description"], lesson_file=file))
+                assignments.extend(Assignment(module=module, **assignment) for assignment in entry["assignments"])
+            Lesson.objects.bulk_create(lessons)
+            Assignment.objects.bulk_create(assignments)
+
+            counts = {"modules": len(created_modules), "lessons": len(lessons), "assignments": len(assignments)}
+            bump_course_content_version(course_id=course.pk)
+            schedule_course_search_update(course_id=course.pk)
+            _send_import_digest(course, counts)
+    except Exception:
+        for name in stored_files:
+            _lesson_file_field().storage.delete(name)
+        raise
+    return counts
+
+def import_course_bundle(course: Course, source) -> dict:
+    """Imports a ZIP or JSON bundle read from a binary file, see import_course_manifest"""
+    manifest, archive = read_bundle(source)
+    try:
+        return import_course_manifest(course, manifest, archive)
+    finally:
+        if archive is not None:
+            archive.close()
+
+# Exporting
+
+def _module_entry(module: Module) -> dict:
+    return {
+        "title": module.title,
+        "description": module.description,
+        "lessons": [
+            {"title": lesson.title, "description": lesson.description, "file": lesson.lesson_file.name or None}
+            for lesson in module.lessons.all()
+        ],
+        "assignments": [
+            {"title": assignment.title, "description": assignment.description, "deadline": assignment.deadline, "weight": assignment.weight}
+            for assignment in module.assignments.all()
+        ],
+    }
+
+def iter_bundle_modules(course: Course):
+    """Yields the course's module entries in creation order, loading the tree in chunks"""
+    modules = Module.objects.filter(course=course).order_by("created_at", "id").prefetch_related(
+        Prefetch("lessons", queryset=Lesson.objects.order_by("created_at", "id")),
+        Prefetch("assignments", queryset=Assignment.objects.order_by("created_at", "id")),
+    )
+    for module in modules.iterator(chunk_size=100):
+        yield _module_entry(module)
+
+def _bundle_header(course: Course) -> dict:
+    return {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "course": {"title": course.title, "description": course.description},
+    }
+
+def stream_json_bundle(course: Course):
+    """Yields the course's bare JSON bundle piece by piece, one module at a time"""
+    header = json.dumps(_bundle_header(course), cls=DjangoJSONEncoder)
+    yield header[:-1] + ', "modules": ['
+    for i, module in enumerate(iter_bundle_modules(course)):
+        yield ("," if i else "") + json.dumps(module, cls=DjangoJSONEncoder)
+    yield "]}"
+
+class _StreamBuffer:
+    """Write-only file object collecting what zipfile writes until the streaming generator drains it"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def stream_zip_bundle(course: Course):
+    """
+    Yields the course's ZIP bundle as it's written: the lesson files are copied chunk by chunk, then the
+    manifest. Files missing from storage are left out and unreferenced in the manifest
+    """
+    modules = list(iter_bundle_modules(course))
+    names = dict.fromkeys(lesson["file"] for module in modules for lesson in module["lessons"] if lesson["file"])
+    storage = _lesson_file_field().storage
+    missing = set()
+
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in names:
+            try:
+                source = storage.open(name)
+            except FileNotFoundError:
+                missing.add(name)
+                continue
+            with source, archive.open(BUNDLE_FILES_DIR + name, "w", force_zip64=True) as target:
+                for chunk in source.chunks():
+                    target.write(chunk)
+                    yield buffer.drain()
+
+        for module in modules:
+            for lesson in module["lessons"]:
+                if lesson["file"] in missing:
+                    lesson["file"] = None
+        manifest = {**_bundle_header(course), "modules": modules}
+        archive.writestr(BUNDLE_MANIFEST, json.dumps(manifest, cls=DjangoJSONEncoder, indent=2))
+    yield buffer.drain()
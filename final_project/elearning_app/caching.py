@@ -0,0 +1,114 @@
+import hashlib
+from typing import Optional
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .metrics import record_cache_lookup
+from .models import *
+from .request_cache import request_cached
+
+COURSE_MEMBERS_TIMEOUT = 60 * 60  # membership is invalidated explicitly, the timeout only bounds staleness
+
+def course_members_key(course_pk) -> str:
+    return f"course_members_{course_pk}"
+
+def course_fragment_key(name: str, course_pk, content_version, variant: str = "") -> str:
+    return f"fragment_{name}_{course_pk}_v{content_version}_{variant}"
+
+def api_response_key(url: str, visibility: str, version: str) -> str:
+    return f"api_response_{hashlib.md5(f'{url}:{visibility}:{version}'.encode()).hexdigest()}"
+
+def api_response_cache():
+    return caches[getattr(settings, "API_RESPONSE_CACHE_ALIAS", "api")]
+
+def shared_cache():
+    """The cache every process shares, for entries written in one process and invalidated from another"""
+    return caches[getattr(settings, "SHARED_CACHE_ALIAS", "shared")]
+
+def course_live_group_name(course_pk) -> str:
+    return f"course_{course_pk}_live"
+
+def get_course_members(course_pk) -> Optional[dict]:
+    """
+    Returns the course's teacher id and the set of actively enrolled student ids, cached until the
+    course's enrollments change. Returns None if the course does not exist. The cache is shared, since the
+    invalidations come from web processes while the live consumers reading it run under Daphne
+    """
+    key = course_members_key(course_pk)
+    members = shared_cache().get(key)
+    record_cache_lookup("course_members", members is not None)
+    if members is None:
+        teacher_id = Course.objects.filter(pk=course_pk).values_list("taught_by_id", flat=True).first()
+        if teacher_id is None:
+            return None
+        students = Enrollment.objects.filter(
+            course_id=course_pk,
+            status=Enrollment.EnrollmentStatus.ACTIVE
+        ).values_list("student_id", flat=True)
+        members = {"teacher": teacher_id, "students": set(students)}
+        shared_cache().set(key, members, COURSE_MEMBERS_TIMEOUT)
+    return members
+
+def invalidate_course_members(course_pk, changes: dict):
+    """
+    Drops the cached membership once the current transaction commits and sends live listeners the changes, a
+    dict of user id to the user's new role ("teacher", "student" or None once they lost access), so each
+    listener only checks whether its own user is among them instead of re-reading the membership
+    """
+    def invalidate():
+        shared_cache().delete(course_members_key(course_pk))
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(
+                course_live_group_name(course_pk),
+                {"type": "course_members_changed", "changes": [[user_id, role] for user_id, role in changes.items()]}
+            )
+    transaction.on_commit(invalidate)
+
+def bump_course_content_version(course_id=None, module_id=None):
+    """
+    Moves a course (or the course owning a module) to a new content version, so fragments cached under the
+    previous version are no longer looked up and simply expire
+    """
+    lookup = {"pk": course_id} if course_id is not None else {"modules": module_id}
+    Course.objects.filter(**lookup).update(content_version=F("content_version") + 1, tree_last_edited_at=timezone.now())
+
+def bump_course_activity_version(**lookup):
+    """
+    Moves the course matched by lookup (e.g. pk=, modules__lessons=) to a new activity version. The counter lives
+    on the course's CourseStats row, so the frequent student activity never writes to the course row itself
+    """
+    CourseStats.objects.filter(**{f"course__{key}": value for key, value in lookup.items()}).update(
+        activity_version=F("activity_version") + 1, activity_edited_at=timezone.now()
+    )
+
+def course_validators(**lookup) -> Optional[dict]:
+    """
+    Returns an ETag seed and Last-Modified datetime covering the course matched by lookup and its whole tree,
+    read from the course's and its statistics' version columns in a single query. Returns None if there's no such course
+    """
+    row = request_cached(("course_validators", tuple(sorted(lookup.items()))), lambda: Course.objects.filter(**lookup).values(
+        "pk", "content_version", "last_edited_at", "tree_last_edited_at",
+        activity_version=Coalesce("stats__activity_version", 0), activity_edited_at=F("stats__activity_edited_at"),
+    ).first())
+    if row is None:
+        return None
+    last_modified = max(filter(None, (row["last_edited_at"], row["tree_last_edited_at"], row["activity_edited_at"])))
+    return {
+        "etag": f"{row['pk']}-{row['content_version']}-{row['activity_version']}-{row['last_edited_at'].timestamp()}",
+        "last_modified": last_modified,
+    }
+
+def course_cache_state(**lookup) -> Optional[dict]:
+    """
+    Returns the teacher and version columns of the course matched by lookup, from which cached API responses
+    are keyed, or None if there's no such course
+    """
+    return request_cached(("course_cache_state", tuple(sorted(lookup.items()))), lambda: Course.objects.filter(**lookup).values(
+        "pk", "taught_by_id", "content_version", "last_edited_at", activity_version=Coalesce("stats__activity_version", 0)
+    ).first())
@@ -0,0 +1,20 @@
+from django.core.checks import Error, Warning, register
+from .schema import schema_artifact_status
+
+@register()
+def check_openapi_schema(app_configs, **kwargs):
+    """A stale prebuilt schema would document an API that no longer exists, so it fails startup"""
+    state, manifest = schema_artifact_status()
+    if state == "stale":
+        return [Error(
+            f"The prebuilt OpenAPI schema (built {manifest['generated_at']}) doesn't match the API's sources.",
+            hint="Run `manage.py build_openapi_schema` as part of the deploy, or delete the stale build.",
+            id="elearning_app.E001",
+        )]
+    if state == "missing":
+        return [Warning(
+            "There is no prebuilt OpenAPI schema, so it is generated on every request to the schema endpoint.",
+            hint="Run `manage.py build_openapi_schema` as part of the deploy.",
+            id="elearning_app.W001",
+        )]
+    return []
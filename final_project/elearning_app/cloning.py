@@ -0,0 +1,51 @@
+from django.db import transaction
+from .models import *
+
+def clone_course(course: Course, start_date, end_date, title=None) -> Course:
+    """
+    Copies a course with its modules, lessons and assignments for a new run, using three bulk_create calls
+    whatever the course's size. Assignment deadlines move with the start date. Lesson files and the cover
+    image with its variants are referenced, not copied: files are never deleted along with their rows, so
+    the runs can share them. The clone starts out unpublished, and bulk_create skips the per-row signals, so
+    no student is notified until the teacher publishes it
+    """
+    shift = start_date - course.start_date
+    with transaction.atomic():
+        clone = Course.objects.create(
+            title=title or course.title,
+            description=course.description,
+            taught_by=course.taught_by,
+            cover_image=course.cover_image.name or None,
+            cover_image_variants=course.cover_image_variants,
+            cover_image_lqip=course.cover_image_lqip,
+            start_date=start_date,
+            end_date=end_date,
+            is_published=False,
+        )
+
+        modules = list(Module.objects.filter(course=course).order_by("created_at", "id"))
+        copies = Module.objects.bulk_create([
+            Module(course=clone, title=module.title, description=module.description) for module in modules
+        ])
+        module_map = {module.pk: copy for module, copy in zip(modules, copies)}
+
+        Lesson.objects.bulk_create([
+            Lesson(
+                module=module_map[lesson.module_id],
+                title=lesson.title,
+                description=lesson.description,
+                lesson_file=lesson.lesson_file.name or None,
+            )
+            for lesson in Lesson.objects.filter(module__course=course).order_by("created_at", "id")
+        ])
+        Assignment.objects.bulk_create([
+            Assignment(
+                module=module_map[assignment.module_id],
+                title=assignment.title,
+                description=assignment.description,
+                deadline=assignment.deadline + shift if assignment.deadline else None,
+                weight=assignment.weight,
+            )
+            for assignment in Assignment.objects.filter(module__course=course).order_by("created_at", "id")
+        ])
+    return clone
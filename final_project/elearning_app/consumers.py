@@ -1,26 +1,160 @@
+import asyncio
 import json
+from asgiref.sync import async_to_sync
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from .caching import course_live_group_name, get_course_members
+from .metrics import CallbackMetric, Counter, registry
 from .models import *
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Close code sent to clients that are disconnected for not keeping up with their outbound queue
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+COURSE_LIVE_MAX_MESSAGE_LENGTH = 2000
+# Kinds of message a teacher can publish to the course's live channel, the first being the default
+COURSE_LIVE_KINDS = ("announcement", "reminder")
+
+class OutboundMetrics:
+    """Process-wide counters for frames queued to websocket clients"""
+    def __init__(self):
+        self.connections = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.frames_sent = 0
+        self.batches_sent = 0
+        self.frames_dropped = 0
+        self.slow_consumer_disconnects = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+outbound_metrics = OutboundMetrics()
+
+for name, documentation, type, attribute in (
+    ("channels_connections", "Open websocket connections", "gauge", "connections"),
+    ("channels_outbound_queue_depth", "Frames queued for websocket clients", "gauge", "queue_depth"),
+    ("channels_frames_sent_total", "Frames sent to websocket clients", "counter", "frames_sent"),
+    ("channels_frames_dropped_total", "Frames dropped for websocket clients over the high-water mark", "counter", "frames_dropped"),
+    ("channels_slow_consumer_disconnects_total", "Websocket clients disconnected for falling behind", "counter", "slow_consumer_disconnects"),
+):
+    registry.register(CallbackMetric(name, documentation, type, lambda attribute=attribute: getattr(outbound_metrics, attribute)))
+
+channels_messages_received = registry.register(Counter(
+    "channels_messages_received_total", "Messages received from websocket clients by consumer", ("consumer",),
+))
+
+def chat_group_name(chat_pk) -> str:
+    return f"chat_{chat_pk}"
+
+def chat_message_event(message: ChatMessage) -> dict:
+    """The channel layer event delivering a saved message to the chat's ChatConsumers"""
+    return {"type": "chat_message", "message": message.text, "sender_id": message.sender_id}
+
+def broadcast_chat_message(message: ChatMessage):
+    """Sends a message saved outside the websocket (e.g. posted through the API) to the chat's live clients"""
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            async_to_sync(channel_layer.group_send)(chat_group_name(message.chat_id), chat_message_event(message))
+    transaction.on_commit(send)
+
+class BufferedWebsocketConsumer(AsyncWebsocketConsumer):
+    """
+    Websocket consumer whose outbound frames go through a bounded per-connection queue drained by a
+    writer task, so a slow client only ever backs up its own queue
+    """
+    async def start_outbound(self):
+        self.high_water = getattr(settings, "WEBSOCKET_OUTBOUND_HIGH_WATER", 100)
+        self.max_batch = getattr(settings, "WEBSOCKET_OUTBOUND_MAX_BATCH", 50)
+        self.slow_consumer_grace = getattr(settings, "WEBSOCKET_SLOW_CONSUMER_GRACE", 5.0)
+        self.outbound = asyncio.Queue()
+        self.over_high_water_since = None
+        self.closing = False
+        self.writer = asyncio.create_task(self.drain_outbound())
+        outbound_metrics.connections += 1
+
+    async def stop_outbound(self):
+        if hasattr(self, "writer"):
+            self.writer.cancel()
+            outbound_metrics.queue_depth -= self.outbound.qsize()
+            outbound_metrics.connections -= 1
+            del self.writer
+
+    async def enqueue(self, frame: dict):
+        """
+        Queues a frame for the writer task instead of awaiting the socket. Above the high-water mark the
+        oldest pending frame is dropped, and a client that stays above it for longer than the grace
+        period is disconnected.
+        """
+        if self.closing:
+            return
+
+        if self.outbound.qsize() >= self.high_water:
+            now = asyncio.get_running_loop().time()
+            if self.over_high_water_since is None:
+                self.over_high_water_since = now
+            elif now - self.over_high_water_since > self.slow_consumer_grace:
+                await self.close_slow_consumer()
+                return
+            self.outbound.get_nowait()
+            outbound_metrics.queue_depth -= 1
+            outbound_metrics.frames_dropped += 1
+        else:
+            self.over_high_water_since = None
+
+        self.outbound.put_nowait(frame)
+        outbound_metrics.queue_depth += 1
+        outbound_metrics.max_queue_depth = max(outbound_metrics.max_queue_depth, self.outbound.qsize())
+
+    async def drain_outbound(self):
+        """Writes queued frames to the socket, coalescing everything pending into a single batch frame"""
+        while True:
+            frames = [await self.outbound.get()]
+            while len(frames) < self.max_batch and not self.outbound.empty():
+                frames.append(self.outbound.get_nowait())
+            outbound_metrics.queue_depth -= len(frames)
+            outbound_metrics.frames_sent += len(frames)
+
+            if len(frames) == 1:
+                await self.send(text_data=json.dumps(frames[0]))
+            else:
+                outbound_metrics.batches_sent += 1
+                await self.send(text_data=json.dumps({"type": "batch", "messages": frames}))
+
+    async def close_slow_consumer(self):
+        self.closing = True
+        self.writer.cancel()
+        dropped = self.outbound.qsize()
+        self.outbound = asyncio.Queue()
+        outbound_metrics.queue_depth -= dropped
+        outbound_metrics.frames_dropped += dropped
+        outbound_metrics.slow_consumer_disconnects += 1
+        await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+class ChatConsumer(BufferedWebsocketConsumer):
     async def connect(self):
         self.chat_pk = self.scope["url_route"]["kwargs"]["chat_pk"]
-        self.chat_group_name = f"chat_{self.chat_pk}"
-        
+        self.chat_group_name = chat_group_name(self.chat_pk)
+
         await self.channel_layer.group_add(
             self.chat_group_name,
             self.channel_name,
         )
         await self.accept()
+        await self.start_outbound()
 
     async def disconnect(self, close_code):
+        await self.stop_outbound()
         await self.channel_layer.group_discard(
             self.chat_group_name,
             self.channel_name,
         )
 
     async def receive(self, text_data=None):
+        channels_messages_received.inc("chat")
         data = json.loads(text_data)
         message = data["message"]
         user_pk = data["user_pk"]
@@ -29,9 +163,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Check that user is a participant
         is_participant = await self.is_user_participant(user_pk, chat_pk)
         if not is_participant:
-            await self.send(text_data=json.dumps({
+            await self.enqueue({
                 "error": "User is not a participant of this chat. Cannot send message."
-            }))
+            })
             return
 
         # Save message to database to keep history
@@ -47,10 +181,10 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.enqueue({
             "message": event["message"],
             "sender_id": event["sender_id"]
-        }))
+        })
 
     @database_sync_to_async
     def save_message(self, message, user_pk, chat_pk):
@@ -63,3 +197,93 @@ class ChatConsumer(AsyncWebsocketConsumer):
     @database_sync_to_async
     def is_user_participant(self, user_pk, chat_pk):
         return ChatParticipant.objects.filter(chat_id=chat_pk, user_id=user_pk).exists()
+
+class CourseLiveConsumer(BufferedWebsocketConsumer):
+    """
+    Course-wide broadcast channel for announcements and live sessions. Membership is checked once on
+    connect against the cached enrollment set; the course's teacher publishes and every active student
+    receives through a single group fan-out, with no database work per message.
+    """
+    async def connect(self):
+        self.course_pk = int(self.scope["url_route"]["kwargs"]["course_pk"])
+        self.course_group_name = course_live_group_name(self.course_pk)
+        self.user = self.scope.get("user")
+
+        role = await self.get_member_role()
+        if role is None:
+            await self.close()
+            return
+        self.can_publish = role == "teacher"
+
+        await self.channel_layer.group_add(
+            self.course_group_name,
+            self.channel_name,
+        )
+        await self.accept()
+        await self.start_outbound()
+
+    async def disconnect(self, close_code):
+        await self.stop_outbound()
+        await self.channel_layer.group_discard(
+            self.course_group_name,
+            self.channel_name,
+        )
+
+    async def receive(self, text_data=None):
+        channels_messages_received.inc("course_live")
+        if not self.can_publish:
+            await self.enqueue({"error": "Only the course's teacher can publish to this channel."})
+            return
+
+        data = json.loads(text_data)
+        message = str(data.get("message", ""))[:COURSE_LIVE_MAX_MESSAGE_LENGTH]
+        if not message:
+            return
+        kind = data.get("kind", COURSE_LIVE_KINDS[0])
+        if kind not in COURSE_LIVE_KINDS:
+            await self.enqueue({"error": f"kind must be one of: {', '.join(COURSE_LIVE_KINDS)}"})
+            return
+
+        await self.channel_layer.group_send(
+            self.course_group_name,
+            {
+                "type": "course_broadcast",
+                "kind": kind,
+                "message": message,
+                "sender_id": self.user.pk,
+            }
+        )
+
+    async def course_broadcast(self, event):
+        await self.enqueue({
+            "kind": event["kind"],
+            "message": event["message"],
+            "sender_id": event["sender_id"],
+        })
+
+    async def course_members_changed(self, event):
+        """Applies a membership change to the connected user, dropping the listener if they lost access"""
+        for user_id, role in event["changes"]:
+            if user_id != self.user.pk:
+                continue
+            if role is None:
+                await self.stop_outbound()
+                await self.channel_layer.group_discard(self.course_group_name, self.channel_name)
+                await self.close()
+                return
+            self.can_publish = role == "teacher"
+
+    @database_sync_to_async
+    def get_member_role(self):
+        """Returns "teacher", "student" or None for the connected user, from the cached course membership"""
+        if self.user is None or not self.user.is_authenticated:
+            return None
+        members = get_course_members(self.course_pk)
+        if members is None:
+            return None
+        if self.user.pk == members["teacher"]:
+            return "teacher"
+        if self.user.pk in members["students"]:
+            return "student"
+        return None
+
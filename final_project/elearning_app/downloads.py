@@ -0,0 +1,166 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Optional
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.views.static import serve
+
+# Serving uploaded files (lesson files, submissions, chat attachments) from views that checked the user may
+# see them. Django streams the file itself, answering single-range requests so videos can seek and downloads
+# resume, or with DOWNLOAD_OFFLOAD hands the transfer to the web server in front of it
+
+OFFLOAD_MODES = ("x-accel-redirect", "x-sendfile")
+# Where those files are uploaded in MEDIA_ROOT (see their upload_to), never served at MEDIA_URL
+PRIVATE_MEDIA_DIR = "private/"
+# Types browsers display without running any script, served inline. Anything else, like an HTML or SVG file
+# a student uploaded, is always downloaded so it can't run on this origin
+INLINE_CONTENT_TYPES = (
+    "video/", "audio/", "image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf", "text/plain",
+)
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+class FileRange:
+    """
+    Read-only view of `length` bytes of an open file from its current position, for FileResponse. It has no
+    fileno(), so WSGI servers stream it with read() instead of sendfile()ing the rest of the file
+    """
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+def file_etag(name: str, size: int, modified) -> str:
+    """
+    Strong ETag of a stored file, from its name, size and modification time like nginx's: hashing the
+    content would mean reading a whole video to answer a revalidation
+    """
+    key = f"{name}:{size}:{modified.timestamp()}"
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple]:
+    """
+    The inclusive (first, last) byte positions of a single-range Range header, clamped to the file. None
+    when the header is absent, malformed or asks for several ranges, which RFC 9110 lets us answer with the
+    whole file. Raises RangeNotSatisfiable when the range holds no byte of the file
+    """
+    match = _RANGE.fullmatch(header.strip()) if header else None
+    if match is None or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # A suffix range: the last `last` bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(0, size - int(last)), size - 1
+    first, last = int(first), int(last) if last else None
+    if last is not None and last < first:
+        return None
+    if first >= size:
+        raise RangeNotSatisfiable
+    return first, size - 1 if last is None else min(last, size - 1)
+
+def if_range_matches(header: Optional[str], etag: str, last_modified: int) -> bool:
+    """Whether a Range request's If-Range still holds, i.e. the client's partial copy is of the current file"""
+    if not header:
+        return True
+    if header.startswith(('"', "W/")):
+        # If-Range only accepts strong validators, so a weak ETag never matches
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+def _set_validators(response, etag: str, last_modified: int):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    # private: the files are only for the users allowed to see them, never for shared caches
+    patch_cache_control(response, private=True, max_age=getattr(settings, "DOWNLOAD_MAX_AGE", 60 * 60))
+    return response
+
+def serve_file(request, file) -> HttpResponse:
+    """
+    Responds with a stored file (a FieldFile) after the view checked the user may see it: the whole file,
+    the requested range (206, or 416 if outside the file), 304/412 for conditional requests, or an empty
+    response telling the web server which file to send when DOWNLOAD_OFFLOAD is set
+    """
+    storage, name = file.storage, file.name
+    try:
+        size = storage.size(name)
+        modified = storage.get_modified_time(name)
+    except OSError:
+        raise Http404("File not found")
+    etag = file_etag(name, size, modified)
+    last_modified = int(modified.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return _set_validators(response, etag, last_modified)
+
+    filename = os.path.basename(name)
+    content_type, encoding = mimetypes.guess_type(filename)
+    if content_type is None or encoding is not None:
+        content_type = "application/octet-stream"
+    as_attachment = not content_type.startswith(INLINE_CONTENT_TYPES)
+
+    offload = getattr(settings, "DOWNLOAD_OFFLOAD", None)
+    if offload in OFFLOAD_MODES:
+        # The web server then answers Range and conditional requests itself
+        response = HttpResponse(content_type=content_type)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+        if offload == "x-accel-redirect":
+            prefix = getattr(settings, "DOWNLOAD_ACCEL_PREFIX", "/protected-files/")
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(name)
+        else:
+            response["X-Sendfile"] = storage.path(name)
+        return _set_validators(response, etag, last_modified)
+
+    byte_range = None
+    if if_range_matches(request.headers.get("If-Range"), etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return _set_validators(response, etag, last_modified)
+
+    handle = storage.open(name, "rb")
+    if byte_range is None:
+        response = FileResponse(handle, content_type=content_type, as_attachment=as_attachment, filename=filename)
+    else:
+        first, last = byte_range
+        handle.seek(first)
+        response = FileResponse(
+            FileRange(handle, last - first + 1), status=206,
+            content_type=content_type, as_attachment=as_attachment, filename=filename,
+        )
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        response["Content-Length"] = last - first + 1
+    # FileResponse reads 4KiB at a time, far too little for videos
+    response.block_size = getattr(settings, "DOWNLOAD_CHUNK_SIZE", 256 * 1024)
+    return _set_validators(response, etag, last_modified)
+
+def serve_public_media(request, path, document_root=None, show_indexes=False):
+    """
+    django.views.static.serve for MEDIA_URL in development, refusing the private uploads only the download
+    views may serve. In production the web server in front must refuse PRIVATE_MEDIA_DIR the same way
+    """
+    if (posixpath.normpath(path).lstrip("/").lower() + "/").startswith(PRIVATE_MEDIA_DIR):
+        raise Http404("File not found")
+    return serve(request, path, document_root=document_root, show_indexes=show_indexes)
@@ -0,0 +1,107 @@
+from functools import cached_property
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .serializers import *
+
+class ValuesSerializer:
+    """
+    Read-only fast path for a ModelSerializer. It renders .values() rows into exactly the dicts the serializer
+    would produce for the default (unexpanded) shape, without building model instances. The serializer's fields
+    are inspected once and compiled into (name, column, mapper) triples. `columns` maps a field to a differently
+    named values() column, and `annotations` adds expressions for fields the model computes in Python.
+    `exclude` leaves out fields the caller renders itself, such as nested serializers
+    """
+    def __init__(self, serializer_class, columns=None, annotations=None, exclude=()):
+        self.serializer_class = serializer_class
+        self.columns = columns or {}
+        self.annotations = annotations or {}
+        self.exclude = frozenset(exclude)
+
+    @cached_property
+    def compiled(self) -> list:
+        """(name, column, field) for every field the serializer outputs by default"""
+        compiled = []
+        for name, field in self.serializer_class().fields.items():
+            if name in self.exclude:
+                continue
+            column = self.columns.get(name, name if name in self.annotations else field.source)
+            unsupported = (serializers.BaseSerializer, serializers.ManyRelatedField, serializers.SerializerMethodField)
+            if isinstance(field, unsupported) or "." in column:
+                raise ImproperlyConfigured(f"{self.serializer_class.__name__}.{name} can't be read from .values()")
+            compiled.append((name, column, field))
+        return compiled
+
+    def _select(self, fields) -> list:
+        return [entry for entry in self.compiled if not fields or entry[0] in fields]
+
+    @cached_property
+    def pk_column(self) -> str:
+        return self.serializer_class.Meta.model._meta.pk.attname
+
+    def _mapper(self, field, request):
+        """
+        Returns the function turning a raw column value into the field's representation, or None for as-is.
+        Download links are built from the row's primary key, so their functions take the row as well
+        """
+        if isinstance(field, (serializers.RelatedField, serializers.ReadOnlyField)):
+            # values() already holds the related primary key, or the plain attribute
+            return None
+        if isinstance(field, DownloadFileField):
+            return lambda name, row: field.download_url(row[self.pk_column], request)
+        if isinstance(field, serializers.FileField):
+            storage = self.serializer_class.Meta.model._meta.get_field(field.source).storage
+            use_url = getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL)
+
+            def file_representation(name):
+                if not name:
+                    return None
+                if not use_url:
+                    return name
+                url = storage.url(name)
+                return request.build_absolute_uri(url) if request is not None else url
+            return file_representation
+        return field.to_representation
+
+    def values(self, queryset, fields=(), extra=()):
+        """Turns queryset into a values() queryset holding the requested fields plus the `extra` columns"""
+        selected = self._select(fields)
+        columns = [column for _, column, _ in selected]
+        if any(isinstance(field, DownloadFileField) for _, _, field in selected):
+            columns.append(self.pk_column)
+        annotations = {name: expression for name, expression in self.annotations.items() if name in columns}
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset.values(*dict.fromkeys(columns + list(extra)))
+
+    def render(self, rows, fields=(), request=None) -> list:
+        """Renders values() rows as the serializer's representation, restricted to `fields` when given"""
+        mappers = [
+            (name, column, self._mapper(field, request), isinstance(field, DownloadFileField))
+            for name, column, field in self._select(fields)
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, mapper, takes_row in mappers:
+                value = row[column]
+                if takes_row:
+                    item[name] = mapper(value, row) if value else None
+                else:
+                    item[name] = value if value is None or mapper is None else mapper(value)
+            data.append(item)
+        return data
+
+# User.role is the name of the user's first group
+user_values_serializer = ValuesSerializer(
+    UserSerializer,
+    annotations={"role": role_subquery()},
+)
+# CourseListCreateView annotates the status with CourseQuerySet.with_status()
+course_values_serializer = ValuesSerializer(CourseSerializer, columns={"status": "annotated_status"})
+enrollment_values_serializer = ValuesSerializer(EnrollmentSerializer)
+course_review_values_serializer = ValuesSerializer(CourseReviewSerializer)
+notification_values_serializer = ValuesSerializer(NotificationSerializer)
+# Attachments are nested, the async chat views fetch and render them separately
+chat_message_values_serializer = ValuesSerializer(ChatMessageSerializer, exclude=("attachments",))
+chat_message_attachment_values_serializer = ValuesSerializer(ChatMessageAttachmentSerializer)
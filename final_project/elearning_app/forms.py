@@ -59,10 +59,13 @@ class UserProfileForm(forms.ModelForm):
 
     def save(self, commit = True):
         user = super().save(commit=False)
-        profile_picture = self.cleaned_data.get("profile_picture")
+        picture_changed = "profile_picture" in self.changed_data
+        if picture_changed:
+            # The variants are the previous picture's until resize_profile_picture renders the new one
+            user.profile_picture_variants = {}
         if commit:
             user.save()
-            if profile_picture:
+            if picture_changed and user.profile_picture:
                 resize_profile_picture.delay(user.pk)
         return user
 
@@ -137,6 +140,17 @@ class CourseForm(forms.ModelForm):
             raise ValidationError("End date cannot be before start date.")
         return cleaned_data
 
+    def save(self, commit = True):
+        course = super().save(commit=False)
+        cover_changed = "cover_image" in self.changed_data
+        if commit:
+            course.save()
+            if cover_changed:
+                course.clear_cover_variants()
+                if course.cover_image:
+                    process_course_cover.delay(course.pk)
+        return course
+
 class ModuleForm(forms.ModelForm):
     class Meta:
         model = Module
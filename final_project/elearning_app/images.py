@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import io
+from PIL import ExifTags, Image, ImageFilter, ImageOps, features
+
+# Image processing for uploaded pictures, as pure Pillow functions over bytes and images: the Celery tasks
+# read the upload and store what these return
+
+# Square avatar widths in pixels: 1x and 2x of the 24-48px avatars and of the 100-200px profile header
+AVATAR_SIZES = (48, 96, 200, 400)
+# The variant stored in the ImageField itself, for clients that only know its URL
+AVATAR_DEFAULT_SIZE = 200
+# Course cover widths in pixels: a card column on phones, tablets and desktops, and the course page banner
+COVER_WIDTHS = (320, 640, 960, 1280)
+COVER_ASPECT = 16 / 9
+# Width of the blurred placeholder inlined on the course, shown while the cover loads
+LQIP_WIDTH = 24
+# Pillow format name to file extension, in order of preference for <picture> sources
+FORMAT_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+DEFAULT_QUALITY = {"WEBP": 80, "JPEG": 85}
+# EXIF orientations that rotate the stored image by 90 or 270 degrees
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+def supported_formats(formats=tuple(FORMAT_EXTENSIONS)) -> tuple:
+    """The formats this Pillow build can encode, since WebP support depends on libwebp"""
+    return tuple(format for format in formats if format != "WEBP" or features.check("webp"))
+
+def open_image(file, min_width: int, min_height: int) -> Image.Image:
+    """
+    Decodes an image at the smallest size still covering min_width x min_height, upright and in RGB with any
+    transparency flattened onto white. JPEGs are decoded in draft mode, where libjpeg downscales by 1/2, 1/4
+    or 1/8 while decoding, so a large photo never has its full-size bitmap in memory. Other formats are
+    decoded in full
+    """
+    image = Image.open(file)
+    # draft() works on the stored pixels, before the EXIF rotation swaps width and height
+    if image.getexif().get(ExifTags.Base.Orientation) in _TRANSPOSED_ORIENTATIONS:
+        min_width, min_height = min_height, min_width
+    image.draft("RGB", (min_width, min_height))
+    ImageOps.exif_transpose(image, in_place=True)
+
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB") if image.mode != "RGB" else image
+
+def crop_to_aspect(image: Image.Image, aspect: float) -> Image.Image:
+    """Crops the centre of the image to the width / height ratio aspect"""
+    width, height = image.size
+    if width / height > aspect:
+        cropped_width = round(height * aspect)
+        left = (width - cropped_width) // 2
+        return image.crop((left, 0, left + cropped_width, height))
+    cropped_height = round(width / aspect)
+    top = (height - cropped_height) // 2
+    return image.crop((0, top, width, top + cropped_height))
+
+def encode_image(image: Image.Image, format: str, quality=None) -> bytes:
+    buffer = io.BytesIO()
+    options = {"quality": quality or DEFAULT_QUALITY.get(format, 85)}
+    if format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+def render_variants(image: Image.Image, widths, formats, quality=None) -> dict:
+    """
+    Resizes the image to each width, keeping its aspect ratio, and encodes every size in every format.
+    Returns {(width, format): bytes}. `quality` maps formats to encoder quality, see DEFAULT_QUALITY
+    """
+    quality = quality or {}
+    variants = {}
+    for width in sorted(widths, reverse=True):
+        height = max(1, round(image.height * width / image.width))
+        # reducing_gap shrinks by whole factors first, which is much cheaper than a full Lanczos pass
+        resized = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for format in formats:
+            variants[width, format] = encode_image(resized, format, quality.get(format))
+    return variants
+
+def render_avatar_variants(data: bytes, sizes=AVATAR_SIZES, formats=None, quality=None) -> dict:
+    """Decodes an uploaded picture once and renders it as centred square avatars of every size and format"""
+    largest = max(sizes)
+    image = crop_to_aspect(open_image(io.BytesIO(data), largest, largest), 1.0)
+    return render_variants(image, sizes, formats or supported_formats(), quality)
+
+def avatar_variant_name(user_id, digest: str, size: int, format: str) -> str:
+    """Storage name of an avatar variant: per user, so old variants can be deleted, then per content hash"""
+    return f"avatars/{user_id}/{digest}/{size}.{FORMAT_EXTENSIONS[format]}"
+
+def render_lqip(image: Image.Image, width: int = LQIP_WIDTH) -> str:
+    """
+    A tiny, blurred JPEG of the image as a data: URI, a few hundred bytes that can be inlined in the page and
+    stretched behind the real image until it loads
+    """
+    height = max(1, round(image.height * width / image.width))
+    placeholder = image.resize((width, height), Image.Resampling.BILINEAR, reducing_gap=2.0).filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, format="JPEG", quality=40)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+def render_cover_variants(data: bytes, widths=COVER_WIDTHS, aspect=COVER_ASPECT, formats=None, quality=None) -> tuple:
+    """
+    Decodes an uploaded cover once, crops its centre to `aspect` and renders it in every width and format,
+    plus its LQIP. Widths over the upload's own aren't upscaled: if all are, the cover is kept at its width.
+    Returns ({(width, format): bytes}, lqip)
+    """
+    largest = max(widths)
+    image = crop_to_aspect(open_image(io.BytesIO(data), largest, round(largest / aspect)), aspect)
+    widths = [width for width in widths if width <= image.width] or [image.width]
+    return render_variants(image, widths, formats or supported_formats(), quality), render_lqip(image)
+
+def cover_variant_name(digest: str, width: int, format: str) -> str:
+    """
+    Storage name of a cover variant, by content hash only: cloned courses share their cover and its variants,
+    so these are never deleted
+    """
+    return f"covers/{digest}/{width}.{FORMAT_EXTENSIONS[format]}"
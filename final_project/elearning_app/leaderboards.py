@@ -0,0 +1,109 @@
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models import Count
+from django.utils import timezone
+from .caching import shared_cache
+from .metrics import record_cache_lookup
+from .models import *
+
+COURSE_LEADERBOARDS_KEY = "course_leaderboards"
+# Refreshed by the refresh_course_leaderboards task well before this runs out. The key is in the shared cache,
+# since the task writes it from a Celery worker and every web process reads it
+COURSE_LEADERBOARDS_TIMEOUT = 60 * 60
+
+def _leaderboard_size() -> int:
+    return getattr(settings, "COURSE_LEADERBOARD_SIZE", 12)
+
+def _course_entry(course: Course, **metrics) -> dict:
+    """
+    Compact, cacheable version of a course card. Keys mirror the model's attributes (and the with_stats()
+    annotations) so course_gallery.html renders entries exactly like Course instances
+    """
+    teacher = course.taught_by
+    return {
+        "pk": course.pk,
+        "id": course.pk,
+        "title": course.title,
+        "description": course.description,
+        "start_date": course.start_date,
+        "end_date": course.end_date,
+        "status": course.status,
+        "cover_image": {"url": course.cover_image.url} if course.cover_image else None,
+        "cover_srcsets": course.cover_srcsets,
+        "cover_image_lqip": course.cover_image_lqip,
+        "duration_weeks": course.duration_weeks,
+        "taught_by": {"pk": teacher.pk, "id": teacher.pk, "full_name": teacher.full_name},
+        "students_enrolled_count": course.students_enrolled_count,
+        "average_rating": course.average_rating,
+        "review_count": course.review_count,
+        **metrics,
+    }
+
+def _teacher_entry(teacher: User) -> dict:
+    return {
+        "pk": teacher.pk,
+        "id": teacher.pk,
+        "full_name": teacher.full_name,
+        "profile_picture": {"url": teacher.profile_picture.url} if teacher.profile_picture else None,
+    }
+
+def _cards(course_ids, metric_name=None, metrics=None) -> list:
+    """Loads the cards for course_ids in one query and returns their entries in the given order"""
+    courses = Course.objects.filter(pk__in=course_ids).select_related("taught_by").with_stats().with_status()
+    by_pk = {course.pk: course for course in courses}
+    entries = []
+    for course_id in course_ids:
+        if course_id in by_pk:
+            extra = {metric_name: metrics[course_id]} if metric_name else {}
+            entries.append(_course_entry(by_pk[course_id], **extra))
+    return entries
+
+def _most_enrolled(days: int, size: int) -> list:
+    since = timezone.now() - timedelta(days=days)
+    rows = Enrollment.objects.filter(
+        activated_on__gte=since,
+        course__is_published=True,
+        status__in=(Enrollment.EnrollmentStatus.ACTIVE, Enrollment.EnrollmentStatus.COMPLETED),
+    ).values("course_id").annotate(
+        recent_enrollments=Count("pk")
+    ).order_by("-recent_enrollments", "course_id")[:size]
+    metrics = {row["course_id"]: row["recent_enrollments"] for row in rows}
+    return _cards(list(metrics), "recent_enrollments", metrics)
+
+def build_course_leaderboards() -> dict:
+    """
+    Computes the ranked course leaderboards and the teacher list shown to anonymous visitors. Each board is
+    a list of card entries, ready to be rendered or serialized without touching the database
+    """
+    size = _leaderboard_size()
+    min_reviews = getattr(settings, "COURSE_LEADERBOARD_MIN_REVIEWS", 3)
+
+    highest_rated = Course.objects.filter(
+        is_published=True, stats__rating_count__gte=min_reviews
+    ).with_stats().order_by("-average_rating", "-review_count", "pk").values_list("pk", flat=True)[:size]
+    newest = Course.objects.filter(is_published=True).order_by("-created_at", "-pk").values_list("pk", flat=True)[:size]
+    teacher_group, _ = Group.objects.get_or_create(name=User.UserRole.TEACHER)
+    teachers = teacher_group.user_set.filter(is_active=True).order_by("first_name", "last_name")
+
+    return {
+        "generated_at": timezone.now(),
+        "most_enrolled_7d": _most_enrolled(7, size),
+        "most_enrolled_30d": _most_enrolled(30, size),
+        "highest_rated": _cards(list(highest_rated)),
+        "newest": _cards(list(newest)),
+        "teachers": [_teacher_entry(teacher) for teacher in teachers],
+    }
+
+def cache_course_leaderboards() -> dict:
+    leaderboards = build_course_leaderboards()
+    shared_cache().set(COURSE_LEADERBOARDS_KEY, leaderboards, COURSE_LEADERBOARDS_TIMEOUT)
+    return leaderboards
+
+def get_course_leaderboards() -> dict:
+    """Returns the cached leaderboards, building them inline only if the periodic task hasn't run yet"""
+    leaderboards = shared_cache().get(COURSE_LEADERBOARDS_KEY)
+    record_cache_lookup("leaderboards", leaderboards is not None)
+    if leaderboards is None:
+        leaderboards = cache_course_leaderboards()
+    return leaderboards
@@ -0,0 +1,37 @@
+import json
+import math
+import platform
+from django.utils import timezone
+
+def percentile(values, pct: float) -> float:
+    """Returns the pct-th percentile (0-100) of values using nearest-rank, or 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def latency_summary(seconds) -> dict:
+    """Summarises a list of durations in seconds as p50/p95/p99/max in milliseconds"""
+    return {
+        "count": len(seconds),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+def write_results(path: str, name: str, parameters: dict, results: dict) -> dict:
+    """Writes a benchmark report as JSON so runs can be diffed against each other. Returns the report"""
+    report = {
+        "benchmark": name,
+        "run_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "parameters": parameters,
+        "results": results,
+    }
+    if path:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
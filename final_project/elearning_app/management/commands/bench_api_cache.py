@@ -0,0 +1,121 @@
+import json
+import random
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from elearning_app.api import CourseDetailView, LessonListCreateView, ModuleListCreateView
+from elearning_app.caching import api_response_cache
+from elearning_app.models import *
+from ._bench import latency_summary, write_results
+
+class Command(BaseCommand):
+    help = "Replays student reads of a course's API endpoints with and without the shared response cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", type=int, default=10, help="Modules in the course")
+        parser.add_argument("--lessons", type=int, default=10, help="Lessons per module")
+        parser.add_argument("--students", type=int, default=200, help="Students issuing requests")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests replayed per run")
+        parser.add_argument("--write-every", type=int, default=500, help="Edit a lesson every N requests (0 to never)")
+        parser.add_argument("--output", default="bench_api_cache.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["modules"] < 1 or options["requests"] < 1 or options["students"] < 1:
+            raise CommandError("--modules, --requests and --students must be positive")
+
+        teacher, students, course = self.create_fixtures(options)
+        try:
+            module_ids = list(Module.objects.filter(course=course).values_list("pk", flat=True))
+            rng = random.Random(options["requests"])
+            # The same workload is replayed for both runs
+            workload = [(rng.choice(students), rng.randrange(3), rng.choice(module_ids)) for _ in range(options["requests"])]
+
+            results = {}
+            for name, enabled in (("uncached", False), ("cached", True)):
+                api_response_cache().clear()
+                with override_settings(API_RESPONSE_CACHE_ENABLED=enabled):
+                    results[name] = self.replay(course, workload, options["write_every"])
+            results["speedup_p50"] = round(
+                results["uncached"]["latency"]["p50_ms"] / max(results["cached"]["latency"]["p50_ms"], 0.001), 1
+            )
+        finally:
+            # Queryset deletes bypass User.delete so the benchmark users are removed instead of deactivated
+            Course.objects.filter(pk=course.pk).delete()
+            User.objects.filter(pk__in=[teacher.pk] + [student.pk for student in students]).delete()
+
+        parameters = {key: options[key] for key in ("modules", "lessons", "students", "requests", "write_every")}
+        report = write_results(options["output"], "api_response_cache", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def replay(self, course, workload, write_every) -> dict:
+        factory = APIRequestFactory()
+        endpoints = (
+            (CourseDetailView.as_view(), lambda module_id: (f"/api/courses/{course.pk}/", {"pk": course.pk})),
+            (ModuleListCreateView.as_view(), lambda module_id: (f"/api/courses/{course.pk}/modules/", {"pk": course.pk})),
+            (LessonListCreateView.as_view(), lambda module_id: (f"/api/modules/{module_id}/lessons/", {"pk": module_id})),
+        )
+        timings = []
+        by_state = {"HIT": [], "MISS": []}
+        for i, (student, endpoint, module_id) in enumerate(workload):
+            if write_every and i and i % write_every == 0:
+                # A syllabus edit bumps the course's content version, invalidating its cached responses
+                lesson = Lesson.objects.filter(module_id=module_id).first()
+                lesson.title = f"Edited lesson {i}"
+                lesson.save()
+
+            view, route = endpoints[endpoint]
+            url, kwargs = route(module_id)
+            request = factory.get(url)
+            force_authenticate(request, user=student)
+            started = time.perf_counter()
+            response = view(request, **kwargs)
+            response.render()
+            elapsed = time.perf_counter() - started
+            timings.append(elapsed)
+            if response.has_header("X-Cache"):
+                by_state[response["X-Cache"]].append(elapsed)
+
+        cached = len(by_state["HIT"]) + len(by_state["MISS"])
+        return {
+            "latency": latency_summary(timings),
+            "hit_latency": latency_summary(by_state["HIT"]),
+            "miss_latency": latency_summary(by_state["MISS"]),
+            "hit_rate": round(len(by_state["HIT"]) / cached, 3) if cached else 0.0,
+        }
+
+    def create_fixtures(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        today = timezone.now().date()
+        password = make_password(None)
+
+        teacher = User.objects.create(
+            email=f"bench-api-cache-{run_id}@example.invalid", first_name="Bench", last_name="Teacher", password=password,
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        students = User.objects.bulk_create([
+            User(email=f"bench-api-cache-{run_id}-{i}@example.invalid", first_name="Bench", last_name=f"Student {i}", password=password)
+            for i in range(options["students"])
+        ])
+        student_group, _ = Group.objects.get_or_create(name=User.UserRole.STUDENT)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=student.pk, group_id=student_group.pk) for student in students
+        ])
+
+        course = Course.objects.create(
+            title="Benchmark course", description="A synthetic course used to benchmark the API response cache.",
+            start_date=today, end_date=today, taught_by=teacher, is_published=True,
+        )
+        modules = Module.objects.bulk_create([
+            Module(course=course, title=f"Module {i}") for i in range(options["modules"])
+        ])
+        Lesson.objects.bulk_create([
+            Lesson(module=module, title=f"Lesson {i}", description="Synthetic lesson content. " * 10)
+            for module in modules for i in range(options["lessons"])
+        ])
+        Enrollment.objects.bulk_create([Enrollment(course=course, student=student) for student in students])
+        return teacher, students, course
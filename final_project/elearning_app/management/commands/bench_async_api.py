@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+from elearning_app.models import *
+from ._bench import latency_summary, write_results
+
+# URL names of each endpoint's sync (DRF) and async version
+VARIANTS = {
+    "sync": {
+        "messages": "api_chat_messages",
+        "notifications": "api_notifications",
+        "dismiss": "api_notification_read",
+        "progress": "api_lesson_progress",
+    },
+    "async": {
+        "messages": "api_async_chat_messages",
+        "notifications": "api_async_notifications",
+        "dismiss": "api_async_notification_read",
+        "progress": "api_async_lesson_progress",
+    },
+}
+
+class Command(BaseCommand):
+    help = (
+        "Drives the same mixed chat/notification/progress workload through the sync API views and their async "
+        "versions, with many requests in flight on one event loop as under a single ASGI worker, and reports "
+        "throughput, latency per endpoint and the threads used"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50, help="Number of simulated students")
+        parser.add_argument("--requests", type=int, default=2000, help="Requests sent per variant")
+        parser.add_argument("--concurrency", type=int, default=100, help="Requests in flight at once")
+        parser.add_argument("--notifications", type=int, default=30, help="Notifications created per student")
+        parser.add_argument("--output", default="bench_async_api.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--users, --requests and --concurrency must be positive")
+
+        channel_layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+        fixtures = self.create_fixtures(options["users"], options["notifications"])
+        try:
+            # Queries aren't counted, as they would be in DEBUG, so both variants run as in production
+            with override_settings(CHANNEL_LAYERS=channel_layers, QUERY_BUDGET_ENABLED=False):
+                results = {variant: asyncio.run(self.run_load(variant, fixtures, options)) for variant in VARIANTS}
+        finally:
+            self.delete_fixtures(fixtures)
+
+        results["speedup"] = round(results["async"]["requests_per_sec"] / results["sync"]["requests_per_sec"], 2)
+        parameters = {key: options[key] for key in ("users", "requests", "concurrency", "notifications")}
+        report = write_results(options["output"], "async_api_views", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def create_fixtures(self, user_count, notification_count):
+        """Creates throwaway students sharing a chat and a course lesson, each with their own notifications"""
+        run_id = uuid.uuid4().hex[:8]
+        password = make_password(None)
+        teacher = User.objects.create(email=f"bench-{run_id}-teacher@example.invalid", first_name="Bench", last_name="Teacher", password=password)
+        teacher.set_role(User.UserRole.TEACHER)
+        students = User.objects.bulk_create([
+            User(email=f"bench-{run_id}-{i}@example.invalid", first_name="Bench", last_name=f"Student {i}", password=password)
+            for i in range(user_count)
+        ])
+        student_group, _ = Group.objects.get_or_create(name=User.UserRole.STUDENT)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=student.pk, group_id=student_group.pk) for student in students
+        ])
+
+        course = Course.objects.create(
+            title=f"Benchmark course {run_id}", description="Async API benchmark", taught_by=teacher,
+            start_date="2025-01-01", end_date="2025-12-31", is_published=True,
+        )
+        lesson = Lesson.objects.create(module=Module.objects.create(course=course, title="Module"), title="Lesson")
+        chat = Chat.objects.create(title=f"Benchmark chat {run_id}", created_by=teacher)
+        ChatParticipant.objects.bulk_create([ChatParticipant(chat=chat, user=student) for student in students])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(chat=chat, sender=student, text=f"Message {i}") for i, student in enumerate(students * 2)
+        ])
+        notifications = Notification.objects.bulk_create([
+            Notification(user=student, related_course=course, content=f"Notification {i}")
+            for student in students for i in range(notification_count)
+        ])
+        notification_ids = {}
+        for notification in notifications:
+            notification_ids.setdefault(notification.user_id, []).append(notification.pk)
+
+        return {
+            "teacher": teacher,
+            "students": students,
+            "course": course,
+            "lesson": lesson,
+            "chat": chat,
+            "tokens": {student.pk: str(AccessToken.for_user(student)) for student in students},
+            "notification_ids": notification_ids,
+        }
+
+    def delete_fixtures(self, fixtures):
+        fixtures["chat"].delete()
+        fixtures["course"].delete()
+        # Queryset delete bypasses User.delete so the benchmark users are removed instead of deactivated
+        User.objects.filter(pk__in=[fixtures["teacher"].pk, *(student.pk for student in fixtures["students"])]).delete()
+
+    def build_request(self, variant, fixtures, index):
+        """The index-th request of the workload: half reads, half writes, cycling over students and endpoints"""
+        names = VARIANTS[variant]
+        student = fixtures["students"][index % len(fixtures["students"])]
+        operation = ("messages", "notifications", "post_message", "dismiss", "progress")[index % 5]
+        if operation == "messages":
+            return operation, "get", reverse(names["messages"], kwargs={"pk": fixtures["chat"].pk}), None, student
+        if operation == "notifications":
+            return operation, "get", reverse(names["notifications"]), None, student
+        if operation == "post_message":
+            # The DRF serializer also validates chat and sender, which the async view takes from the URL and user
+            data = {"text": f"Benchmark {index}", "chat": fixtures["chat"].pk, "sender": student.pk}
+            return operation, "post", reverse(names["messages"], kwargs={"pk": fixtures["chat"].pk}), data, student
+        if operation == "dismiss":
+            ids = fixtures["notification_ids"][student.pk]
+            return operation, "post", reverse(names["dismiss"], kwargs={"pk": ids[index % len(ids)]}), None, student
+        data = {"completed": index % 2 == 0}
+        return operation, "put", reverse(names["progress"], kwargs={"pk": fixtures["lesson"].pk}), data, student
+
+    async def run_load(self, variant, fixtures, options):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        latencies = {}
+        statuses = {}
+        peak_threads = threading.active_count()
+
+        async def send(index):
+            nonlocal peak_threads
+            operation, method, url, data, student = self.build_request(variant, fixtures, index)
+            headers = {"Authorization": f"Bearer {fixtures['tokens'][student.pk]}"}
+            async with semaphore:
+                started = time.perf_counter()
+                if data is None:
+                    response = await getattr(client, method)(url, headers=headers)
+                else:
+                    response = await getattr(client, method)(url, data, content_type="application/json", headers=headers)
+                latencies.setdefault(operation, []).append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            peak_threads = max(peak_threads, threading.active_count())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(index) for index in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_sec": round(options["requests"] / elapsed, 2),
+            "statuses": {str(code): count for code, count in sorted(statuses.items())},
+            "peak_threads": peak_threads,
+            "latency": latency_summary([value for values in latencies.values() for value in values]),
+            "latency_by_endpoint": {operation: latency_summary(values) for operation, values in sorted(latencies.items())},
+        }
@@ -0,0 +1,150 @@
+import json
+import random
+import time
+import tracemalloc
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import Coalesce
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from elearning_app.models import *
+from elearning_app.views import CourseCatalogMixin, course_card_queryset
+from ._bench import latency_summary, write_results
+
+class Command(BaseCommand):
+    help = "Compares the legacy deep-prefetch course listing against the paginated card projection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=5000, help="Number of synthetic courses to create")
+        parser.add_argument("--modules", type=int, default=4, help="Modules per course")
+        parser.add_argument("--lessons", type=int, default=4, help="Lessons per module")
+        parser.add_argument("--students", type=int, default=200, help="Size of the student pool")
+        parser.add_argument("--enrollments", type=int, default=20, help="Enrollments per course")
+        parser.add_argument("--repeat", type=int, default=5, help="Times each listing is rendered")
+        parser.add_argument("--batch-size", type=int, default=5000, help="bulk_create batch size")
+        parser.add_argument("--output", default="bench_catalog.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["courses"] < 1 or options["repeat"] < 1:
+            raise CommandError("--courses and --repeat must be positive")
+        if options["enrollments"] > options["students"]:
+            raise CommandError("--enrollments cannot exceed --students")
+
+        teacher, students = self.create_fixtures(options)
+        try:
+            base = Course.objects.filter(taught_by=teacher, is_published=True)
+            strategies = {
+                "legacy": lambda: self.render_legacy(base),
+                "catalog": lambda: self.render_catalog(base),
+            }
+            results = {}
+            for name, render in strategies.items():
+                render()  # warm up connections and template caches
+                timings = []
+                for _ in range(options["repeat"]):
+                    started = time.perf_counter()
+                    render()
+                    timings.append(time.perf_counter() - started)
+
+                with CaptureQueriesContext(connection) as queries:
+                    tracemalloc.start()
+                    html = render()
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                results[name] = {
+                    "latency": latency_summary(timings),
+                    "queries": len(queries),
+                    "peak_memory_kb": round(peak / 1024, 1),
+                    "html_bytes": len(html),
+                }
+            results["speedup_p50"] = round(
+                results["legacy"]["latency"]["p50_ms"] / max(results["catalog"]["latency"]["p50_ms"], 0.001), 1
+            )
+            results["memory_ratio"] = round(
+                results["legacy"]["peak_memory_kb"] / max(results["catalog"]["peak_memory_kb"], 0.1), 1
+            )
+        finally:
+            # Queryset deletes bypass User.delete so the benchmark users are removed instead of deactivated
+            Course.objects.filter(taught_by=teacher).delete()
+            User.objects.filter(pk__in=[teacher.pk] + [student.pk for student in students]).delete()
+
+        parameters = {
+            key: options[key]
+            for key in ("courses", "modules", "lessons", "students", "enrollments", "repeat")
+        }
+        report = write_results(options["output"], "course_catalog", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def render_legacy(self, base):
+        """The listing as it was: every matching course with its full tree prefetched"""
+        courses = base.prefetch_related(
+            "modules", "modules__lessons", "modules__assignments",
+            "enrollments__student", "status_updates"
+        ).select_related("taught_by").annotate(
+            students_enrolled_count=Count(
+                "enrollments__student",
+                filter=Q(enrollments__status=Enrollment.EnrollmentStatus.ACTIVE),
+                distinct=True
+            ),
+            average_rating=Coalesce(Avg("course_reviews__rating"), 0.0),
+            review_count=Count("course_reviews", distinct=True)
+        ).distinct()
+        return render_to_string("components/course_gallery.html", {"courses": courses, "view": "stats"})
+
+    def render_catalog(self, base):
+        """The first page of the card projection, as CourseListView serves it"""
+        queryset = course_card_queryset(base).order_by("-created_at", "-pk")
+        page = Paginator(queryset, CourseCatalogMixin.paginate_by).page(1)
+        return render_to_string(
+            "components/course_gallery.html",
+            {"courses": page.object_list, "page_obj": page, "view": "stats"},
+        )
+
+    def create_fixtures(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        rng = random.Random(options["courses"])
+        today = timezone.now().date()
+        batch_size = options["batch_size"]
+        password = make_password(None)
+
+        teacher = User.objects.create(
+            email=f"bench-catalog-{run_id}@example.invalid", first_name="Bench", last_name="Teacher",
+            password=password,
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        students = User.objects.bulk_create([
+            User(email=f"bench-catalog-{run_id}-{i}@example.invalid", first_name="Bench", last_name=f"Student {i}", password=password)
+            for i in range(options["students"])
+        ], batch_size=batch_size)
+        courses = Course.objects.bulk_create([
+            Course(
+                title=f"Benchmark course {i}",
+                description="A synthetic course used to benchmark the catalog listing. " * 5,
+                start_date=today,
+                end_date=today,
+                taught_by=teacher,
+                is_published=True,
+            )
+            for i in range(options["courses"])
+        ], batch_size=batch_size)
+        modules = Module.objects.bulk_create([
+            Module(course=course, title=f"Module {i}")
+            for course in courses for i in range(options["modules"])
+        ], batch_size=batch_size)
+        Lesson.objects.bulk_create([
+            Lesson(module=module, title=f"Lesson {i}", description="Synthetic lesson content. " * 10)
+            for module in modules for i in range(options["lessons"])
+        ], batch_size=batch_size)
+        Enrollment.objects.bulk_create([
+            Enrollment(course=course, student=student)
+            for course in courses for student in rng.sample(students, options["enrollments"])
+        ], batch_size=batch_size)
+        # bulk_create skips the signals that maintain course statistics
+        CourseStats.rebuild([course.pk for course in courses])
+        return teacher, students
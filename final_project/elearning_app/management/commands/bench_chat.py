@@ -0,0 +1,162 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from elearning_app.consumers import outbound_metrics
+from elearning_app.models import *
+from elearning_app.routing import websocket_urlpatterns
+from ._bench import latency_summary, write_results
+
+class Command(BaseCommand):
+    help = "Load-tests ChatConsumer over an in-memory channel layer and reports delivery latency and throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--participants", type=int, default=100, help="Number of simulated participants (N)")
+        parser.add_argument("--chats", type=int, default=10, help="Number of chats the participants are spread across (M)")
+        parser.add_argument("--rate", type=float, default=1.0, help="Messages per second sent by each participant")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds to drive traffic for")
+        parser.add_argument("--drain", type=float, default=2.0, help="Seconds to keep receiving after the last send")
+        parser.add_argument("--capacity", type=int, default=1000, help="Capacity of each in-memory channel")
+        parser.add_argument("--output", default="bench_chat.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["participants"] < 1 or options["chats"] < 1 or options["rate"] <= 0:
+            raise CommandError("--participants, --chats and --rate must be positive")
+
+        channel_layers = {
+            "default": {
+                "BACKEND": "channels.layers.InMemoryChannelLayer",
+                "CONFIG": {"capacity": options["capacity"]},
+            }
+        }
+        users, chats = self.create_fixtures(options["participants"], options["chats"])
+        try:
+            with override_settings(CHANNEL_LAYERS=channel_layers):
+                results = asyncio.run(self.run_load(users, chats, options))
+            results["db_writes"] = ChatMessage.objects.filter(chat__in=chats).count()
+            results["db_writes_per_sec"] = round(results["db_writes"] / results["elapsed_s"], 2)
+        finally:
+            self.delete_fixtures(users, chats)
+
+        parameters = {key: options[key] for key in ("participants", "chats", "rate", "duration", "drain", "capacity")}
+        report = write_results(options["output"], "chat_consumer_load", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def create_fixtures(self, participant_count, chat_count):
+        """Creates throwaway users, chats and participants for the run"""
+        run_id = uuid.uuid4().hex[:8]
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(email=f"bench-{run_id}-{i}@example.invalid", first_name="Bench", last_name=f"User {i}", password=password)
+            for i in range(participant_count)
+        ])
+        chats = Chat.objects.bulk_create([
+            Chat(title=f"Benchmark chat {run_id}-{i}", created_by=users[i % len(users)])
+            for i in range(chat_count)
+        ])
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(chat=chats[i % len(chats)], user=user)
+            for i, user in enumerate(users)
+        ])
+        return users, chats
+
+    def delete_fixtures(self, users, chats):
+        Chat.objects.filter(pk__in=[chat.pk for chat in chats]).delete()
+        # Queryset delete bypasses User.delete so the benchmark users are removed instead of deactivated
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    async def run_load(self, users, chats, options):
+        application = URLRouter(websocket_urlpatterns)
+        interval = 1 / options["rate"]
+        sent_at = {}
+        latencies = []
+        counters = {"sent": 0, "expected": 0, "delivered": 0, "errors": 0, "unknown": 0}
+        sending = asyncio.Event()
+
+        connections = []
+        for i, user in enumerate(users):
+            chat = chats[i % len(chats)]
+            communicator = WebsocketCommunicator(application, f"/ws/chat/{chat.pk}/")
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise CommandError(f"Participant {user.pk} could not connect to chat {chat.pk}")
+            connections.append((communicator, user.pk, chat.pk))
+
+        # Every message fans out to all participants of its chat, including the sender
+        chat_sizes = {}
+        for _, _, chat_pk in connections:
+            chat_sizes[chat_pk] = chat_sizes.get(chat_pk, 0) + 1
+
+        async def send_loop(communicator, user_pk, chat_pk):
+            await asyncio.sleep(random.uniform(0, interval))
+            seq = 0
+            while sending.is_set():
+                message_id = f"{user_pk}:{seq}"
+                sent_at[message_id] = time.perf_counter()
+                await communicator.send_to(text_data=json.dumps({
+                    "message": message_id,
+                    "user_pk": user_pk,
+                    "chat_pk": chat_pk,
+                }))
+                counters["sent"] += 1
+                counters["expected"] += chat_sizes[chat_pk]
+                seq += 1
+                await asyncio.sleep(interval)
+
+        async def receive_loop(communicator):
+            # Read the output queue directly: receive_from() tears the consumer down when it times out
+            while True:
+                output = await communicator.output_queue.get()
+                received_at = time.perf_counter()
+                if output["type"] != "websocket.send":
+                    continue
+                frame = json.loads(output["text"])
+                frames = frame["messages"] if frame.get("type") == "batch" else [frame]
+                for frame in frames:
+                    if "error" in frame:
+                        counters["errors"] += 1
+                        continue
+                    started = sent_at.get(frame.get("message"))
+                    if started is None:
+                        counters["unknown"] += 1
+                        continue
+                    latencies.append(received_at - started)
+                    counters["delivered"] += 1
+
+        sending.set()
+        started = time.perf_counter()
+        receivers = [asyncio.create_task(receive_loop(c)) for c, _, _ in connections]
+        senders = [asyncio.create_task(send_loop(c, user_pk, chat_pk)) for c, user_pk, chat_pk in connections]
+
+        await asyncio.sleep(options["duration"])
+        sending.clear()
+        await asyncio.gather(*senders)
+        await asyncio.sleep(options["drain"])
+        for receiver in receivers:
+            receiver.cancel()
+        await asyncio.gather(*receivers, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        for communicator, _, _ in connections:
+            await communicator.disconnect()
+
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "messages_sent": counters["sent"],
+            "messages_delivered": counters["delivered"],
+            "deliveries_expected": counters["expected"],
+            "deliveries_lost": counters["expected"] - counters["delivered"],
+            "error_frames": counters["errors"],
+            "unknown_frames": counters["unknown"],
+            "messages_sent_per_sec": round(counters["sent"] / elapsed, 2),
+            "messages_delivered_per_sec": round(counters["delivered"] / elapsed, 2),
+            "delivery_latency": latency_summary(latencies),
+            "outbound": outbound_metrics.snapshot(),
+        }
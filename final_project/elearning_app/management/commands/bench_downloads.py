@@ -0,0 +1,164 @@
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+from elearning_app.models import *
+from ._bench import latency_summary, write_results
+
+MIB = 1024 * 1024
+
+class Command(BaseCommand):
+    help = (
+        "Downloads a large generated video through the authorized lesson file view: whole, resumed halfway, as "
+        "random seeks of Range requests and offloaded with X-Accel-Redirect, plus a plain read of the file as "
+        "the upper bound, and reports throughput and latency of each"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=512, help="Size of the generated video in MiB")
+        parser.add_argument("--repeat", type=int, default=3, help="Whole-file downloads per scenario")
+        parser.add_argument("--seeks", type=int, default=200, help="Range requests in the seek scenario")
+        parser.add_argument("--seek-size", type=int, default=1, help="MiB requested by each seek")
+        parser.add_argument("--output", default="bench_downloads.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["size"] < 1 or options["repeat"] < 1 or options["seeks"] < 1 or options["seek_size"] < 1:
+            raise CommandError("--size, --repeat, --seeks and --seek-size must be positive")
+        if options["seek_size"] > options["size"]:
+            raise CommandError("--seek-size can't be over --size")
+
+        with tempfile.TemporaryDirectory() as directory:
+            size = options["size"] * MIB
+            self.generate_video(os.path.join(directory, "lecture.mp4"), size)
+            # Queries aren't counted, as they would be in DEBUG, so the view runs as in production
+            with override_settings(MEDIA_ROOT=directory, QUERY_BUDGET_ENABLED=False):
+                fixtures = self.create_fixtures()
+                try:
+                    results = self.run_scenarios(fixtures, os.path.join(directory, "lecture.mp4"), size, options)
+                finally:
+                    self.delete_fixtures(fixtures)
+
+        parameters = {key: options[key] for key in ("size", "repeat", "seeks", "seek_size")}
+        report = write_results(options["output"], "authorized_downloads", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def generate_video(self, path, size):
+        """Incompressible bytes, like encoded video, written a MiB at a time"""
+        block = os.urandom(MIB)
+        with open(path, "wb") as file:
+            for _ in range(size // MIB):
+                file.write(block)
+
+    def create_fixtures(self):
+        run_id = uuid.uuid4().hex[:8]
+        teacher = User.objects.create(email=f"bench-{run_id}-teacher@example.invalid", first_name="Bench", last_name="Teacher", password=make_password(None))
+        teacher.set_role(User.UserRole.TEACHER)
+        course = Course.objects.create(
+            title=f"Benchmark course {run_id}", description="Download benchmark", taught_by=teacher,
+            start_date="2025-01-01", end_date="2025-12-31",
+        )
+        module = Module.objects.create(course=course, title="Module")
+        lesson = Lesson.objects.create(module=module, title="Lecture", lesson_file="lecture.mp4")
+        return {"teacher": teacher, "course": course, "lesson": lesson}
+
+    def delete_fixtures(self, fixtures):
+        fixtures["course"].delete()
+        # Queryset delete bypasses User.delete so the benchmark user is removed instead of deactivated
+        User.objects.filter(pk=fixtures["teacher"].pk).delete()
+
+    def download(self, client, url, headers=None) -> tuple:
+        """Requests url and reads the whole body. Returns (status, bytes received, seconds)"""
+        started = time.perf_counter()
+        response = client.get(url, headers=headers or {})
+        received = 0
+        if response.streaming:
+            for chunk in response.streaming_content:
+                received += len(chunk)
+        else:
+            received = len(response.content)
+        response.close()
+        return response.status_code, received, time.perf_counter() - started
+
+    def throughput(self, durations, sizes) -> dict:
+        return {
+            "mib_per_sec": round(sum(sizes) / MIB / sum(durations), 1),
+            "latency": latency_summary(durations),
+        }
+
+    def run_scenarios(self, fixtures, path, size, options) -> dict:
+        client = Client()
+        client.force_login(fixtures["teacher"])
+        url = reverse("lesson-file", kwargs={"pk": fixtures["lesson"].pk})
+        results = {}
+
+        # Reading the file straight from disk (the page cache, after the first pass): what any server tops out at
+        durations = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            with open(path, "rb") as file:
+                while file.read(MIB):
+                    pass
+            durations.append(time.perf_counter() - started)
+        results["disk_read"] = self.throughput(durations, [size] * options["repeat"])
+
+        # Whole downloads with FileResponse's own 4KiB reads against DOWNLOAD_CHUNK_SIZE ones
+        for name, chunk_size in (("full_4kib_chunks", 4096), ("full", None)):
+            overrides = {"DOWNLOAD_CHUNK_SIZE": chunk_size} if chunk_size else {}
+            durations, sizes = [], []
+            with override_settings(**overrides):
+                for _ in range(options["repeat"]):
+                    status, received, seconds = self.download(client, url)
+                    if status != 200 or received != size:
+                        raise CommandError(f"{name}: got {status} with {received} bytes")
+                    durations.append(seconds)
+                    sizes.append(received)
+            results[name] = self.throughput(durations, sizes)
+
+        # A download resumed halfway through
+        status, received, seconds = self.download(client, url, {"Range": f"bytes={size // 2}-"})
+        if status != 206 or received != size - size // 2:
+            raise CommandError(f"resume: got {status} with {received} bytes")
+        results["resume_half"] = self.throughput([seconds], [received])
+
+        # A player seeking around the video
+        seek_size = options["seek_size"] * MIB
+        generator = random.Random(0)
+        durations, sizes = [], []
+        for _ in range(options["seeks"]):
+            first = generator.randrange(0, size - seek_size + 1)
+            status, received, seconds = self.download(client, url, {"Range": f"bytes={first}-{first + seek_size - 1}"})
+            if status != 206 or received != seek_size:
+                raise CommandError(f"seek: got {status} with {received} bytes")
+            durations.append(seconds)
+            sizes.append(received)
+        results["seek"] = self.throughput(durations, sizes)
+
+        # Offloaded: Django only authorizes and answers with headers, so this is its whole cost per download
+        durations = []
+        with override_settings(DOWNLOAD_OFFLOAD="x-accel-redirect"):
+            for _ in range(options["seeks"]):
+                status, received, seconds = self.download(client, url)
+                if status != 200 or received != 0:
+                    raise CommandError(f"offload: got {status} with {received} bytes")
+                durations.append(seconds)
+        results["offload_x_accel_redirect"] = {"latency": latency_summary(durations)}
+
+        # Revalidating a cached copy
+        response = client.get(url, headers={"Range": "bytes=0-0"})
+        etag = response["ETag"]
+        response.close()
+        durations = []
+        for _ in range(options["seeks"]):
+            status, _, seconds = self.download(client, url, {"If-None-Match": etag})
+            if status != 304:
+                raise CommandError(f"revalidate: got {status}")
+            durations.append(seconds)
+        results["revalidate_304"] = {"latency": latency_summary(durations)}
+        return results
@@ -0,0 +1,123 @@
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw
+from elearning_app.images import AVATAR_SIZES, FORMAT_EXTENSIONS, render_avatar_variants
+from ._bench import latency_summary, write_results
+
+# Run in a fresh interpreter per pipeline, so each peak RSS is that pipeline's alone. "baseline" only imports
+# Pillow and reads the file, the memory every pipeline starts from
+CHILD_SCRIPT = """
+import io, json, resource, sys, time
+from PIL import Image
+
+def peak_rss_kib():
+    # VmHWM starts over at exec, while ru_maxrss can still hold the RSS of the parent at fork time
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def legacy(data):
+    # The previous resize_profile_picture: full decode, RGB, centre crop, one 200x200 JPEG
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    image = image.crop((left, top, left + side, top + side)).resize((200, 200), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return {(200, "JPEG"): buffer.getvalue()}
+
+def variants(data):
+    from elearning_app.images import render_avatar_variants
+    return render_avatar_variants(data)
+
+pipeline, path, repeat = sys.argv[1], sys.argv[2], int(sys.argv[3])
+with open(path, "rb") as file:
+    data = file.read()
+durations = []
+for _ in range(repeat):
+    started = time.perf_counter()
+    if pipeline != "baseline":
+        output = {"legacy": legacy, "variants": variants}[pipeline](data)
+    durations.append(time.perf_counter() - started)
+print(json.dumps({"durations": durations, "peak_rss_kib": peak_rss_kib()}))
+"""
+
+class Command(BaseCommand):
+    help = (
+        "Measures peak RSS and time of the profile picture pipeline, the previous full-decode resize against the "
+        "draft-mode multi-variant one, each in its own subprocess, and the bytes each avatar size transfers"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--image", help="JPEG to process, by default a generated photo-sized one")
+        parser.add_argument("--width", type=int, default=4032, help="Width of the generated image")
+        parser.add_argument("--height", type=int, default=3024, help="Height of the generated image")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per pipeline, for the timings")
+        parser.add_argument("--output", default="bench_images.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = options["image"]
+            if not path:
+                path = str(Path(directory) / "upload.jpg")
+                self.generate_image(options["width"], options["height"]).save(path, format="JPEG", quality=90)
+            data = Path(path).read_bytes()
+
+            runs = {pipeline: self.run_child(pipeline, path, options["repeat"]) for pipeline in ("baseline", "legacy", "variants")}
+
+        baseline_kib = runs["baseline"]["peak_rss_kib"]
+        results = {"upload_bytes": len(data)}
+        for pipeline in ("legacy", "variants"):
+            results[pipeline] = {
+                "peak_rss_mib": round(runs[pipeline]["peak_rss_kib"] / 1024, 1),
+                "rss_over_baseline_mib": round((runs[pipeline]["peak_rss_kib"] - baseline_kib) / 1024, 1),
+                "duration": latency_summary(runs[pipeline]["durations"]),
+            }
+        results["baseline_rss_mib"] = round(baseline_kib / 1024, 1)
+
+        # What each avatar size sends: previously always the 200px JPEG, now the 2x variant in the best format
+        variants = render_avatar_variants(data)
+        results["variant_bytes"] = {
+            f"{size}.{FORMAT_EXTENSIONS[format]}": len(content) for (size, format), content in sorted(variants.items())
+        }
+        legacy_bytes = len(variants[200, "JPEG"])
+        results["bytes_per_avatar"] = {}
+        for css_px in (32, 48, 96, 200):
+            size = min((size for size in AVATAR_SIZES if size >= css_px * 2), default=max(AVATAR_SIZES))
+            best = min(len(content) for (variant_size, _), content in variants.items() if variant_size == size)
+            results["bytes_per_avatar"][f"{css_px}px"] = {"before": legacy_bytes, "after": best, "variant": size}
+
+        parameters = {"image": options["image"] or f"generated {options['width']}x{options['height']}", "repeat": options["repeat"]}
+        report = write_results(options["output"], "profile_image_pipeline", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def generate_image(self, width, height) -> Image.Image:
+        """A photo-sized image with gradients and shapes, so it compresses roughly like a real photo"""
+        image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for i in range(0, min(width, height) // 2, 40):
+            draw.ellipse((i, i, width - i, height - i), outline=(i % 256, 255 - i % 256, (i * 7) % 256), width=12)
+        return image
+
+    def run_child(self, pipeline, path, repeat) -> dict:
+        completed = subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT, pipeline, path, str(repeat)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"The {pipeline} run failed:\n{completed.stderr}")
+        return json.loads(completed.stdout)
@@ -0,0 +1,124 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import Cursor, LimitOffsetPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+from elearning_app.api import StatusUpdateListCreateView
+from elearning_app.models import *
+from elearning_app.pagination import CreatedCursorPagination
+from ._bench import latency_summary, write_results
+
+class OffsetStatusUpdateListView(StatusUpdateListCreateView):
+    """The same list served with LIMIT/OFFSET pages, as a baseline"""
+    pagination_class = LimitOffsetPagination
+
+class Command(BaseCommand):
+    help = "Measures API list response times at increasing depths of a large table, cursor vs offset pagination"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic status updates")
+        parser.add_argument("--depths", default="0,1000,100000,500000,990000", help="Comma-separated row offsets to page from")
+        parser.add_argument("--page-size", type=int, default=25, help="Items per page")
+        parser.add_argument("--repeat", type=int, default=20, help="Requests per depth and strategy")
+        parser.add_argument("--batch-size", type=int, default=10000, help="bulk_create batch size")
+        parser.add_argument("--output", default="bench_pagination.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        depths = [int(depth) for depth in options["depths"].split(",") if depth.strip()]
+        if options["rows"] < 1 or options["repeat"] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+        if any(depth < 0 or depth >= options["rows"] for depth in depths):
+            raise CommandError("Every depth must be between 0 and --rows - 1")
+
+        student, teacher, course = self.create_fixtures(options)
+        try:
+            factory = APIRequestFactory()
+            url = "/api/users/status_updates/"
+            ordered = StatusUpdate.objects.order_by("-created_at", "-id").values_list("created_at", flat=True)
+            results = {}
+            for depth in depths:
+                position = ordered[depth]
+                cursor_query = {"page_size": options["page_size"]}
+                if depth:
+                    paginator = CreatedCursorPagination()
+                    paginator.base_url = url
+                    link = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=str(position)))
+                    cursor_query["cursor"] = parse_qs(urlparse(link).query)["cursor"][0]
+                strategies = {
+                    "cursor": (StatusUpdateListCreateView.as_view(), cursor_query),
+                    "offset": (OffsetStatusUpdateListView.as_view(), {"limit": options["page_size"], "offset": depth}),
+                }
+                results[depth] = {}
+                for name, (view, query) in strategies.items():
+                    timings = []
+                    for _ in range(options["repeat"] + 1):
+                        request = factory.get(url, query)
+                        force_authenticate(request, user=student)
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            response = view(request)
+                            response.render()
+                            elapsed = time.perf_counter() - started
+                        timings.append(elapsed)
+                    results[depth][name] = {
+                        "latency": latency_summary(timings[1:]),  # the first request warms up the connection
+                        "queries": len(queries),
+                        "items": len(response.data["results"]),
+                    }
+                results[depth]["speedup_p50"] = round(
+                    results[depth]["offset"]["latency"]["p50_ms"] / max(results[depth]["cursor"]["latency"]["p50_ms"], 0.001), 1
+                )
+        finally:
+            # Queryset deletes bypass User.delete so the benchmark users are removed instead of deactivated
+            StatusUpdate.objects.filter(course=course).delete()
+            Course.objects.filter(pk=course.pk).delete()
+            User.objects.filter(pk__in=[student.pk, teacher.pk]).delete()
+
+        parameters = {key: options[key] for key in ("rows", "page_size", "repeat")}
+        parameters["depths"] = depths
+        report = write_results(options["output"], "api_pagination", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def create_fixtures(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        today = timezone.now().date()
+        password = make_password(None)
+
+        teacher = User.objects.create(
+            email=f"bench-pagination-{run_id}-teacher@example.invalid", first_name="Bench", last_name="Teacher",
+            password=password,
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        student = User.objects.create(
+            email=f"bench-pagination-{run_id}@example.invalid", first_name="Bench", last_name="Student",
+            password=password,
+        )
+        student.set_role(User.UserRole.STUDENT)
+        course = Course.objects.create(
+            title="Benchmark course", start_date=today, end_date=today, taught_by=teacher, is_published=True
+        )
+        remaining = options["rows"]
+        while remaining:
+            size = min(remaining, options["batch_size"])
+            StatusUpdate.objects.bulk_create([
+                StatusUpdate(student=student, course=course, course_progress=0.0, text="Synthetic status update")
+                for _ in range(size)
+            ])
+            remaining -= size
+
+        # auto_now_add stamps the whole batch with the same time, so spread the rows one second apart
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {StatusUpdate._meta.db_table} SET created_at = %s - id * interval '1 second' WHERE course_id = %s",
+                [timezone.now() - timedelta(days=1), course.pk],
+            )
+            cursor.execute(f"ANALYZE {StatusUpdate._meta.db_table}")
+        return student, teacher, course
@@ -0,0 +1,105 @@
+import io
+import json
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from elearning_app import renderers
+from elearning_app.models import *
+from elearning_app.serializers import *
+from ._bench import latency_summary, write_results
+
+class Command(BaseCommand):
+    help = "Compares DRF's JSON renderer and parser with the orjson and MessagePack ones on serialized API payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=200, help="Courses in the course list payload")
+        parser.add_argument("--modules", type=int, default=5, help="Modules expanded per course")
+        parser.add_argument("--messages", type=int, default=2000, help="Messages in the chat history payload")
+        parser.add_argument("--repeat", type=int, default=20, help="Times each payload is rendered and parsed")
+        parser.add_argument("--output", default="bench_renderers.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["courses"] < 1 or options["messages"] < 1 or options["repeat"] < 1:
+            raise CommandError("--courses, --messages and --repeat must be positive")
+        if renderers.orjson is None:
+            raise CommandError("orjson isn't installed, the fast renderer would only measure its fallback")
+
+        teacher, course_ids, chat = self.create_fixtures(options)
+        try:
+            courses = Course.objects.filter(pk__in=course_ids).with_status().prefetch_related("modules").order_by("pk")
+            messages = ChatMessage.objects.filter(chat=chat).prefetch_related("attachments").order_by("-sent_at", "-id")
+            payloads = {
+                "course_list": CourseSerializer(courses, many=True, context={"expand": ["modules"]}).data,
+                "chat_history": ChatMessageSerializer(messages, many=True, context={"expand": ["attachments"]}).data,
+            }
+        finally:
+            # Queryset deletes bypass User.delete so the benchmark user is removed instead of deactivated
+            Course.objects.filter(pk__in=course_ids).delete()
+            Chat.objects.filter(pk=chat.pk).delete()
+            User.objects.filter(pk=teacher.pk).delete()
+
+        candidates = {"drf_json": JSONRenderer(), "orjson": renderers.FastJSONRenderer()}
+        if renderers.msgpack is not None:
+            candidates["msgpack"] = renderers.MessagePackRenderer()
+        results = {}
+        for name, data in payloads.items():
+            reference = JSONRenderer().render(data)
+            if json.loads(renderers.FastJSONRenderer().render(data)) != json.loads(reference):
+                raise CommandError(f"The orjson rendering of {name} differs from DRF's")
+
+            results[name] = {"items": len(data)}
+            for renderer_name, renderer in candidates.items():
+                results[name][f"render_{renderer_name}"] = self.measure(lambda: renderer.render(data), options["repeat"])
+                results[name][f"render_{renderer_name}"]["bytes"] = len(renderer.render(data))
+            for parser_name, parser in (("drf_json", JSONParser()), ("orjson", renderers.FastJSONParser())):
+                results[name][f"parse_{parser_name}"] = self.measure(
+                    lambda: parser.parse(io.BytesIO(reference), parser_context={}), options["repeat"]
+                )
+            for step in ("render", "parse"):
+                results[name][f"{step}_speedup"] = round(
+                    results[name][f"{step}_drf_json"]["latency"]["p50_ms"]
+                    / max(results[name][f"{step}_orjson"]["latency"]["p50_ms"], 0.001), 1
+                )
+
+        parameters = {key: options[key] for key in ("courses", "modules", "messages", "repeat")}
+        report = write_results(options["output"], "renderers", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def measure(self, run, repeat: int) -> dict:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return {"latency": latency_summary(timings)}
+
+    def create_fixtures(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        today = timezone.now().date()
+
+        teacher = User.objects.create(
+            email=f"bench-renderers-{run_id}@example.invalid", first_name="Bench", last_name="Teacher",
+            password=make_password(None),
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        courses = Course.objects.bulk_create([
+            Course(
+                title=f"Benchmark course {i}", description="A synthetic course used to benchmark renderers. " * 5,
+                start_date=today, end_date=today, taught_by=teacher, is_published=True,
+            )
+            for i in range(options["courses"])
+        ])
+        Module.objects.bulk_create([
+            Module(course=course, title=f"Module {i}", description="Synthetic module — with non-ASCII text ✓")
+            for course in courses for i in range(options["modules"])
+        ])
+        chat = Chat.objects.create(title="Benchmark chat", created_by=teacher)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(chat=chat, sender=teacher, text=f"Synthetic message {i} ✓") for i in range(options["messages"])
+        ])
+        return teacher, [course.pk for course in courses], chat
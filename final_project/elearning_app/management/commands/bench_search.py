@@ -0,0 +1,91 @@
+import json
+import random
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from elearning_app.models import *
+from elearning_app.search import highlight_courses, search_courses, update_course_search_vectors
+from ._bench import latency_summary, write_results
+
+WORDS = [
+    "algebra", "biology", "chemistry", "design", "economics", "finance", "geometry", "history",
+    "illustration", "journalism", "kinetics", "linguistics", "marketing", "neuroscience", "optics",
+    "philosophy", "quantum", "robotics", "statistics", "typography", "urbanism", "virology", "writing",
+    "introduction", "advanced", "practical", "applied", "foundations", "modern", "theory", "workshop",
+]
+
+QUERIES = ["chemistry", "applied statistics", "modern history", "quantm", "robotcs workshop", "introduction to design"]
+
+class Command(BaseCommand):
+    help = "Compares title__icontains against ranked full-text/trigram course search on a synthetic catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=100000, help="Number of synthetic courses to create")
+        parser.add_argument("--repeat", type=int, default=20, help="Times each query is run per strategy")
+        parser.add_argument("--batch-size", type=int, default=5000, help="bulk_create batch size")
+        parser.add_argument("--output", default="bench_search.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["courses"] < 1 or options["repeat"] < 1:
+            raise CommandError("--courses and --repeat must be positive")
+
+        run_id = uuid.uuid4().hex[:8]
+        teacher = User.objects.create(
+            email=f"bench-search-{run_id}@example.invalid", first_name="Bench", last_name="Teacher",
+            password=make_password(None),
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        try:
+            started = time.perf_counter()
+            self.create_courses(teacher, options["courses"], options["batch_size"])
+            indexing_started = time.perf_counter()
+            update_course_search_vectors(
+                list(Course.objects.filter(taught_by=teacher).values_list("pk", flat=True))
+            )
+            finished = time.perf_counter()
+
+            base = Course.objects.filter(taught_by=teacher, is_published=True)
+            strategies = {
+                "icontains": lambda query: list(base.filter(title__icontains=query)[:20]),
+                "search": lambda query: list(highlight_courses(search_courses(base, query), query)[:20]),
+            }
+            results = {
+                "create_s": round(indexing_started - started, 3),
+                "index_s": round(finished - indexing_started, 3),
+            }
+            for name, run in strategies.items():
+                timings, hits = [], {}
+                for query in QUERIES:
+                    for _ in range(options["repeat"]):
+                        query_started = time.perf_counter()
+                        rows = run(query)
+                        timings.append(time.perf_counter() - query_started)
+                    hits[query] = len(rows)
+                results[name] = {"latency": latency_summary(timings), "hits": hits}
+        finally:
+            # Queryset delete bypasses User.delete so the benchmark teacher is removed instead of deactivated
+            Course.objects.filter(taught_by=teacher).delete()
+            User.objects.filter(pk=teacher.pk).delete()
+
+        parameters = {key: options[key] for key in ("courses", "repeat", "batch_size")}
+        report = write_results(options["output"], "course_search", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def create_courses(self, teacher, count, batch_size):
+        rng = random.Random(count)
+        today = timezone.now().date()
+        for offset in range(0, count, batch_size):
+            Course.objects.bulk_create([
+                Course(
+                    title=" ".join(rng.sample(WORDS, 3)).title(),
+                    description=" ".join(rng.choices(WORDS, k=40)),
+                    start_date=today,
+                    end_date=today,
+                    taught_by=teacher,
+                    is_published=True,
+                )
+                for _ in range(offset, min(offset + batch_size, count))
+            ])
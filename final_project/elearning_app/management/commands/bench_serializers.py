@@ -0,0 +1,118 @@
+import json
+import random
+import time
+import uuid
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from elearning_app.fast_serializers import *
+from elearning_app.models import *
+from ._bench import latency_summary, write_results
+
+class Command(BaseCommand):
+    help = "Compares ModelSerializer and the values()-based fast serializers in serializations per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000, help="Rows serialized per list")
+        parser.add_argument("--repeat", type=int, default=10, help="Times each list is serialized")
+        parser.add_argument("--batch-size", type=int, default=5000, help="bulk_create batch size")
+        parser.add_argument("--output", default="bench_serializers.json", help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["repeat"] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+
+        teacher, students, courses = self.create_fixtures(options)
+        try:
+            course_ids = [course.pk for course in courses]
+            student_ids = [student.pk for student in students]
+            suites = {
+                "users": (UserSerializer, user_values_serializer, User.objects.filter(pk__in=student_ids)),
+                "courses": (CourseSerializer, course_values_serializer, Course.objects.filter(pk__in=course_ids).with_status()),
+                "enrollments": (EnrollmentSerializer, enrollment_values_serializer, Enrollment.objects.filter(course_id__in=course_ids)),
+                "course_reviews": (CourseReviewSerializer, course_review_values_serializer, CourseReview.objects.filter(course_id__in=course_ids)),
+                "notifications": (NotificationSerializer, notification_values_serializer, Notification.objects.filter(related_course_id__in=course_ids)),
+            }
+            results = {}
+            for name, (serializer_class, values_serializer, queryset) in suites.items():
+                queryset = queryset.order_by("pk")
+                limit = options["rows"]
+                instances = list(queryset[:limit])
+                rows = list(values_serializer.values(queryset)[:limit])
+                strategies = {
+                    # Serialization only, from rows that are already loaded
+                    "model_serializer": lambda: serializer_class(instances, many=True).data,
+                    "values_serializer": lambda: values_serializer.render(rows),
+                    # Query plus serialization, as a list endpoint runs them
+                    "model_serializer_end_to_end": lambda: serializer_class(list(queryset[:limit]), many=True).data,
+                    "values_serializer_end_to_end": lambda: values_serializer.render(values_serializer.values(queryset)[:limit]),
+                }
+                if strategies["model_serializer"]() != strategies["values_serializer"]():
+                    raise CommandError(f"The fast {name} serializer output differs from {serializer_class.__name__}")
+
+                results[name] = {"rows": len(rows)}
+                for strategy, serialize in strategies.items():
+                    timings = []
+                    for _ in range(options["repeat"]):
+                        started = time.perf_counter()
+                        serialize()
+                        timings.append(time.perf_counter() - started)
+                    results[name][strategy] = {
+                        "latency": latency_summary(timings),
+                        "rows_per_second": round(len(rows) * len(timings) / max(sum(timings), 1e-9)),
+                    }
+                results[name]["speedup"] = round(
+                    results[name]["values_serializer"]["rows_per_second"]
+                    / max(results[name]["model_serializer"]["rows_per_second"], 1), 1
+                )
+        finally:
+            # Queryset deletes bypass User.delete so the benchmark users are removed instead of deactivated
+            Course.objects.filter(taught_by=teacher).delete()
+            User.objects.filter(pk__in=[teacher.pk] + [student.pk for student in students]).delete()
+
+        parameters = {key: options[key] for key in ("rows", "repeat")}
+        report = write_results(options["output"], "fast_serializers", parameters, results)
+        self.stdout.write(json.dumps(report["results"], indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def create_fixtures(self, options):
+        run_id = uuid.uuid4().hex[:8]
+        rng = random.Random(options["rows"])
+        today = timezone.now().date()
+        batch_size = options["batch_size"]
+        password = make_password(None)
+        rows = options["rows"]
+
+        teacher = User.objects.create(
+            email=f"bench-serializers-{run_id}@example.invalid", first_name="Bench", last_name="Teacher",
+            password=password,
+        )
+        teacher.set_role(User.UserRole.TEACHER)
+        students = User.objects.bulk_create([
+            User(email=f"bench-serializers-{run_id}-{i}@example.invalid", first_name="Bench", last_name=f"Student {i}", password=password)
+            for i in range(rows)
+        ], batch_size=batch_size)
+        # UserSerializer.role reads the first group, so every student gets one
+        student_group, _ = Group.objects.get_or_create(name=User.UserRole.STUDENT)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=student.pk, group_id=student_group.pk) for student in students
+        ], batch_size=batch_size)
+        courses = Course.objects.bulk_create([
+            Course(
+                title=f"Benchmark course {i}", description="A synthetic course used to benchmark serializers.",
+                start_date=today, end_date=today, taught_by=teacher, is_published=True,
+            )
+            for i in range(rows)
+        ], batch_size=batch_size)
+        Enrollment.objects.bulk_create([
+            Enrollment(course=course, student=student) for course, student in zip(courses, students)
+        ], batch_size=batch_size)
+        CourseReview.objects.bulk_create([
+            CourseReview(course=course, student=student, rating=rng.randint(0, 5), review="Synthetic review")
+            for course, student in zip(courses, students)
+        ], batch_size=batch_size)
+        Notification.objects.bulk_create([
+            Notification(user=student, related_course=course, content="Synthetic notification")
+            for course, student in zip(courses, students)
+        ], batch_size=batch_size)
+        return teacher, students, courses
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from elearning_app.schema import build_schema_artifact, get_schema_dir, schema_artifact_status
+
+class Command(BaseCommand):
+    help = "Generates the OpenAPI schema into OPENAPI_SCHEMA_DIR, from where the schema and docs views serve it"
+    # The stale schema check would otherwise stop the command that rebuilds it
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only check that the built schema matches the current sources, failing if it doesn't",
+        )
+
+    def handle(self, *args, **options):
+        directory = get_schema_dir()
+        if directory is None:
+            raise CommandError("OPENAPI_SCHEMA_DIR is not set, so there is nowhere to build the schema")
+
+        if options["check"]:
+            state, manifest = schema_artifact_status()
+            if state != "fresh":
+                raise CommandError(f"The OpenAPI schema in {directory} is {state}, run build_openapi_schema")
+            self.stdout.write(self.style.SUCCESS(f"The OpenAPI schema built at {manifest['generated_at']} is up to date"))
+            return
+
+        manifest = build_schema_artifact(directory)
+        names = ", ".join(file["name"] for file in manifest["files"].values())
+        self.stdout.write(self.style.SUCCESS(f"Built the OpenAPI schema into {directory}: {names}"))
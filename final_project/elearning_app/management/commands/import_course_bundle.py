@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from elearning_app.bundles import BundleError, import_course_bundle
+from elearning_app.models import Course
+
+class Command(BaseCommand):
+    help = "Imports a course bundle (ZIP or JSON) into an existing course in a single transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_id", type=int, help="Course the bundle's modules are added to")
+        parser.add_argument("path", help="Path of the .zip or .json bundle")
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(pk=options["course_id"]).first()
+        if course is None:
+            raise CommandError(f"Course {options['course_id']} does not exist")
+        try:
+            source = open(options["path"], "rb")
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+        with source:
+            try:
+                counts = import_course_bundle(course, source)
+            except BundleError as e:
+                raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['modules']} modules, {counts['lessons']} lessons and {counts['assignments']} "
+            f"assignments into {course.title}"
+        ))
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from elearning_app.search import update_course_search_vectors
+
+class Command(BaseCommand):
+    help = "Recomputes the full-text search vector of every course"
+
+    def handle(self, *args, **options):
+        updated = update_course_search_vectors()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {updated} courses"))
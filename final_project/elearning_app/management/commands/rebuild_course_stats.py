@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from elearning_app.models import CourseStats
+
+class Command(BaseCommand):
+    help = "Recomputes every course's enrollment and rating statistics from scratch"
+
+    def handle(self, *args, **options):
+        rebuilt = CourseStats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics for {rebuilt} courses"))
@@ -0,0 +1,287 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery import signals as celery_signals
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Metric:
+    """
+    A metric family aggregated in process, one value per label combination. Updates take a per-metric lock,
+    so worker threads of the same process can record concurrently
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def collect(self):
+        """Yields (sample name, label values, extra labels, value) for the exposition"""
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in values.items():
+            yield self.name, labels, (), value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, extra, value in self.collect():
+            lines.append(f"{name}{_format_labels(self.labelnames, labels, extra)} {_format_number(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+class CallbackMetric(Metric):
+    """A metric without labels whose value is read from callback() when the metrics are scraped"""
+    def __init__(self, name: str, documentation: str, type: str, callback):
+        super().__init__(name, documentation)
+        self.type = type
+        self.callback = callback
+
+    def collect(self):
+        yield self.name, (), (), self.callback()
+
+class Histogram(Metric):
+    """Counts observations per bucket (non-cumulatively, summed up when scraped) along with their sum"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # Buckets are "less than or equal" bounds, the last slot is +Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def collect(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels, (("le", _format_number(float(bound))),), cumulative
+            yield f"{self.name}_sum", labels, (), total
+            yield f"{self.name}_count", labels, (), cumulative
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """The registered metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route", ("route", "method", "status"),
+))
+http_request_sql_queries = registry.register(Histogram(
+    "http_request_sql_queries", "SQL queries run per request by route", ("route",), buckets=SQL_COUNT_BUCKETS,
+))
+http_request_sql_duration = registry.register(Histogram(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request by route", ("route",), buckets=SQL_TIME_BUCKETS,
+))
+cache_lookups = registry.register(Counter(
+    "cache_lookups_total", "Cache lookups by cache and result (hit or miss)", ("cache", "result"),
+))
+celery_task_duration = registry.register(Histogram(
+    "celery_task_duration_seconds", "Celery task run time by task and final state", ("task", "state"), buckets=TASK_BUCKETS,
+))
+celery_task_queue_wait = registry.register(Histogram(
+    "celery_task_queue_wait_seconds", "Time from publishing a Celery task to a worker starting it", ("task",), buckets=TASK_BUCKETS,
+))
+
+def record_cache_lookup(cache: str, hit: bool):
+    cache_lookups.inc(cache, "hit" if hit else "miss")
+
+# SQL timing
+
+class SQLTotals:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+# The totals of the request being handled, shared with the threads its sync code runs in
+_sql_totals = ContextVar("sql_totals", default=None)
+
+def sql_timer(execute, sql, params, many, context):
+    """Execute wrapper adding each query's count and time to the current request's totals, if any"""
+    totals = _sql_totals.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals.count += 1
+        totals.seconds += time.perf_counter() - started
+
+@receiver(connection_created)
+def install_sql_timer(sender, connection, **kwargs):
+    # Inserted first, since execute_wrapper() blocks open around a lazy connect pop the last wrapper on exit
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, sql_timer)
+
+class MetricsMiddleware:
+    """
+    Records each request's latency, SQL query count and SQL time by route pattern (not by URL, which would
+    make a series per object). Handles both sync and async requests without a thread switch
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "METRICS_ENABLED", True)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        totals, started = SQLTotals(), time.perf_counter()
+        token = _sql_totals.set(totals)
+        try:
+            response = self.get_response(request)
+        finally:
+            _sql_totals.reset(token)
+        self.record(request, response, totals, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        totals, started = SQLTotals(), time.perf_counter()
+        token = _sql_totals.set(totals)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _sql_totals.reset(token)
+        self.record(request, response, totals, started)
+        return response
+
+    def record(self, request, response, totals: SQLTotals, started: float):
+        route = getattr(request.resolver_match, "route", None) or "unmatched"
+        http_request_duration.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+        http_request_sql_queries.observe(totals.count, route)
+        http_request_sql_duration.observe(totals.seconds, route)
+
+# Celery
+
+@celery_signals.before_task_publish.connect
+def stamp_task_publish_time(headers=None, **kwargs):
+    """Stamps the message with its publish time, from which the worker measures the queue wait"""
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+_task_started = {}
+
+@celery_signals.task_prerun.connect
+def start_task_timer(task_id=None, task=None, **kwargs):
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is not None:
+        celery_task_queue_wait.observe(max(0.0, time.time() - published_at), task.name)
+    _task_started[task_id] = time.perf_counter()
+
+@celery_signals.task_postrun.connect
+def stop_task_timer(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        celery_task_duration.observe(time.perf_counter() - started, task.name, state or "UNKNOWN")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host: str, port: int, attempts: int = 1):
+    """
+    Serves this process's metrics over HTTP from a daemon thread, on the first free port of
+    port..port+attempts-1. Returns the server, or None if every port was taken
+    """
+    for candidate in range(port, port + attempts):
+        try:
+            server = ThreadingHTTPServer((host, candidate), _MetricsHandler)
+        except OSError:
+            continue
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+    return None
+
+@celery_signals.worker_process_init.connect
+def serve_worker_metrics(**kwargs):
+    """Celery workers don't serve /metrics, so each pool process exposes its own on a port of its own"""
+    port = getattr(settings, "METRICS_CELERY_PORT", None)
+    if port:
+        start_metrics_server(
+            getattr(settings, "METRICS_CELERY_HOST", "127.0.0.1"), port, getattr(settings, "METRICS_CELERY_PORTS", 16)
+        )
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_course_stats(apps, schema_editor):
+    Course = apps.get_model("elearning_app", "Course")
+    CourseStats = apps.get_model("elearning_app", "CourseStats")
+    Enrollment = apps.get_model("elearning_app", "Enrollment")
+    CourseReview = apps.get_model("elearning_app", "CourseReview")
+
+    stats = {course_id: CourseStats(course_id=course_id) for course_id in Course.objects.values_list("pk", flat=True)}
+    enrollments = Enrollment.objects.filter(status="Active").values("course_id").annotate(count=models.Count("pk"))
+    for row in enrollments:
+        stats[row["course_id"]].active_enrollment_count = row["count"]
+    ratings = CourseReview.objects.values("course_id", "rating").annotate(count=models.Count("pk"))
+    for row in ratings:
+        course_stats = stats[row["course_id"]]
+        course_stats.rating_sum += row["rating"] * row["count"]
+        course_stats.rating_count += row["count"]
+        setattr(course_stats, f"ratings_{row['rating']}", row["count"])
+    CourseStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0017_course_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseStats",
+            fields=[
+                (
+                    "course",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="elearning_app.course",
+                    ),
+                ),
+                ("active_enrollment_count", models.PositiveIntegerField(default=0)),
+                ("rating_sum", models.PositiveIntegerField(default=0)),
+                ("rating_count", models.PositiveIntegerField(default=0)),
+                ("ratings_0", models.PositiveIntegerField(default=0)),
+                ("ratings_1", models.PositiveIntegerField(default=0)),
+                ("ratings_2", models.PositiveIntegerField(default=0)),
+                ("ratings_3", models.PositiveIntegerField(default=0)),
+                ("ratings_4", models.PositiveIntegerField(default=0)),
+                ("ratings_5", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0018_coursestats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="content_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0019_course_content_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="activity_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="tree_last_edited_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0020_course_activity_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["is_published", "start_date", "end_date"],
+                name="course_status_idx",
+            ),
+        ),
+    ]
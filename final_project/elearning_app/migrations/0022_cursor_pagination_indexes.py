@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0021_course_status_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(fields=["date_joined", "id"], name="user_date_joined_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(fields=["created_at", "id"], name="course_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="module",
+            index=models.Index(fields=["course", "created_at", "id"], name="module_course_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="lesson",
+            index=models.Index(fields=["module", "created_at", "id"], name="lesson_module_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assignment",
+            index=models.Index(fields=["module", "created_at", "id"], name="assignment_module_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="assignmentsubmission",
+            index=models.Index(fields=["assignment", "submitted_on", "id"], name="submission_submitted_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="coursereview",
+            index=models.Index(fields=["course", "created_at", "id"], name="review_course_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="statusupdate",
+            index=models.Index(fields=["created_at", "id"], name="statusupdate_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="chat",
+            index=models.Index(fields=["created_at", "id"], name="chat_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="chatmessage",
+            index=models.Index(fields=["chat", "sent_at", "id"], name="chatmessage_chat_sent_idx"),
+        ),
+    ]
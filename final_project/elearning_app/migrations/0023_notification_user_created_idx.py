@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0022_cursor_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "created_at", "id"],
+                name="notification_user_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0024_user_profile_picture_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="cover_image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="cover_image_lqip",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:10
+
+import posixpath
+from django.db import migrations, models
+
+PRIVATE_FILES = (
+    ("Lesson", "lesson_file", "private/lessons/"),
+    ("AssignmentSubmission", "file_submission", "private/submissions/"),
+    ("ChatMessageAttachments", "attachment", "private/chat/"),
+)
+
+
+def move_private_files(apps, schema_editor):
+    # Files uploaded before upload_to was set sit at the root of MEDIA_ROOT, served publicly at MEDIA_URL.
+    # A name can be shared by several rows (cloned lessons) or models, so the originals are deleted last
+    moved = []
+    for model_name, field_name, directory in PRIVATE_FILES:
+        model = apps.get_model("elearning_app", model_name)
+        storage = model._meta.get_field(field_name).storage
+        names = (
+            model.objects.exclude(**{f"{field_name}__isnull": True}).exclude(**{field_name: ""})
+            .exclude(**{f"{field_name}__startswith": "private/"})
+            .values_list(field_name, flat=True).distinct()
+        )
+        for name in list(names):
+            if not storage.exists(name):
+                continue
+            with storage.open(name, "rb") as file:
+                new_name = storage.save(directory + posixpath.basename(name), file)
+            model.objects.filter(**{field_name: name}).update(**{field_name: new_name})
+            moved.append((storage, name))
+    for storage, name in moved:
+        storage.delete(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0025_course_cover_image_variants_course_cover_image_lqip"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="lesson",
+            name="lesson_file",
+            field=models.FileField(blank=True, null=True, upload_to="private/lessons/"),
+        ),
+        migrations.AlterField(
+            model_name="assignmentsubmission",
+            name="file_submission",
+            field=models.FileField(upload_to="private/submissions/"),
+        ),
+        migrations.AlterField(
+            model_name="chatmessageattachments",
+            name="attachment",
+            field=models.FileField(upload_to="private/chat/"),
+        ),
+        migrations.RunPython(move_private_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_activity_versions(apps, schema_editor):
+    # Carry the versions over so ETags and cache keys handed out before the move aren't matched again
+    Course = apps.get_model("elearning_app", "Course")
+    CourseStats = apps.get_model("elearning_app", "CourseStats")
+    courses = Course.objects.filter(pk=OuterRef("course_id"))
+    CourseStats.objects.update(
+        activity_version=Subquery(courses.values("activity_version")[:1]),
+        activity_edited_at=Subquery(courses.values("tree_last_edited_at")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("elearning_app", "0026_private_uploads"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coursestats",
+            name="activity_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="coursestats",
+            name="activity_edited_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(copy_activity_versions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="course",
+            name="activity_version",
+        ),
+    ]
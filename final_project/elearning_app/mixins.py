@@ -0,0 +1,151 @@
+import hashlib
+from django.conf import settings
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from .caching import api_response_cache, api_response_key, course_cache_state, course_validators
+from .metrics import record_cache_lookup
+from .serializers import expandable_paths, parse_field_list, requested_expansions
+
+class ConditionalGetMixin:
+    """
+    Answers GET with 304 Not Modified while the client's If-None-Match / If-Modified-Since still matches.
+    Validators come from the owning course's version columns, so an unchanged tree is never loaded or
+    serialized. `course_lookup` is the Course lookup matching the URL's pk, e.g. "modules__lessons"
+    """
+    course_lookup = "pk"
+
+    def get_validators(self):
+        return course_validators(**{self.course_lookup: self.kwargs[self.lookup_url_kwarg or self.lookup_field]})
+
+    def get_etag(self, validators) -> str:
+        # Responses vary per user (and per query string), so both are part of the entity tag
+        seed = f"{validators['etag']}:{self.request.get_full_path()}:{self.request.user.pk}"
+        return quote_etag(hashlib.md5(seed.encode()).hexdigest())
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = self.get_etag(validators)
+        last_modified = int(validators["last_modified"].timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+class ExpandablePrefetchMixin:
+    """
+    Shapes the queryset after the response requested with ?fields= and ?expand= (see ExpandableFieldsMixin):
+    only expanded relations are prefetched and reads only load the requested columns. Expandable serializer
+    fields are named after their related_name, so an expand path maps directly onto a prefetch lookup
+    """
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = parse_field_list(self.request.query_params.get("fields"))
+        expanded = requested_expansions(fields, parse_field_list(self.request.query_params.get("expand")))
+
+        lookups = sorted(path.replace(".", "__") for path in expanded & expandable_paths(self.get_serializer_class()))
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+
+        if fields and self.request.method in SAFE_METHODS:
+            model = queryset.model
+            columns = {field.name for field in model._meta.concrete_fields} & {field.split(".")[0] for field in fields}
+            # Relations joined with select_related() can't be deferred
+            if isinstance(queryset.query.select_related, dict):
+                columns |= set(queryset.query.select_related)
+            # Cursor pagination reads its position from the ordering columns
+            if hasattr(self.paginator, "get_ordering"):
+                columns |= {field.lstrip("-") for field in self.paginator.get_ordering(self.request, queryset, self)}
+            queryset = queryset.only(model._meta.pk.name, *sorted(columns))
+        return queryset
+
+class FastListMixin:
+    """
+    Serves GET lists through `fast_serializer` (a ValuesSerializer): rows come straight from .values() and are
+    rendered without model instances or per-row serializers. Requests expanding nested relations fall back to
+    the regular serializer
+    """
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        fields = parse_field_list(request.query_params.get("fields"))
+        expanded = requested_expansions(fields, parse_field_list(request.query_params.get("expand")))
+        if self.fast_serializer is None or expanded & expandable_paths(self.get_serializer_class()):
+            return super().list(request, *args, **kwargs)
+
+        # Cursor pagination reads its position from the ordering columns of each row
+        ordering = self.paginator.get_ordering(request, None, self) if hasattr(self.paginator, "get_ordering") else ()
+        rows = self.fast_serializer.values(
+            self.filter_queryset(self.get_queryset()), fields, extra=[field.lstrip("-") for field in ordering]
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer.render(page, fields, request))
+        return Response(self.fast_serializer.render(rows, fields, request))
+
+class ResponseCacheMixin:
+    """
+    Caches successful GET responses in the "api" cache, shared by every user in the same visibility class. Keys
+    hold the absolute URL (endpoint and query), the visibility class and the course's versions: the model
+    signals bump content_version on syllabus changes and saving the course moves last_edited_at, so readers
+    simply move to a new key and the stale entries are evicted least recently used first. Expansions may
+    include enrollments, reviews or progress, so those responses are also keyed on the course's activity_version.
+    `course_lookup` is the Course lookup matching the URL's pk, as in ConditionalGetMixin
+    """
+    course_lookup = "pk"
+
+    def get_visibility_class(self, request, state) -> str:
+        user = request.user
+        if not user.is_authenticated:
+            return "anonymous"
+        if user.pk == state["taught_by_id"]:
+            return "teacher"
+        if user.is_staff:
+            return "staff"
+        return user.role or "user"
+
+    def get_cache_version(self, request, state) -> str:
+        # The status of a course depends on today's date
+        version = f"{state['content_version']}:{state['last_edited_at'].timestamp()}:{timezone.localdate()}"
+        if "expand" in request.query_params or "fields" in request.query_params:
+            version += f":{state['activity_version']}"
+        return version
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not getattr(settings, "API_RESPONSE_CACHE_ENABLED", True):
+            return handler(request, *args, **kwargs)
+        state = course_cache_state(**{self.course_lookup: self.kwargs[self.lookup_url_kwarg or self.lookup_field]})
+        if state is None:
+            return handler(request, *args, **kwargs)
+
+        cache = api_response_cache()
+        key = api_response_key(
+            request.build_absolute_uri(), self.get_visibility_class(request, state), self.get_cache_version(request, state)
+        )
+        data = cache.get(key)
+        record_cache_lookup("api_response", data is not None)
+        if data is not None:
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+            response["X-Cache"] = "MISS"
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
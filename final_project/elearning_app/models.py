@@ -1,10 +1,16 @@
+import collections
 from typing import Optional
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce
 from django.utils import timezone
+from .request_cache import request_cached
 
 class UserManager(BaseUserManager):
     def create_user(self, email: str, password: Optional[str] = None, **extra_fields):
@@ -27,6 +33,21 @@ class UserManager(BaseUserManager):
         user.groups.add(admin_group)
         return user
 
+    def with_role(self):
+        """Annotates the user's role (the name of their first group) as annotated_role, which User.role then reads"""
+        return self.annotate(annotated_role=role_subquery())
+
+def role_subquery():
+    """The name of the user's first group, as User.role reads it, for annotating or .values() querysets"""
+    return Subquery(Group.objects.filter(user=OuterRef("pk")).order_by("pk").values("name")[:1])
+
+def variant_srcsets(storage, variants: dict) -> dict:
+    """Turns {extension: {width: name}} variants into a srcset per extension, narrowest first"""
+    return {
+        extension: ", ".join(f"{storage.url(name)} {width}w" for width, name in sorted(names.items(), key=lambda item: int(item[0])))
+        for extension, names in variants.items()
+    }
+
 class User(AbstractUser):
     class UserRole(models.TextChoices):
         STUDENT = 'Student'
@@ -38,6 +59,7 @@ class User(AbstractUser):
     first_name = models.CharField(max_length=150)
     last_name = models.CharField(max_length=150)
     profile_picture = models.ImageField(null=True, blank=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)  # {extension: {size: name}}, see tasks.resize_profile_picture
     bio = models.CharField(max_length=500, null=True, blank=True)
 
     USERNAME_FIELD = "email"
@@ -45,15 +67,33 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["date_joined", "id"], name="user_date_joined_idx"),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
     
     @property
     def role(self) -> Optional[str]:
         """Returns the user's primary role based on their groups"""
+        annotated_role = getattr(self, "annotated_role", None)
+        if annotated_role is not None:
+            return annotated_role
         group = self.groups.first()
         return group.name if group else None
+
+    async def arole(self) -> Optional[str]:
+        """Async version of role, for async views"""
+        group = await self.groups.afirst()
+        return group.name if group else None
     
+    @property
+    def avatar_srcsets(self) -> dict:
+        """The srcset of the profile picture's square variants per file extension, empty until they're rendered"""
+        return variant_srcsets(self.profile_picture.storage, self.profile_picture_variants)
+
     @property
     def full_name(self) -> str:
         """Returns the user f's full name"""
@@ -65,7 +105,7 @@ class User(AbstractUser):
     
     def get_blocked_by(self):
         """Returns a list of users who have blocked this user"""
-        return list(User.objects.filter(blocked_by__blocked_user=self))
+        return request_cached(("blocked_by", self.pk), lambda: list(User.objects.filter(blocked_by__blocked_user=self)))
     
     def get_courses(self):
         """Returns the user's actively enrolled courses if they're a student or taught courses if they're a teacher"""
@@ -97,9 +137,9 @@ class User(AbstractUser):
         return AssignmentSubmission.objects.filter(assignment__module__course=course, student=self)
     
     def get_final_grade(self, course):
-        submissions = self.get_assignments_submitted(course)
+        submissions = list(self.get_assignments_submitted(course).select_related("assignment"))
         assignments = course.get_all_assignments()
-        if assignments.count() != submissions.count() or submissions.filter(grade__isnull=True).exists():
+        if assignments.count() != len(submissions) or any(a.grade is None for a in submissions):
             return None
         final_grade = 0
         for a in submissions:
@@ -120,23 +160,118 @@ class User(AbstractUser):
         self.is_active = False
         self.save()
 
+class CourseQuerySet(models.QuerySet):
+    STATUSES = ("unpublished", "upcoming", "ongoing", "ended")
+
+    def with_status(self):
+        """Annotates the course status computed in SQL as annotated_status, which Course.status then reads"""
+        today = timezone.now().date()
+        return self.annotate(
+            annotated_status=Case(
+                When(is_published=False, then=Value("unpublished")),
+                When(start_date__gt=today, then=Value("upcoming")),
+                When(end_date__lt=today, then=Value("ended")),
+                default=Value("ongoing"),
+                output_field=models.CharField(),
+            )
+        )
+
+    def filter_status(self, status: str):
+        """
+        Filters courses by status with plain date comparisons, so the query can use the
+        (is_published, start_date, end_date) index
+        """
+        today = timezone.now().date()
+        if status == "unpublished":
+            return self.filter(is_published=False)
+        if status == "upcoming":
+            return self.filter(is_published=True, start_date__gt=today)
+        if status == "ongoing":
+            return self.filter(is_published=True, start_date__lte=today, end_date__gte=today)
+        if status == "ended":
+            return self.filter(is_published=True, end_date__lt=today)
+        raise ValueError(f"Unknown course status: {status}")
+
+    def with_stats(self):
+        """
+        Annotates students_enrolled_count, average_rating and review_count from the maintained CourseStats row,
+        a single one-to-one join instead of aggregating enrollments and reviews
+        """
+        return self.annotate(
+            students_enrolled_count=Coalesce(F("stats__active_enrollment_count"), 0),
+            review_count=Coalesce(F("stats__rating_count"), 0),
+            average_rating=Case(
+                When(
+                    stats__rating_count__gt=0,
+                    then=Cast("stats__rating_sum", FloatField()) / F("stats__rating_count")
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
 class Course(models.Model):
     title = models.CharField(max_length=256)
     description = models.CharField(max_length=1000, null=True, blank=True)
     taught_by = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="courses")
     cover_image = models.ImageField(null=True, blank=True)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)  # {extension: {width: name}}, see tasks.process_course_cover
+    cover_image_lqip = models.TextField(blank=True, editable=False)  # blurred placeholder as a data: URI
     created_at = models.DateTimeField(auto_now_add=True)
     last_edited_at = models.DateTimeField(auto_now=True)
     start_date = models.DateField()
     end_date = models.DateField()
     is_published = models.BooleanField(default=False)  # course starts out as "unpublished"
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)  # maintained by search.update_course_search_vectors
+    content_version = models.PositiveIntegerField(default=0, editable=False)  # bumped whenever the syllabus changes
+    tree_last_edited_at = models.DateTimeField(null=True, blank=True, editable=False)  # last bump of content_version
+
+    # Written by queryset updates only, never from a possibly stale instance: the version is only ever moved
+    # forward by bump_course_content_version in caching.py, the search vector by search.update_course_search_vectors
+    # and the cover's variants by tasks.process_course_cover (and cleared by clear_cover_variants)
+    MAINTAINED_FIELDS = (
+        "content_version", "tree_last_edited_at",
+        "search_vector", "cover_image_variants", "cover_image_lqip",
+    )
+
+    objects = CourseQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="course_search_vector_idx"),
+            GinIndex(fields=["title"], name="course_title_trgm_idx", opclasses=["gin_trgm_ops"]),
+            models.Index(fields=["is_published", "start_date", "end_date"], name="course_status_idx"),
+            models.Index(fields=["created_at", "id"], name="course_created_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def clear_cover_variants(self):
+        """Drops the variants of the previous cover once a new one is saved, until process_course_cover renders it"""
+        self.cover_image_variants = {}
+        self.cover_image_lqip = ""
+        Course.objects.filter(pk=self.pk).update(cover_image_variants={}, cover_image_lqip="")
     
+    @property
+    def cover_srcsets(self) -> dict:
+        """The srcset of the cover's variants per file extension, empty until they're rendered"""
+        return variant_srcsets(self.cover_image.storage, self.cover_image_variants)
+
     @property
     def status(self):
         """Returns the course's current status (unpublished, upcoming, ongoing, ended)"""
+        annotated_status = getattr(self, "annotated_status", None)
+        if annotated_status is not None:
+            return annotated_status
         if self.is_published:
             today = timezone.now().date()
             if self.start_date > today:
@@ -177,23 +312,11 @@ class Course(models.Model):
         """
         Returns the user's progress on the course by calculating from assignments submitted and lessons completed
         """
-        # Lessons
-        all_lessons_count = Lesson.objects.filter(module__course=self).count()
-        lessons_completed = user.get_lessons_completed(self)
-        completed_lessons_count = len(lessons_completed) if lessons_completed is not None else 0
-
-        # Assignments
-        all_assignments_count = Assignment.objects.filter(module__course=self).count()
-        assignments_submitted = user.get_assignments_submitted(self)
-        submitted_assignments_count = len(assignments_submitted) if assignments_submitted is not None else 0
-
-        total_items = all_lessons_count + all_assignments_count
-        completed_items = completed_lessons_count + submitted_assignments_count
+        return get_course_progress([self], [user])[self.pk, user.pk]
 
-        if total_items == 0:
-            return 0.0
-
-        return round((completed_items / total_items) * 100, 2)
+    def get_students_progress(self, students) -> dict:
+        """Returns {student pk: progress} for many students at once, see get_course_progress"""
+        return {student_pk: progress for (_, student_pk), progress in get_course_progress([self], students).items()}
 
 class Module(models.Model):
     course = models.ForeignKey(to=Course, on_delete=models.CASCADE, related_name="modules")
@@ -202,6 +325,11 @@ class Module(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_edited_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "created_at", "id"], name="module_course_created_idx"),
+        ]
+
     @property
     def teacher(self) -> User:
         return self.course.taught_by
@@ -210,10 +338,15 @@ class Lesson(models.Model):
     module = models.ForeignKey(to=Module, on_delete=models.CASCADE, related_name="lessons")
     title = models.CharField(max_length=256)
     description = models.CharField(max_length=1000, null=True, blank=True)
-    lesson_file = models.FileField(null=True, blank=True)
+    lesson_file = models.FileField(null=True, blank=True, upload_to="private/lessons/")  # served by views.lesson_file_download only
     created_at = models.DateTimeField(auto_now_add=True)
     last_edited_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["module", "created_at", "id"], name="lesson_module_created_idx"),
+        ]
+
     @property
     def teacher(self) -> User:
         return self.module.teacher
@@ -250,6 +383,11 @@ class Assignment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_edited_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["module", "created_at", "id"], name="assignment_module_created_idx"),
+        ]
+
     @property
     def teacher(self) -> User:
         return self.module.teacher
@@ -274,14 +412,47 @@ class AssignmentSubmission(models.Model):
     assignment = models.ForeignKey(to=Assignment, on_delete=models.CASCADE, related_name="assignment_submissions")
     student = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="assignment_submissions")
     submitted_on = models.DateTimeField(auto_now_add=True)
-    file_submission = models.FileField()
+    file_submission = models.FileField(upload_to="private/submissions/")  # served by views.submission_file_download only
     grade = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(100.0)], null=True, blank=True)
     feedback = models.CharField(max_length=500, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["assignment", "submitted_on", "id"], name="submission_submitted_idx"),
+        ]
+
     @property
     def teacher(self) -> User:
         return self.assignment.module.teacher
 
+def get_course_progress(courses, students) -> dict:
+    """
+    Returns {(course pk, student pk): progress} for every pair of the given courses and students (instances or
+    pks), with the same progress as Course.get_user_progress but in four grouped queries however many there are
+    """
+    course_pks = [getattr(course, "pk", course) for course in courses]
+    student_pks = [getattr(student, "pk", student) for student in students]
+    totals = collections.Counter()
+    for model in (Lesson, Assignment):
+        totals.update(dict(
+            model.objects.filter(module__course__in=course_pks).values_list("module__course").annotate(Count("pk"))
+        ))
+
+    completed = collections.Counter()
+    for queryset in (
+        LessonProgress.objects.filter(lesson__module__course__in=course_pks, student__in=student_pks, completed=True)
+        .values_list("lesson__module__course", "student"),
+        AssignmentSubmission.objects.filter(assignment__module__course__in=course_pks, student__in=student_pks)
+        .values_list("assignment__module__course", "student"),
+    ):
+        for course_pk, student_pk, count in queryset.annotate(Count("pk")):
+            completed[course_pk, student_pk] += count
+
+    return {
+        (course_pk, student_pk): round((completed[course_pk, student_pk] / totals[course_pk]) * 100, 2) if totals[course_pk] else 0.0
+        for course_pk in course_pks for student_pk in student_pks
+    }
+
 class Enrollment(models.Model):
     class EnrollmentStatus(models.TextChoices):
         ACTIVE = 'Active'
@@ -309,6 +480,78 @@ class CourseReview(models.Model):
     review = models.CharField(max_length=500, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["course", "created_at", "id"], name="review_course_created_idx"),
+        ]
+
+class CourseStats(models.Model):
+    """Enrollment and rating statistics for a course, kept up to date by the Enrollment and CourseReview signals"""
+    course = models.OneToOneField(to=Course, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    active_enrollment_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Rating histogram, one column per possible rating
+    ratings_0 = models.PositiveIntegerField(default=0)
+    ratings_1 = models.PositiveIntegerField(default=0)
+    ratings_2 = models.PositiveIntegerField(default=0)
+    ratings_3 = models.PositiveIntegerField(default=0)
+    ratings_4 = models.PositiveIntegerField(default=0)
+    ratings_5 = models.PositiveIntegerField(default=0)
+    # Bumped by enrollments, reviews, progress and submissions. Kept here rather than on the course so that
+    # activity doesn't keep rewriting the course row every listing and detail page reads
+    activity_version = models.PositiveIntegerField(default=0, editable=False)
+    activity_edited_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    RATINGS = range(0, 6)
+
+    @staticmethod
+    def rating_field(rating: int) -> str:
+        return f"ratings_{rating}"
+
+    @property
+    def average_rating(self) -> float:
+        return self.rating_sum / self.rating_count if self.rating_count else 0.0
+
+    @property
+    def histogram(self) -> dict:
+        """Returns the number of reviews per rating"""
+        return {rating: getattr(self, self.rating_field(rating)) for rating in self.RATINGS}
+
+    @classmethod
+    def adjust(cls, course_id, **deltas):
+        """Atomically adds the given deltas to a course's counters"""
+        cls.objects.filter(course_id=course_id).update(
+            **{field: F(field) + delta for field, delta in deltas.items() if delta}
+        )
+
+    @classmethod
+    def rebuild(cls, course_ids=None) -> int:
+        """Recomputes the statistics of the given courses (or every course) from their enrollments and reviews"""
+        courses = Course.objects.all() if course_ids is None else Course.objects.filter(pk__in=course_ids)
+        stats = {course_id: cls(course_id=course_id) for course_id in courses.values_list("pk", flat=True)}
+
+        enrollments = Enrollment.objects.filter(
+            course_id__in=list(stats), status=Enrollment.EnrollmentStatus.ACTIVE
+        ).values("course_id").annotate(count=Count("pk"))
+        for row in enrollments:
+            stats[row["course_id"]].active_enrollment_count = row["count"]
+
+        ratings = CourseReview.objects.filter(course_id__in=list(stats)).values("course_id", "rating").annotate(
+            count=Count("pk")
+        )
+        for row in ratings:
+            course_stats = stats[row["course_id"]]
+            course_stats.rating_sum += row["rating"] * row["count"]
+            course_stats.rating_count += row["count"]
+            setattr(course_stats, cls.rating_field(row["rating"]), row["count"])
+
+        counters = ["active_enrollment_count", "rating_sum", "rating_count"] + [cls.rating_field(r) for r in cls.RATINGS]
+        cls.objects.bulk_create(
+            stats.values(), update_conflicts=True, unique_fields=["course"], update_fields=counters
+        )
+        return len(stats)
+
 class StatusUpdate(models.Model):
     student = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="status_updates")
     course = models.ForeignKey(to=Course, on_delete=models.CASCADE, related_name="status_updates")
@@ -316,6 +559,20 @@ class StatusUpdate(models.Model):
     text = models.CharField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="statusupdate_created_idx"),
+        ]
+
+class ChatQuerySet(models.QuerySet):
+    def with_last_message(self):
+        """Prefetches each chat's last message and its sender, in one query for all the chats"""
+        return self.prefetch_related(models.Prefetch(
+            "messages",
+            queryset=ChatMessage.objects.select_related("sender").order_by("-sent_at", "-id")[:1],
+            to_attr="latest_messages",
+        ))
+
 class Chat(models.Model):
     title = models.CharField(max_length=256)
     picture = models.ImageField(null=True, blank=True)
@@ -324,9 +581,18 @@ class Chat(models.Model):
     last_edited_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
 
+    objects = ChatQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="chat_created_idx"),
+        ]
+
     @property
     def last_message(self):
-        """Get the last message sent on the channel"""
+        """Get the last message sent on the channel, prefetched by ChatQuerySet.with_last_message"""
+        if hasattr(self, "latest_messages"):
+            return self.latest_messages[0] if self.latest_messages else None
         return self.messages.order_by('-sent_at').first()
 
 class ChatParticipant(models.Model):
@@ -339,12 +605,17 @@ class ChatMessage(models.Model):
     sent_at = models.DateTimeField(auto_now_add=True)
     text = models.CharField(max_length=256)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["chat", "sent_at", "id"], name="chatmessage_chat_sent_idx"),
+        ]
+
     def __str__(self):
         return self.text
 
 class ChatMessageAttachments(models.Model):
     chat_message = models.ForeignKey(to=ChatMessage, on_delete=models.CASCADE, related_name="attachments")
-    attachment = models.FileField()
+    attachment = models.FileField(upload_to="private/chat/")  # served by views.chat_attachment_download only
 
     @property
     def sender(self) -> User:
@@ -361,6 +632,11 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="notification_user_created_idx"),
+        ]
+
 class UserBlock(models.Model):
     blocked_user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="blocked_users")
     blocked_by = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="blocked_by")
@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import date, datetime
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+class CreatedCursorPagination(CursorPagination):
+    """
+    Default pagination for every API list: an opaque cursor over the newest-first (created_at, id) ordering,
+    so each page is a single index range scan no matter how deep the client pages. Views whose model stamps
+    creation under another name set `cursor_ordering`, e.g. ("-sent_at", "-id"), backed by a matching
+    composite index on the model
+    """
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "API_PAGE_SIZE", 25)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 100)
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, "cursor_ordering", self.ordering)
+
+class RankedPagination(PageNumberPagination):
+    """Numbered pages for lists ordered by a computed score (e.g. search rank), which a cursor can't follow"""
+    page_size = getattr(settings, "API_PAGE_SIZE", 25)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 100)
+
+class AsyncKeysetPagination:
+    """
+    Forward-only keyset pagination for the async API views, over the same orderings and composite indexes as
+    CreatedCursorPagination. DRF's paginators evaluate querysets synchronously, so this one reads the page
+    with async iteration. The opaque cursor holds the ordering values of the last row of the previous page,
+    which every row of the page must therefore include
+    """
+    page_size = getattr(settings, "API_PAGE_SIZE", 25)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "API_MAX_PAGE_SIZE", 100)
+    cursor_query_param = "cursor"
+
+    def __init__(self, ordering):
+        self.ordering = tuple(ordering)
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def encode_cursor(self, row) -> str:
+        values = [row[field.lstrip("-")] for field in self.ordering]
+        values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor: str, model) -> list:
+        """Returns the cursor's ordering values as Python values, raising ValueError for a malformed cursor"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError) as e:
+            raise ValueError("Invalid cursor") from e
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError("Invalid cursor")
+        try:
+            return [model._meta.get_field(field.lstrip("-")).to_python(value) for field, value in zip(self.ordering, values)]
+        except Exception as e:
+            raise ValueError("Invalid cursor") from e
+
+    def position_filter(self, values) -> Q:
+        """Rows after the position: (a, b) > (x, y) as a > x OR (a = x AND b > y), with < for descending fields"""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            equal = {previous.lstrip("-"): value for previous, value in zip(self.ordering[:index], values)}
+            condition |= Q(**equal, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": values[index]})
+        return condition
+
+    async def paginate_queryset(self, queryset, request) -> list:
+        """Returns the requested page of the (values()) queryset's rows, raising ValueError for a bad cursor"""
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.position_filter(self.decode_cursor(cursor, queryset.model)))
+        page_size = self.get_page_size(request)
+        # One extra row tells whether there is a next page
+        rows = [row async for row in queryset.order_by(*self.ordering)[:page_size + 1]]
+        self.request = request
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_paginated_data(self, results) -> dict:
+        """The same envelope as CreatedCursorPagination, without a link back"""
+        next_link = None
+        if self.next_cursor is not None:
+            next_link = replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+        return {"next": next_link, "previous": None, "results": results}
+
@@ -0,0 +1,172 @@
+import logging
+import re
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+# Literals replaced by ? so queries differing only in their parameters share a fingerprint
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?(?:, )?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by QueryBudgetMiddleware in strict mode when a view runs more queries than its budget"""
+
+def query_budget(budget: int):
+    """
+    Declares the most queries a view may run per request, for function views as a decorator. Class-based
+    views declare it as a `query_budget` class attribute instead. Outer decorators like login_required keep
+    it, since functools.wraps copies the view's attributes
+    """
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+def get_query_budget(view) -> int:
+    """Returns a view function's declared budget (or its class's, for as_view()), else QUERY_BUDGET_DEFAULT"""
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        budget = getattr(getattr(view, "view_class", None), "query_budget", None)
+    if budget is None:
+        budget = getattr(settings, "QUERY_BUDGET_DEFAULT", 50)
+    return budget
+
+def fingerprint_sql(sql: str) -> str:
+    """Normalizes a query's SQL with its literal values removed, so repeated queries of an N+1 compare equal"""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _IN_LIST.sub("IN (...)", sql)
+
+class QueryRecorder:
+    """A database execute wrapper recording the SQL run through it, whether or not DEBUG is on"""
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def duplicates(self, threshold: int = 2) -> dict:
+        """Returns {fingerprint: count} of the queries run at least threshold times"""
+        counts = Counter(fingerprint_sql(sql) for sql in self.queries)
+        return {fingerprint: count for fingerprint, count in counts.most_common() if count >= threshold}
+
+class QueryBudgetMiddleware:
+    """
+    Counts the queries of every request while QUERY_BUDGET_ENABLED (by default in DEBUG), adding the count
+    and the view's budget as X-Query-Count / X-Query-Budget headers. Views over budget are logged along with
+    their repeated query fingerprints, the usual sign of an N+1, or raise QueryBudgetExceeded with
+    QUERY_BUDGET_STRICT. Queries run while a streamed response is consumed aren't counted. Async capable, so
+    async views run without a thread switch
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", settings.DEBUG):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        return self.check_budget(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", settings.DEBUG):
+            return await self.get_response(request)
+
+        # The connection is context-local, so the async ORM's worker thread runs queries through the wrapper
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = await self.get_response(request)
+        return self.check_budget(request, response, recorder)
+
+    def check_budget(self, request, response, recorder: QueryRecorder):
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is None:
+            return response
+        budget = get_query_budget(resolver_match.func)
+        count = len(recorder.queries)
+        response["X-Query-Count"] = str(count)
+        response["X-Query-Budget"] = str(budget)
+        if count > budget:
+            duplicates = recorder.duplicates(getattr(settings, "QUERY_BUDGET_DUPLICATE_THRESHOLD", 3))
+            message = f"{request.method} {request.path} ran {count} queries, over its budget of {budget}"
+            if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(f"{message}. Repeated queries: {duplicates}")
+            logger.warning("%s. Repeated queries: %s", message, duplicates)
+        return response
+
+# Test helpers
+
+def iter_url_patterns(patterns=None, namespace=None):
+    """Yields (name, pattern, view) for the project's named URL patterns, leaving out namespaced apps like admin"""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace is None:
+                yield from iter_url_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name, pattern, pattern.callback
+
+def count_url_queries(client, url: str) -> QueryRecorder:
+    """GETs the URL with every cache cleared first, so each dataset is measured from the same cold start"""
+    for cache in caches.all():
+        cache.clear()
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        response = client.get(url)
+        if getattr(response, "streaming", False):
+            b"".join(response.streaming_content)
+    return recorder
+
+def check_query_budgets(seed, sizes=(2, 8), names=None, skip=("logout",)) -> list:
+    """
+    Checks that views run a constant number of queries within their budgets as a dataset grows. seed(n) must
+    build a fresh dataset with n students and return a logged in client and {URL name: reverse() kwargs}.
+    Every named URL pattern that takes no arguments or whose kwargs seed provides (only those in names if
+    given, never those in skip) is requested on the dataset of each size. Returns the problems found, as
+    messages naming the view, the counts and the repeated queries: an empty list means every budget held
+    """
+    counts = {}
+    for size in sizes:
+        client, url_kwargs = seed(size)
+        for name, pattern, view in iter_url_patterns():
+            if name in skip or (names is not None and name not in names):
+                continue
+            if name in url_kwargs:
+                url = reverse(name, kwargs=url_kwargs[name])
+            elif pattern.pattern.regex.groups == 0:
+                url = reverse(name)
+            else:
+                continue
+            counts.setdefault(name, []).append((size, count_url_queries(client, url), get_query_budget(view)))
+
+    problems = []
+    for name, runs in counts.items():
+        smallest, largest = runs[0], runs[-1]
+        if len(largest[1].queries) != len(smallest[1].queries):
+            problems.append(
+                f"{name} ran {len(smallest[1].queries)} queries with {smallest[0]} students and "
+                f"{len(largest[1].queries)} with {largest[0]}. Repeated queries: {largest[1].duplicates()}"
+            )
+        for size, recorder, budget in runs:
+            if len(recorder.queries) > budget:
+                problems.append(f"{name} ran {len(recorder.queries)} queries with {size} students, over its budget of {budget}")
+    return problems
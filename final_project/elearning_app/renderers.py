@@ -0,0 +1,70 @@
+from importlib.util import find_spec
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson and msgpack are optional: without them the renderers fall back to DRF's stdlib json
+if find_spec("orjson"):
+    import orjson
+else:
+    orjson = None
+if find_spec("msgpack"):
+    import msgpack
+else:
+    msgpack = None
+
+_encoder = JSONEncoder()
+
+def encode_default(obj):
+    """
+    Encodes what the fast encoders don't handle natively (Decimal, timedelta, lazy translations, querysets...)
+    exactly as DRF's JSONEncoder does
+    """
+    return _encoder.default(obj)
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson, with DRF's output: compact UTF-8, ISO 8601 datetimes ending in Z for UTC
+    and U+2028/U+2029 escaped. Indented output (e.g. for the browsable API) is left to the stdlib encoder
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        ret = orjson.dumps(data, default=encode_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        # The separators are valid JSON but not valid JavaScript, see JSONRenderer.render
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+class FastJSONParser(JSONParser):
+    """JSONParser backed by orjson, which decodes UTF-8 bytes directly"""
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError(f"JSON parse error - {exc}")
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders application/msgpack (or ?format=msgpack) for clients that ask for it in Accept. Values msgpack has
+    no type for are encoded as in JSON, so datetimes are ISO 8601 strings
+    """
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The memo of the request being handled, None outside of request_cache_scope
+_request_cache = ContextVar("request_cache", default=None)
+
+@contextmanager
+def request_cache_scope():
+    """
+    Memoizes request_cached lookups until the block exits, so the sub-requests of a batch share them. Scopes
+    don't nest: an inner scope reuses the outer memo
+    """
+    if _request_cache.get() is not None:
+        yield
+        return
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+def request_cached(key, loader):
+    """Returns loader() memoized under key within the current scope, or simply calls it outside of one"""
+    memo = _request_cache.get()
+    if memo is None:
+        return loader()
+    if key not in memo:
+        memo[key] = loader()
+    return memo[key]
+
+def clear_request_cache():
+    """Forgets the current scope's lookups, e.g. after a write that may have changed them"""
+    memo = _request_cache.get()
+    if memo is not None:
+        memo.clear()
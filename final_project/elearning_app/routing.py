@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r"ws/chat/(?P<chat_pk>\w+)/$", consumers.ChatConsumer.as_asgi()),
+    re_path(r"ws/courses/(?P<course_pk>\d+)/live/$", consumers.CourseLiveConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import tempfile
+from importlib.util import find_spec
+from pathlib import Path
+from django.conf import settings
+from django.utils import timezone
+from drf_spectacular import __version__ as spectacular_version
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+# The modules the OpenAPI schema is generated from: views, serializers, models and the URLs routing to them
+SCHEMA_SOURCE_MODULES = (
+    "elearning_app.api",
+    "elearning_app.serializers",
+    "elearning_app.fast_serializers",
+    "elearning_app.models",
+    "elearning_app.pagination",
+    "elearning_app.renderers",
+    "elearning_app.mixins",
+    "elearning_app.urls",
+    "elearning_project.urls",
+)
+MANIFEST_NAME = "openapi.manifest.json"
+
+def get_schema_dir():
+    """The directory build_openapi_schema writes to, or None when OPENAPI_SCHEMA_DIR disables the artifact"""
+    directory = getattr(settings, "OPENAPI_SCHEMA_DIR", settings.BASE_DIR / "openapi")
+    return Path(directory) if directory else None
+
+def schema_source_hash() -> str:
+    """
+    Hashes everything the generated schema depends on: the source modules, the REST framework and
+    drf-spectacular settings and the drf-spectacular version. A different hash means the artifact is stale
+    """
+    digest = hashlib.sha256(spectacular_version.encode())
+    for module in getattr(settings, "OPENAPI_SCHEMA_SOURCE_MODULES", SCHEMA_SOURCE_MODULES):
+        digest.update(module.encode())
+        digest.update(Path(find_spec(module).origin).read_bytes())
+    for name in ("REST_FRAMEWORK", "SPECTACULAR_SETTINGS"):
+        digest.update(json.dumps(getattr(settings, name, {}), sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def generate_schema() -> dict:
+    """Renders the schema in every format served, as drf-spectacular's schema view would for a public request"""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(request=None, public=True)
+    return {
+        "yaml": OpenApiYamlRenderer().render(schema, renderer_context={}),
+        "json": OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+
+def _write_atomic(path: Path, content: bytes):
+    descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(content)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def build_schema_artifact(directory: Path) -> dict:
+    """
+    Writes the schema as openapi.<hash>.<format> files named after the source hash, then the manifest
+    pointing at them, and removes the files of earlier builds. Readers see either the old or the new build,
+    since the manifest is replaced last. Returns the manifest
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    source_hash = schema_source_hash()
+    rendered = generate_schema()
+
+    files = {}
+    for format, content in rendered.items():
+        name = f"openapi.{source_hash[:16]}.{format}"
+        _write_atomic(directory / name, content)
+        files[format] = {"name": name, "sha256": hashlib.sha256(content).hexdigest()}
+
+    manifest = {"source_hash": source_hash, "generated_at": timezone.now().isoformat(), "files": files}
+    _write_atomic(directory / MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+
+    current = {file["name"] for file in files.values()}
+    for path in directory.glob("openapi.*.*"):
+        if path.name != MANIFEST_NAME and path.name not in current:
+            path.unlink(missing_ok=True)
+    return manifest
+
+def read_schema_manifest(directory: Path):
+    """Returns the directory's build manifest, or None if there is no (readable) build"""
+    try:
+        return json.loads((directory / MANIFEST_NAME).read_text())
+    except (OSError, ValueError):
+        return None
+
+def schema_artifact_status():
+    """Returns ("disabled" | "missing" | "stale" | "fresh", manifest)"""
+    directory = get_schema_dir()
+    if directory is None:
+        return "disabled", None
+    manifest = read_schema_manifest(directory)
+    if manifest is None or any(not (directory / file["name"]).exists() for file in manifest["files"].values()):
+        return "missing", manifest
+    if manifest["source_hash"] != schema_source_hash():
+        return "stale", manifest
+    return "fresh", manifest
+
+_artifact = None
+
+def get_schema_artifact():
+    """
+    Returns {format: (content, sha256)} of the prebuilt schema, or None when there is no fresh build and the
+    schema has to be generated live. Loaded and checked against the sources once per process, since both
+    only change with a deploy
+    """
+    global _artifact
+    if _artifact is None:
+        state, manifest = schema_artifact_status()
+        if state == "fresh":
+            directory = get_schema_dir()
+            _artifact = {
+                format: ((directory / file["name"]).read_bytes(), file["sha256"])
+                for format, file in manifest["files"].items()
+            }
+        else:
+            _artifact = {}
+    return _artifact or None
+
+def clear_schema_artifact():
+    global _artifact
+    _artifact = None
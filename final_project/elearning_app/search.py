@@ -0,0 +1,106 @@
+import threading
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+from .models import *
+
+SEARCH_CONFIG = "english"
+
+def _titles_for_course(model, course_lookup: str):
+    """Subquery concatenating the titles of every `model` row belonging to the outer course"""
+    return Subquery(
+        model.objects.filter(**{course_lookup: OuterRef("pk")})
+        .order_by()
+        .values(course_lookup)
+        .annotate(text=StringAgg("title", delimiter=" "))
+        .values("text")[:1],
+        output_field=TextField(),
+    )
+
+def course_search_vector():
+    """
+    Expression building a course's weighted search document: title (A), description and teacher name (B)
+    and the syllabus' module, lesson and assignment titles (C). Only uses subqueries, so it can be used
+    directly in a queryset update()
+    """
+    teacher_name = Subquery(
+        User.objects.filter(pk=OuterRef("taught_by")).annotate(
+            name=Concat("first_name", Value(" "), "last_name", output_field=TextField())
+        ).values("name")[:1],
+        output_field=TextField(),
+    )
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("description", teacher_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector(
+            _titles_for_course(Module, "course"),
+            _titles_for_course(Lesson, "module__course"),
+            _titles_for_course(Assignment, "module__course"),
+            weight="C",
+            config=SEARCH_CONFIG,
+        )
+    )
+
+def update_course_search_vectors(course_ids=None) -> int:
+    """Recomputes the search vector of the given courses (or every course) in a single UPDATE"""
+    queryset = Course.objects.all() if course_ids is None else Course.objects.filter(pk__in=course_ids)
+    return queryset.update(search_vector=course_search_vector())
+
+_pending = threading.local()
+
+def _pending_ids(name: str) -> set:
+    ids = getattr(_pending, name, None)
+    if ids is None:
+        ids = set()
+        setattr(_pending, name, ids)
+    return ids
+
+def _flush_pending_search_updates():
+    course_ids = _pending_ids("course_ids")
+    module_ids = _pending_ids("module_ids")
+    if module_ids:
+        course_ids.update(Module.objects.filter(pk__in=module_ids).values_list("course_id", flat=True))
+    if course_ids:
+        update_course_search_vectors(list(course_ids))
+    course_ids.clear()
+    module_ids.clear()
+
+def schedule_course_search_update(course_id=None, module_id=None):
+    """
+    Queues a search vector refresh for a course (or the course owning a module) once the current
+    transaction commits. Refreshes are de-duplicated so cascading deletes only update each course once
+    """
+    if course_id is not None:
+        _pending_ids("course_ids").add(course_id)
+    if module_id is not None:
+        _pending_ids("module_ids").add(module_id)
+    transaction.on_commit(_flush_pending_search_updates)
+
+def search_courses(queryset, query: str):
+    """
+    Filters a course queryset to full-text matches or titles trigram-similar to the query (which catches
+    typos), ranked by text rank plus title similarity
+    """
+    search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=search_query) | Q(title__trigram_similar=query)
+    ).annotate(
+        # Courses whose vector isn't built yet rank by title alone, instead of a NULL rank sorting first
+        rank=Coalesce(SearchRank(F("search_vector"), search_query), Value(0.0)) + TrigramSimilarity("title", query)
+    ).order_by("-rank", "pk")
+
+def highlight_courses(queryset, query: str):
+    """Annotates title_highlight and description_highlight with matches wrapped in <mark> tags"""
+    search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+    return queryset.annotate(
+        title_highlight=SearchHeadline(
+            "title", search_query, config=SEARCH_CONFIG,
+            start_sel="<mark>", stop_sel="</mark>", highlight_all=True,
+        ),
+        description_highlight=SearchHeadline(
+            "description", search_query, config=SEARCH_CONFIG,
+            start_sel="<mark>", stop_sel="</mark>", max_words=35, min_words=15,
+        ),
+    )
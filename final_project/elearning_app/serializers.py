@@ -1,7 +1,101 @@
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import *
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+def parse_field_list(value) -> set:
+    """Parses a comma-separated query parameter such as ?fields=id,title into a set of names"""
+    return {item.strip() for item in (value or "").split(",") if item.strip()}
+
+def requested_expansions(fields: set, expand: set) -> set:
+    """
+    Returns every expanded dotted path, including the parents of each path and relations named in ?fields=,
+    e.g. {"modules.lessons"} -> {"modules", "modules.lessons"}
+    """
+    paths = set()
+    for path in fields | expand:
+        parts = path.split(".")
+        for depth in range(1, len(parts) + 1):
+            paths.add(".".join(parts[:depth]))
+    return paths
+
+def expandable_paths(serializer_class, prefix: str = "") -> set:
+    """Returns every dotted path that ?expand= accepts for serializer_class"""
+    paths = set()
+    declared = getattr(serializer_class, "_declared_fields", {})
+    for name in getattr(getattr(serializer_class, "Meta", None), "expandable_fields", ()):
+        path = f"{prefix}{name}"
+        paths.add(path)
+        field = declared.get(name)
+        child = getattr(field, "child", field)
+        if child is not None:
+            paths |= expandable_paths(type(child), f"{path}.")
+    return paths
+
+class ExpandableFieldsMixin:
+    """
+    Adds sparse fieldsets (?fields=id,title) and opt-in nested relations (?expand=modules.lessons) to a
+    serializer. Relations listed in Meta.expandable_fields are only serialized when expanded, and both
+    parameters take dotted paths into nested serializers. "fields" and "expand" entries in the serializer
+    context take precedence over the request's query parameters. Sparse fieldsets only apply to reads, so
+    writes still validate every field.
+    """
+    @property
+    def field_path(self) -> str:
+        """Dotted path of this serializer from the root serializer, e.g. "modules.lessons" """
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return ".".join(reversed(names))
+
+    def _requested(self, name: str) -> set:
+        if name in self.context:
+            return set(self.context[name])
+        request = self.context.get("request")
+        if request is None:
+            return set()
+        return parse_field_list(request.query_params.get(name))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        path = self.field_path
+        prefix = f"{path}." if path else ""
+        requested = self._requested("fields")
+        expanded = requested_expansions(requested, self._requested("expand"))
+
+        for name in getattr(self.Meta, "expandable_fields", ()):
+            if f"{prefix}{name}" not in expanded:
+                fields.pop(name, None)
+
+        request = self.context.get("request")
+        if request is None or request.method in SAFE_METHODS:
+            own = {field[len(prefix):].split(".")[0] for field in requested if field.startswith(prefix)}
+            if own:
+                fields = {name: field for name, field in fields.items() if name in own}
+        return fields
+
+class DownloadFileField(serializers.FileField):
+    """
+    A file represented by the URL of the view serving it to the users allowed to see it, since private uploads
+    (lesson files, submissions, chat attachments) aren't served at MEDIA_URL. Writes upload files as usual
+    """
+    def __init__(self, view_name, **kwargs):
+        self.view_name = view_name
+        super().__init__(**kwargs)
+
+    def download_url(self, pk, request=None) -> str:
+        url = reverse(self.view_name, kwargs={"pk": pk})
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return self.download_url(value.instance.pk, self.context.get("request"))
+
+class EnrollmentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Enrollment
         fields = [
@@ -19,7 +113,7 @@ class EnrollmentSerializer(serializers.ModelSerializer):
             "final_grade": {"required": False, "allow_null": True}
         }
 
-class CourseReviewSerializer(serializers.ModelSerializer):
+class CourseReviewSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CourseReview
         fields = [
@@ -55,18 +149,19 @@ class CourseReviewSerializer(serializers.ModelSerializer):
 
         return data
 
-class StatusUpdateSerializer(serializers.ModelSerializer):
+class StatusUpdateSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = StatusUpdate
         fields = ["course", "text"]
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     enrollments = EnrollmentSerializer(many=True, read_only=True)
     course_reviews = CourseReviewSerializer(many=True, read_only=True)
     status_updates = StatusUpdateSerializer(many=True, read_only=True)
 
     class Meta:
         model = User
+        expandable_fields = ("enrollments", "course_reviews", "status_updates")
         fields = [
             "id",
             "first_name",
@@ -86,7 +181,7 @@ class UserSerializer(serializers.ModelSerializer):
         else:
             return obj.courses
         
-class LessonProgressSerializer(serializers.ModelSerializer):
+class LessonProgressSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = LessonProgress
         fields = [
@@ -95,10 +190,12 @@ class LessonProgressSerializer(serializers.ModelSerializer):
             "completed"
         ]
         
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    lesson_file = DownloadFileField("lesson-file", required=False, allow_null=True)
     user_progress = LessonProgressSerializer(many=True, read_only=True)
     class Meta:
         model = Lesson
+        expandable_fields = ("user_progress",)
         fields = [
             "id",
             "title",
@@ -115,7 +212,9 @@ class LessonSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Lesson must have one of description or file")
         return data
 
-class AssignmentSubmissionSerializer(serializers.ModelSerializer):
+class AssignmentSubmissionSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    file_submission = DownloadFileField("submission-file")
+
     class Meta:
         model = AssignmentSubmission
         fields = [
@@ -130,11 +229,12 @@ class AssignmentSubmissionSerializer(serializers.ModelSerializer):
             "grade": {"required": False, "allow_null": True}
         }
 
-class AssignmentSerializer(serializers.ModelSerializer):
+class AssignmentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     assignment_submissions = AssignmentSubmissionSerializer(many=True, read_only=True)
 
     class Meta:
         model = Assignment
+        expandable_fields = ("assignment_submissions",)
         fields = [
             "title",
             "description",
@@ -150,12 +250,13 @@ class AssignmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Weight must be between 0 and 100.")
         return value
 
-class ModuleSerializer(serializers.ModelSerializer):
+class ModuleSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True)
     assignments = AssignmentSerializer(many=True, read_only=True)
 
     class Meta:
         model = Module
+        expandable_fields = ("lessons", "assignments")
         fields = [
             "id",
             "title",
@@ -166,13 +267,15 @@ class ModuleSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ("course", "lessons", "assignments")
 
-class CourseSerializer(serializers.ModelSerializer):
+class CourseSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     modules = ModuleSerializer(many=True, read_only=True)
     course_reviews = CourseReviewSerializer(many=True, read_only=True)
     enrollments = EnrollmentSerializer(many=True, read_only=True)
+    status = serializers.CharField(read_only=True)
 
     class Meta:
         model = Course
+        expandable_fields = ("modules", "course_reviews", "enrollments")
         fields = [
             "id",
             "title",
@@ -185,8 +288,9 @@ class CourseSerializer(serializers.ModelSerializer):
             "course_reviews",
             "enrollments",
             "is_published",
+            "status",
         ]
-        read_only_fields = ("modules", "course_reviews", "enrollments", "id", "taught_by", "cover_image" )
+        read_only_fields = ("modules", "course_reviews", "enrollments", "id", "taught_by", "status", )
 
     def validate_taught_by(self, teacher):
         if teacher.role != User.UserRole.TEACHER:
@@ -200,29 +304,62 @@ class CourseSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("End date cannot be before start date.")
         return data
     
-class ChatParticipantSerializer(serializers.ModelSerializer):
+class CourseCloneSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=256, required=False)
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data["end_date"] < data["start_date"]:
+            raise serializers.ValidationError("End date cannot be before start date.")
+        return data
+
+class CourseSearchResultSerializer(serializers.ModelSerializer):
+    rank = serializers.FloatField(read_only=True)
+    title_highlight = serializers.CharField(read_only=True)
+    description_highlight = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            "id",
+            "title",
+            "description",
+            "taught_by",
+            "start_date",
+            "end_date",
+            "rank",
+            "title_highlight",
+            "description_highlight",
+        ]
+
+class ChatParticipantSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ChatParticipant
         fields = "__all__"
 
-class ChatMessageAttachmentSerializer(serializers.ModelSerializer):
+class ChatMessageAttachmentSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    attachment = DownloadFileField("chat-attachment")
+
     class Meta:
         model = ChatMessageAttachments
         fields = ["id", "attachment"]
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     attachments = ChatMessageAttachmentSerializer(many=True, required=False, read_only=True)
 
     class Meta:
         model = ChatMessage
+        expandable_fields = ("attachments",)
         fields = ["id", "chat", "sender", "sent_at", "text", "attachments"]
 
-class ChatSerializer(serializers.ModelSerializer):
+class ChatSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
     participants = ChatParticipantSerializer(many=True, read_only=True)
     messages = ChatMessageSerializer(many=True, read_only=True)
 
     class Meta:
         model = Chat
+        expandable_fields = ("participants", "messages")
         fields = [
             "pk",
             "title",
@@ -232,6 +369,12 @@ class ChatSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ("participants", "messages", )
 
+class NotificationSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "related_course", "content", "created_at", "read"]
+        read_only_fields = ("id", "related_course", "content", "created_at", )
+
 class UserBlockSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserBlock
@@ -240,4 +383,14 @@ class UserBlockSerializer(serializers.ModelSerializer):
 
 class MessageSerializer(serializers.Serializer):
     message = serializers.CharField(required=False)
-    error = serializers.CharField(required=False)
\ No newline at end of file
+    error = serializers.CharField(required=False)
+
+class BatchOperationSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=["GET", "POST"], default="GET")
+    url = serializers.CharField(help_text="Relative API path with an optional query string, e.g. /api/courses/1/modules/")
+    body = serializers.JSONField(required=False, help_text="JSON body of a POST")
+
+class BatchResultSerializer(serializers.Serializer):
+    status = serializers.IntegerField()
+    headers = serializers.DictField(child=serializers.CharField())
+    body = serializers.JSONField(allow_null=True)
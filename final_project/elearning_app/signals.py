@@ -1,7 +1,10 @@
 from datetime import datetime
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models import Q
 from django.dispatch import receiver
+from .caching import bump_course_activity_version, bump_course_content_version, invalidate_course_members
 from .models import *
+from .search import schedule_course_search_update
 
 @receiver(post_save, sender=Module)
 def module_create_notification(sender, instance: Module, created, **kwargs):
@@ -40,6 +43,8 @@ def mark_enrollment_completed_on_lessons_completed(sender, instance: LessonProgr
 
         if course.get_user_progress(student) == 100.0:
             enrollment = student.enrollments.filter(course=course).first()
+            if enrollment is None:
+                return
             enrollment.status = Enrollment.EnrollmentStatus.COMPLETED
             enrollment.completed_on = datetime.now()
             update_fields=["status", "completed_on"]
@@ -76,6 +81,19 @@ def enrollment_notification(sender, instance: Enrollment, created, **kwargs):
             instance.removed_on = datetime.now()
             instance.save(update_fields=["removed_on"])
 
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_course_members_on_enrollment_change(sender, instance: Enrollment, **kwargs):
+    """Drop the course's cached membership whenever an enrollment's status may have changed"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "status" not in update_fields:
+        return
+    is_active = kwargs["signal"] is post_save and instance.status == Enrollment.EnrollmentStatus.ACTIVE
+    # Set by remember_previous_enrollment_status, and only removed by the stats signal that runs after this one
+    if hasattr(instance, "_previous_status") and (instance._previous_status == Enrollment.EnrollmentStatus.ACTIVE) == is_active:
+        return
+    invalidate_course_members(instance.course_id, {instance.student_id: "student" if is_active else None})
+
 @receiver(post_save, sender=AssignmentSubmission)
 def assignment_submission_notifications(sender, instance: AssignmentSubmission, created, **kwargs):
     """Notify a teacher when a student submits an assignment and notify a student when a teacher grades their assignment. Also, mark enrollment complete if course complete"""
@@ -96,6 +114,8 @@ def assignment_submission_notifications(sender, instance: AssignmentSubmission,
         )
         if course.get_user_progress(student) == 100.0:
             enrollment = student.enrollments.filter(course=course).first()
+            if enrollment is None:
+                return
             enrollment.status = Enrollment.EnrollmentStatus.COMPLETED
             enrollment.completed_on = datetime.now()
             update_fields=["status", "completed_on"]
@@ -117,4 +137,180 @@ def remove_enrollments_on_block(sender, instance: UserBlock, created, **kwargs):
         teacher = instance.blocked_by
         student = instance.blocked_user
         for course in teacher.get_courses():
-            Enrollment.objects.filter(course=course, student=student).update(status=Enrollment.EnrollmentStatus.REMOVED, completed_on=datetime.now())
+            enrollments = Enrollment.objects.filter(course=course, student=student)
+            active_count = enrollments.filter(status=Enrollment.EnrollmentStatus.ACTIVE).count()
+            enrollments.update(status=Enrollment.EnrollmentStatus.REMOVED, completed_on=datetime.now())
+            # Queryset updates skip the enrollment signals
+            invalidate_course_members(course.pk, {student.pk: None})
+            CourseStats.adjust(course.pk, active_enrollment_count=-active_count)
+            bump_course_activity_version(pk=course.pk)
+
+@receiver(post_save, sender=Course)
+def update_search_vector_on_course_save(sender, instance: Course, **kwargs):
+    """Refresh the course's search vector when one of its indexed fields may have changed"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or {"title", "description", "taught_by"} & set(update_fields):
+        schedule_course_search_update(course_id=instance.pk)
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def update_search_vector_on_module_change(sender, instance: Module, **kwargs):
+    """Refresh the course's search vector when its syllabus changes"""
+    schedule_course_search_update(course_id=instance.course_id)
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def update_search_vector_on_syllabus_item_change(sender, instance, **kwargs):
+    """Refresh the course's search vector when a lesson or assignment title may have changed"""
+    schedule_course_search_update(module_id=instance.module_id)
+
+@receiver(post_save, sender=User)
+def update_search_vector_on_teacher_rename(sender, instance: User, **kwargs):
+    """Refresh the search vectors of a teacher's courses when their name changes"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or {"first_name", "last_name"} & set(update_fields):
+        for course_id in Course.objects.filter(taught_by=instance).values_list("pk", flat=True):
+            schedule_course_search_update(course_id=course_id)
+
+@receiver(post_save, sender=User)
+def bump_activity_version_on_profile_change(sender, instance: User, created, **kwargs):
+    """Course pages show the names and avatars of their teacher and students"""
+    update_fields = kwargs.get("update_fields")
+    if created or update_fields is not None and not {"first_name", "last_name", "profile_picture"} & set(update_fields):
+        return
+    courses = Course.objects.filter(Q(taught_by=instance) | Q(enrollments__student=instance)).values("pk")
+    bump_course_activity_version(pk__in=courses)
+
+@receiver(pre_save, sender=Course)
+def remember_previous_teacher(sender, instance: Course, **kwargs):
+    """Keep the stored teacher around so post_save can tell whether the course changed hands"""
+    update_fields = kwargs.get("update_fields")
+    if instance._state.adding or update_fields is not None and "taught_by" not in update_fields:
+        return
+    instance._previous_teacher_id = Course.objects.filter(pk=instance.pk).values_list("taught_by_id", flat=True).first()
+
+@receiver(post_save, sender=Course)
+def invalidate_course_members_on_teacher_change(sender, instance: Course, **kwargs):
+    """Hand the course's live channel over to its new teacher"""
+    if not hasattr(instance, "_previous_teacher_id"):
+        return
+    previous_teacher_id = instance._previous_teacher_id
+    del instance._previous_teacher_id
+    if previous_teacher_id is not None and previous_teacher_id != instance.taught_by_id:
+        invalidate_course_members(instance.pk, {previous_teacher_id: None, instance.taught_by_id: "teacher"})
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance: Course, created, **kwargs):
+    """Create the statistics row every new course is counted into"""
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+
+@receiver(pre_save, sender=Enrollment)
+def remember_previous_enrollment_status(sender, instance: Enrollment, **kwargs):
+    """Keep the stored status around so post_save can tell whether the enrollment became (in)active"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "status" not in update_fields:
+        return
+    if instance._state.adding:
+        instance._previous_status = None
+    else:
+        instance._previous_status = Enrollment.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+
+@receiver(post_save, sender=Enrollment)
+def update_course_stats_on_enrollment_save(sender, instance: Enrollment, **kwargs):
+    """Count enrollments in and out of the course's active enrollment count as their status changes"""
+    update_fields = kwargs.get("update_fields")
+    if (update_fields is not None and "status" not in update_fields) or not hasattr(instance, "_previous_status"):
+        return
+    was_active = instance._previous_status == Enrollment.EnrollmentStatus.ACTIVE
+    is_active = instance.status == Enrollment.EnrollmentStatus.ACTIVE
+    del instance._previous_status
+    if was_active != is_active:
+        CourseStats.adjust(instance.course_id, active_enrollment_count=1 if is_active else -1)
+
+@receiver(post_delete, sender=Enrollment)
+def update_course_stats_on_enrollment_delete(sender, instance: Enrollment, **kwargs):
+    """Remove a deleted active enrollment from the course's active enrollment count"""
+    if instance.status == Enrollment.EnrollmentStatus.ACTIVE:
+        CourseStats.adjust(instance.course_id, active_enrollment_count=-1)
+
+@receiver(pre_save, sender=CourseReview)
+def remember_previous_review_rating(sender, instance: CourseReview, **kwargs):
+    """Keep the stored rating around so post_save can move the review between histogram buckets"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and "rating" not in update_fields:
+        return
+    if instance._state.adding:
+        instance._previous_rating = None
+    else:
+        instance._previous_rating = CourseReview.objects.filter(pk=instance.pk).values_list("rating", flat=True).first()
+
+@receiver(post_save, sender=CourseReview)
+def update_course_stats_on_review_save(sender, instance: CourseReview, created, **kwargs):
+    """Add new reviews to the course's rating statistics and move edited ones to their new rating"""
+    update_fields = kwargs.get("update_fields")
+    if (update_fields is not None and "rating" not in update_fields) or not hasattr(instance, "_previous_rating"):
+        return
+    previous = instance._previous_rating
+    del instance._previous_rating
+    if created:
+        CourseStats.adjust(
+            instance.course_id,
+            rating_sum=instance.rating,
+            rating_count=1,
+            **{CourseStats.rating_field(instance.rating): 1}
+        )
+    elif previous is not None and previous != instance.rating:
+        CourseStats.adjust(
+            instance.course_id,
+            rating_sum=instance.rating - previous,
+            **{CourseStats.rating_field(previous): -1, CourseStats.rating_field(instance.rating): 1}
+        )
+
+@receiver(post_delete, sender=CourseReview)
+def update_course_stats_on_review_delete(sender, instance: CourseReview, **kwargs):
+    """Remove a deleted review from the course's rating statistics"""
+    CourseStats.adjust(
+        instance.course_id,
+        rating_sum=-instance.rating,
+        rating_count=-1,
+        **{CourseStats.rating_field(instance.rating): -1}
+    )
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+def bump_content_version_on_module_change(sender, instance: Module, **kwargs):
+    """Invalidate the course's cached syllabus fragments when a module changes"""
+    bump_course_content_version(course_id=instance.course_id)
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def bump_content_version_on_syllabus_item_change(sender, instance, **kwargs):
+    """Invalidate the course's cached syllabus fragments when a lesson or assignment changes"""
+    bump_course_content_version(module_id=instance.module_id)
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_save, sender=CourseReview)
+@receiver(post_delete, sender=CourseReview)
+@receiver(post_save, sender=StatusUpdate)
+@receiver(post_delete, sender=StatusUpdate)
+def bump_activity_version_on_course_activity(sender, instance, **kwargs):
+    """Invalidate conditional GET validators of the course when its enrollments, reviews or feed change"""
+    bump_course_activity_version(pk=instance.course_id)
+
+@receiver(post_save, sender=LessonProgress)
+@receiver(post_delete, sender=LessonProgress)
+def bump_activity_version_on_lesson_progress(sender, instance: LessonProgress, **kwargs):
+    """Invalidate conditional GET validators of the course when a student's lesson progress changes"""
+    bump_course_activity_version(modules__lessons=instance.lesson_id)
+
+@receiver(post_save, sender=AssignmentSubmission)
+@receiver(post_delete, sender=AssignmentSubmission)
+def bump_activity_version_on_submission(sender, instance: AssignmentSubmission, **kwargs):
+    """Invalidate conditional GET validators of the course when an assignment is submitted or graded"""
+    bump_course_activity_version(modules__assignments=instance.assignment_id)
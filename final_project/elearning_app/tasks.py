@@ -1,48 +1,88 @@
-import io
 from celery import shared_task
-from PIL import Image
+from django.conf import settings
 from django.core.files.base import ContentFile
 from datetime import timedelta
+from .images import *
+from .leaderboards import cache_course_leaderboards
 from .models import *
 
 @shared_task
 def resize_profile_picture(user_id):
-    """Crops and resizes a profile picture to a centered 200x200 square."""
+    """
+    Renders a new profile picture as square avatars in every size of AVATAR_SIZES, as WebP and JPEG, stored
+    under the hash of the upload. The picture is decoded once, in draft mode for JPEGs (see images.open_image).
+    The ImageField then points at the AVATAR_DEFAULT_SIZE JPEG, and the upload and earlier variants are deleted.
+    The saves that replace a picture clear its variants, so the earlier ones are found in the user's directory
+    """
     try:
         user = User.objects.get(pk=user_id)
-        if not user.profile_picture:
-            return
+    except User.DoesNotExist:
+        return
+    # Already rendered, e.g. when the task is retried
+    if not user.profile_picture or user.profile_picture.name.startswith(f"avatars/{user_id}/"):
+        return
 
-        # Open the existing image
-        img = Image.open(user.profile_picture)
-        img = img.convert("RGB")  # Ensure consistent format
+    upload = user.profile_picture
+    storage = upload.storage
+    with upload.open("rb") as file:
+        data = file.read()
+    digest = content_hash(data)
+    sizes = getattr(settings, "AVATAR_SIZES", AVATAR_SIZES)
+    quality = getattr(settings, "AVATAR_QUALITY", DEFAULT_QUALITY)
+    variants = render_avatar_variants(data, sizes, quality=quality)
 
-        # Crop to square (centered)
-        width, height = img.size
-        min_dim = min(width, height)
-        left = (width - min_dim) // 2
-        top = (height - min_dim) // 2
-        right = left + min_dim
-        bottom = top + min_dim
-        img = img.crop((left, top, right, bottom))
+    names = {}
+    for (size, format), content in variants.items():
+        name = avatar_variant_name(user_id, digest, size, format)
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+        names.setdefault(FORMAT_EXTENSIONS[format], {})[str(size)] = name
 
-        # Resize to 200x200
-        img = img.resize((200, 200), Image.Resampling.LANCZOS)
+    directory = f"avatars/{user_id}"
+    previous = []
+    if storage.exists(directory):
+        for digest_directory in storage.listdir(directory)[0]:
+            previous += [f"{directory}/{digest_directory}/{name}" for name in storage.listdir(f"{directory}/{digest_directory}")[1]]
+    user.profile_picture = names["jpg"][str(getattr(settings, "AVATAR_DEFAULT_SIZE", AVATAR_DEFAULT_SIZE))]
+    user.profile_picture_variants = names
+    user.save(update_fields=["profile_picture", "profile_picture_variants"])
 
-        # Save the resized image to memory
-        buffer = io.BytesIO()
-        img.save(buffer, format="JPEG", quality=90)
-        buffer.seek(0)
+    current = {name for extension in names.values() for name in extension.values()}
+    for name in [upload.name, *previous]:
+        if name not in current:
+            storage.delete(name)
 
-        # Create a new file name
-        file_name = f"profile_{user_id}.jpg"
+@shared_task
+def process_course_cover(course_id):
+    """
+    Renders a new course cover cropped to 16:9 in every width of COVER_WIDTHS, as WebP and JPEG, plus the
+    blurred placeholder (LQIP) inlined on the course. The upload itself is kept: course pages and the API
+    still link to it, and clones share it. The saves that replace a cover clear the previous one's variants
+    """
+    course = Course.objects.filter(pk=course_id).only("cover_image", "cover_image_variants").first()
+    # Gone, cleared, or already rendered, e.g. when the task is retried
+    if course is None or not course.cover_image or course.cover_image_variants:
+        return
 
-        # Save back to the field (overwrite old one)
-        user.profile_picture.save(file_name, ContentFile(buffer.read()), save=True)
+    cover = course.cover_image
+    storage = cover.storage
+    with cover.open("rb") as file:
+        data = file.read()
+    digest = content_hash(data)
+    widths = getattr(settings, "COVER_WIDTHS", COVER_WIDTHS)
+    quality = getattr(settings, "COVER_QUALITY", DEFAULT_QUALITY)
+    variants, lqip = render_cover_variants(data, widths, quality=quality)
+
+    names = {}
+    for (width, format), content in variants.items():
+        name = cover_variant_name(digest, width, format)
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+        names.setdefault(FORMAT_EXTENSIONS[format], {})[str(width)] = name
+
+    # Unless the cover was replaced again while this ran
+    Course.objects.filter(pk=course_id, cover_image=cover.name).update(cover_image_variants=names, cover_image_lqip=lqip)
 
-    except User.DoesNotExist:
-        return
-    
 @shared_task
 def notify_upcoming_assignment_deadlines():
     """Creates notifications for users when an assignment is a week away and hasn't been submitted"""
@@ -70,4 +110,9 @@ def notify_upcoming_assignment_deadlines():
                     related_course=course,
                     user=enrollment.student,
                     content=f'Assignment "{assignment.title}" is due in one week for course {course.title}.',
-                )
\ No newline at end of file
+                )
+
+@shared_task
+def refresh_course_leaderboards():
+    """Recomputes the cached trending/top-rated/newest course leaderboards served to the home page and API"""
+    cache_course_leaderboards()
@@ -0,0 +1,75 @@
+import re
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.utils.dateparse import parse_datetime
+from django.utils.safestring import mark_safe
+from ..caching import course_fragment_key
+from ..metrics import record_cache_lookup
+
+register = template.Library()
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, "FRAGMENT_CACHE_TIMEOUT", 60 * 60 * 24)
+OVERLAY_MARKER = re.compile(r"<!--overlay:(?P<name>\w+):(?P<pk>\d+):(?P<timestamp>[^>]*)-->")
+
+class CourseFragmentNode(template.Node):
+    def __init__(self, nodelist, name, course, variant):
+        self.nodelist = nodelist
+        self.name = name
+        self.course = course
+        self.variant = variant
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        course = self.course.resolve(context)
+        variant = self.variant.resolve(context) if self.variant else ""
+        key = course_fragment_key(name, course.pk, course.content_version, variant)
+
+        html = cache.get(key)
+        record_cache_lookup("fragment", html is not None)
+        if html is None:
+            prefetch_related_objects([course], "modules__lessons", "modules__assignments")
+            html = self.nodelist.render(context)
+            cache.set(key, html, FRAGMENT_CACHE_TIMEOUT)
+        return mark_safe(self.apply_overlays(html, context))
+
+    def apply_overlays(self, html, context):
+        """Renders components/overlays/<name>.html for the current user in place of each overlay marker"""
+        templates = {}
+
+        def render_overlay(match):
+            name = match.group("name")
+            if name not in templates:
+                templates[name] = context.template.engine.get_template(f"components/overlays/{name}.html")
+            values = {
+                "overlay_pk": int(match.group("pk")),
+                "overlay_timestamp": parse_datetime(match.group("timestamp")) if match.group("timestamp") else None,
+            }
+            with context.push(**values):
+                return templates[name].render(context)
+
+        return OVERLAY_MARKER.sub(render_overlay, html)
+
+@register.tag
+def course_fragment(parser, token):
+    """
+    Caches the enclosed syllabus markup per course content version, shared by every viewer of the course.
+    Anything that depends on the viewer goes through {% overlay %}, or into a separate variant.
+    Usage: {% course_fragment "name" course [variant] %} ... {% endcourse_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) not in (3, 4):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name, a course and an optional variant")
+    nodelist = parser.parse(("endcourse_fragment",))
+    parser.delete_first_token()
+    variant = parser.compile_filter(bits[3]) if len(bits) == 4 else None
+    return CourseFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), variant)
+
+@register.simple_tag
+def overlay(name, pk, timestamp=None):
+    """
+    Marks where a per-user overlay is rendered inside a cached course fragment. The optional timestamp is
+    carried along for overlays that show it relative to the current time
+    """
+    return mark_safe(f"<!--overlay:{name}:{pk}:{timestamp.isoformat() if timestamp else ''}-->")
@@ -1,13 +1,43 @@
-from django.urls import reverse
+from django.urls import re_path, reverse
 from django.contrib.auth.models import Group
 from rest_framework import status
 from hypothesis import given, strategies as st
 from .models import *
 from .serializers import *
 from .model_factories import *
+from .caching import course_live_group_name, course_members_key, course_validators, get_course_members, shared_cache
+from .checks import check_openapi_schema
+from .downloads import serve_public_media
+from .consumers import SLOW_CONSUMER_CLOSE_CODE, ChatConsumer, chat_group_name, outbound_metrics
+from .querybudget import check_query_budgets
+from .search import search_courses
+from .schema import MANIFEST_NAME, clear_schema_artifact
+from .tasks import process_course_cover, resize_profile_picture
+from PIL import Image
 from hypothesis.extra.django import TestCase as HypothesisTestCase
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+import asyncio
+import io
+import json
+import tempfile
+import zipfile
 import string
+from datetime import date, timedelta
+from unittest import mock
+from pathlib import Path
+from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, RequestFactory, SimpleTestCase, override_settings
+from django.conf import settings
+from django.http import Http404
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 class BaseAPITestCase(HypothesisTestCase):
     password = "StrongPass123"
@@ -24,6 +54,15 @@ class BaseAPITestCase(HypothesisTestCase):
     def setUp(self):
         self.client = APIClient()
 
+    def use_temp_directory(self, setting="MEDIA_ROOT", **overrides) -> Path:
+        """Points a directory setting (uploads by default) at a fresh directory removed after the test"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(**{setting: directory.name}, **overrides)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return Path(directory.name)
+
     def create_student(self, **kwargs):
         return UserFactory(role=self.student_role, password=self.password, **kwargs)
 
@@ -96,7 +135,262 @@ class CourseAPITests(BaseAPITestCase):
         self.client.post(self.url, self.course_data)
         response = self.client.get(self.url)
         assert response.status_code == status.HTTP_200_OK
-        assert any(course["title"] == self.course_data["title"] for course in response.data)
+        assert any(course["title"] == self.course_data["title"] for course in response.data["results"])
+
+    def test_course_list_cursor_pagination(self):
+        courses = [self.create_course(taught_by=self.teacher, title=f"Course {i}") for i in range(3)]
+        response = self.client.get(self.url, {"page_size": 2})
+        assert response.status_code == status.HTTP_200_OK
+        assert [course["id"] for course in response.data["results"]] == [courses[2].pk, courses[1].pk]
+        assert response.data["previous"] is None
+
+        response = self.client.get(response.data["next"])
+        assert [course["id"] for course in response.data["results"]] == [courses[0].pk]
+        assert response.data["next"] is None
+
+    def test_course_list_status_filter(self):
+        today = timezone.now().date()
+        upcoming = self.create_course(
+            taught_by=self.teacher, start_date=today + timedelta(days=7), end_date=today + timedelta(days=30)
+        )
+        ended = self.create_course(
+            taught_by=self.teacher, start_date=today - timedelta(days=30), end_date=today - timedelta(days=7)
+        )
+        response = self.client.get(self.url, {"status": "upcoming"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [course["id"] for course in response.data["results"]] == [upcoming.pk]
+        assert response.data["results"][0]["status"] == "upcoming"
+        assert Course.objects.with_status().get(pk=ended.pk).status == "ended"
+
+        response = self.client.get(self.url, {"status": "someday"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_trending_courses(self):
+        shared_cache().clear()
+        course = self.create_course(taught_by=self.teacher)
+        EnrollmentFactory(course=course, student=self.student)
+        # Canceled enrollments don't count
+        EnrollmentFactory(course=course, status=Enrollment.EnrollmentStatus.CANCELED)
+        response = self.client.get(reverse("api_courses_trending"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["most_enrolled_7d"][0]["id"] == course.pk
+        assert response.data["most_enrolled_7d"][0]["recent_enrollments"] == 1
+        assert response.data["newest"][0]["id"] == course.pk
+
+    def test_course_search_ranks_and_highlights(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            match = self.create_course(taught_by=self.teacher, title="Organic Chemistry")
+            self.create_course(taught_by=self.teacher, title="Medieval History")
+        response = self.client.get(reverse("api_course_search"), {"q": "chemistry"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [course["id"] for course in response.data["results"]] == [match.pk]
+        assert "<mark>Chemistry</mark>" in response.data["results"][0]["title_highlight"]
+
+    def test_course_search_ranks_unindexed_courses_last(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            indexed = self.create_course(taught_by=self.teacher, title="Chemistry")
+        unindexed = self.create_course(taught_by=self.teacher, title="Chemistry")
+        Course.objects.filter(pk=unindexed.pk).update(search_vector=None)
+        assert [course.pk for course in search_courses(Course.objects.all(), "chemistry")] == [indexed.pk, unindexed.pk]
+
+    def test_user_list_filters_by_name(self):
+        match = self.create_student(first_name="Ada", last_name="Lovelace")
+        self.client.force_login(self.student)
+        response = self.client.get(reverse("users"), {"query": "lovelace"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [user.pk for user in response.context["users"]] == [match.pk]
+
+    def test_syllabus_changes_bump_content_version(self):
+        course = self.create_course(taught_by=self.teacher)
+        module = ModuleFactory(course=course)
+        AssignmentFactory(module=module)
+        course.refresh_from_db()
+        assert course.content_version == 2
+
+        module.delete()
+        course.refresh_from_db()
+        assert course.content_version > 2
+
+    def test_activity_bumps_stats_not_course(self):
+        course = self.create_course(taught_by=self.teacher)
+        last_edited_at = Course.objects.get(pk=course.pk).last_edited_at
+        etag = course_validators(pk=course.pk)["etag"]
+
+        EnrollmentFactory(course=course, student=self.student)
+        assert CourseStats.objects.get(course=course).activity_version == 1
+        assert Course.objects.get(pk=course.pk).last_edited_at == last_edited_at
+        assert course_validators(pk=course.pk)["etag"] != etag
+
+    def test_course_detail_conditional_get(self):
+        course = self.create_course(taught_by=self.teacher)
+        url = reverse("api_course", kwargs={"pk": course.pk})
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        ModuleFactory(course=course)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_course_page_etag_covers_viewer(self):
+        course = self.create_course(taught_by=self.teacher)
+        EnrollmentFactory(course=course, student=self.student)
+        client = Client()
+        client.force_login(self.student)
+        url = reverse("course", kwargs={"pk": course.pk})
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_304_NOT_MODIFIED
+
+        # A new CSRF secret, as after logging in again
+        del client.cookies[settings.CSRF_COOKIE_NAME]
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        etag = response["ETag"]
+
+        self.teacher.first_name = "Renamed"
+        self.teacher.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+
+    def test_course_detail_response_cache(self):
+        course = self.create_course(taught_by=self.teacher)
+        url = reverse("api_course", kwargs={"pk": course.pk})
+        self.client.force_authenticate(user=self.student)
+        assert self.client.get(url)["X-Cache"] == "MISS"
+
+        self.client.force_authenticate(user=self.create_student())
+        response = self.client.get(url)
+        assert response["X-Cache"] == "HIT"
+        assert response.data["title"] == course.title
+
+        ModuleFactory(course=course)
+        assert self.client.get(url)["X-Cache"] == "MISS"
+        self.client.force_authenticate(user=self.teacher)
+        assert self.client.get(url)["X-Cache"] == "MISS"
+
+    def test_batch(self):
+        course = self.create_course(taught_by=self.teacher)
+        modules_url = reverse("api_modules", kwargs={"pk": course.pk})
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.post(reverse("api_batch"), [
+            {"url": reverse("api_course", kwargs={"pk": course.pk})},
+            {"method": "POST", "url": modules_url, "body": {"title": "Batched module"}},
+            {"url": f"{modules_url}?fields=title"},
+            {"url": "/api/nothing-here/"},
+            {"url": reverse("api_async_notifications")},
+        ], format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.data] == [200, 201, 200, 404, 400]
+        assert response.data[0]["body"]["title"] == course.title
+        assert response.data[2]["body"]["results"] == [{"title": "Batched module"}]
+
+        response = self.client.post(reverse("api_batch"), [{"url": "https://example.com/api/courses/"}], format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_fast_json_renderer_matches_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+        course = self.create_course(taught_by=self.teacher)
+        ModuleFactory(course=course, description="Line\u2028separator")
+        data = CourseSerializer(Course.objects.with_status().get(pk=course.pk), context={"expand": ["modules"]}).data
+        data["generated_at"] = timezone.now()
+        assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+    def test_course_detail_fields_and_expand(self):
+        course = self.create_course(taught_by=self.teacher)
+        module = ModuleFactory(course=course)
+        url = reverse("api_course", kwargs={"pk": course.pk})
+
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert "modules" not in response.data and "enrollments" not in response.data
+
+        response = self.client.get(url, {"expand": "modules.lessons", "fields": "id,title,modules.id,modules.lessons"})
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data) == {"id", "title", "modules"}
+        assert response.data["modules"] == [{"id": module.pk, "lessons": []}]
+
+    def test_fast_course_list_matches_serializer(self):
+        course = self.create_course(taught_by=self.teacher)
+        EnrollmentFactory(course=course, student=self.student)
+        response = self.client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [CourseSerializer(Course.objects.with_status().get(pk=course.pk)).data]
+
+        self.client.force_authenticate(user=self.student)
+        response = self.client.get(reverse("api_enrollments", kwargs={"pk": course.pk}))
+        assert response.data["results"] == EnrollmentSerializer(Enrollment.objects.filter(course=course), many=True).data
+
+    def test_course_bundle_export_and_import(self):
+        source = self.create_course(taught_by=self.teacher)
+        AssignmentFactory(module=ModuleFactory(course=source), weight=40)
+        response = self.client.get(reverse("api_course_bundle", kwargs={"pk": source.pk}), {"bundle": "json"})
+        assert response.status_code == status.HTTP_200_OK
+        bundle = json.loads(b"".join(response.streaming_content))
+
+        target = self.create_course(taught_by=self.teacher)
+        EnrollmentFactory(course=target, student=self.student)
+        url = reverse("api_course_bundle", kwargs={"pk": target.pk})
+        response = self.client.post(url, bundle, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data == {"modules": 1, "lessons": 0, "assignments": 1}
+        assert Notification.objects.filter(user=self.student, related_course=target).count() == 1
+
+        assert self.client.post(url, bundle, format="json").status_code == status.HTTP_201_CREATED
+        # A third copy would take the course's assignment weights to 120%
+        response = self.client.post(url, bundle, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Assignment.objects.filter(module__course=target).count() == 2
+
+    def test_course_bundle_rejects_foreign_files_and_corrupt_archives(self):
+        course = self.create_course(taught_by=self.teacher)
+        url = reverse("api_course_bundle", kwargs={"pk": course.pk})
+        # Another student's submission, which a lesson would make downloadable by the teacher
+        AssignmentSubmission.objects.create(assignment=AssignmentFactory(), student=self.student, file_submission="essay.pdf")
+        bundle = {
+            "format": "onlineu-course-bundle", "version": 1,
+            "modules": [{"title": "Module", "lessons": [{"title": "Lesson", "file": "essay.pdf"}]}],
+        }
+        assert self.client.post(url, bundle, format="json").status_code == status.HTTP_400_BAD_REQUEST
+        assert not Lesson.objects.filter(module__course=course).exists()
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+            archive.writestr("course.json", json.dumps(bundle))
+        corrupt = buffer.getvalue().replace(b'"format"', b'"formaT"', 1)
+        response = self.client.post(url, {"bundle": SimpleUploadedFile("course.zip", corrupt)}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_course_clone(self):
+        dates = {"start_date": "2025-09-01", "end_date": "2025-10-01"}
+        course = self.create_course(taught_by=self.teacher, start_date=date(2025, 1, 1), end_date=date(2025, 2, 1))
+        module = ModuleFactory(course=course)
+        Lesson.objects.create(module=module, title="Intro", lesson_file="intro.pdf")
+        assignment = AssignmentFactory(module=module, deadline=timezone.now())
+        EnrollmentFactory(course=course, student=self.student)
+
+        larger = self.create_course(taught_by=self.teacher)
+        for i in range(3):
+            larger_module = ModuleFactory(course=larger)
+            Lesson.objects.create(module=larger_module, title=f"Lesson {i}", description="Reading")
+            AssignmentFactory(module=larger_module)
+        with CaptureQueriesContext(connection) as larger_queries:
+            self.client.post(reverse("api_course_clone", kwargs={"pk": larger.pk}), dates)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("api_course_clone", kwargs={"pk": course.pk}), dates)
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(queries) == len(larger_queries)
+        assert response.data["is_published"] is False
+        clone = Course.objects.get(pk=response.data["id"])
+        assert Lesson.objects.get(module__course=clone).lesson_file.name == "intro.pdf"
+        assert Assignment.objects.get(module__course=clone).deadline == assignment.deadline + timedelta(days=243)
+        assert not Notification.objects.filter(related_course=clone).exists()
 
 class EnrollmentAPITests(BaseAPITestCase):
     url = None
@@ -119,6 +413,18 @@ class EnrollmentAPITests(BaseAPITestCase):
         assert response.status_code == status.HTTP_201_CREATED
         assert response.data["student"] == self.student.pk
 
+    def test_enrollment_and_review_update_course_stats(self):
+        self.client.force_authenticate(user=self.student)
+        self.client.post(self.url, {"user_id": self.student.pk})
+        CourseReview.objects.create(course=self.course, student=self.student, rating=4)
+        stats = CourseStats.objects.get(course=self.course)
+        assert stats.active_enrollment_count == 1
+        assert (stats.rating_count, stats.rating_sum, stats.ratings_4) == (1, 4, 1)
+
+        Enrollment.objects.get(course=self.course, student=self.student).delete()
+        stats.refresh_from_db()
+        assert stats.active_enrollment_count == 0
+
     def test_teacher_cannot_enroll(self):
         data = {"user_id": self.teacher.pk}
         response = self.client.post(self.url, data)
@@ -181,4 +487,446 @@ class NotificationAPITests(BaseAPITestCase):
         response = self.client.post(self.url)
         assert response.status_code == status.HTTP_200_OK
         self.notification.refresh_from_db()
-        assert self.notification.read is True
\ No newline at end of file
+        assert self.notification.read is True
+
+    def test_notification_list(self):
+        NotificationFactory(user=self.create_student(), related_course=self.course)
+        response = self.client.get(reverse("api_notifications"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [NotificationSerializer(self.notification).data]
+
+class QueryBudgetTests(BaseAPITestCase):
+    def seed(self, students):
+        teacher = self.create_teacher()
+        course = self.create_course(taught_by=teacher)
+        module = ModuleFactory(course=course)
+        assignment = AssignmentFactory(module=module)
+        lesson = Lesson.objects.create(module=module, title="Lesson", description="Lesson content")
+        chat = Chat.objects.create(title="Course chat", created_by=teacher)
+        ChatParticipant.objects.create(chat=chat, user=teacher)
+        for _ in range(students):
+            student = self.create_student()
+            enrollment = EnrollmentFactory(student=student, course=course, status=Enrollment.EnrollmentStatus.ACTIVE)
+            LessonProgress.objects.create(student=student, lesson=lesson, completed=True)
+            review = CourseReview.objects.create(student=student, course=course, rating=4, review="Great course")
+            status_update = StatusUpdate.objects.create(student=student, course=course, course_progress=50.0, text="Halfway through")
+            submission = AssignmentSubmission.objects.create(assignment=assignment, student=student, file_submission="essay.pdf")
+            notification = Notification.objects.create(user=teacher, related_course=course, content="New submission")
+            participant = ChatParticipant.objects.create(chat=chat, user=student)
+            message = ChatMessage.objects.create(chat=chat, sender=student, text="Hello")
+            attachment = ChatMessageAttachments.objects.create(chat_message=message, attachment="notes.pdf")
+
+        client = APIClient()
+        client.force_login(teacher)
+        return client, {
+            "user": {"pk": teacher.pk},
+            "user-edit": {"pk": teacher.pk},
+            "status-update-edit": {"pk": status_update.pk},
+            "status-update-delete": {"pk": status_update.pk},
+            "course": {"pk": course.pk},
+            "course-edit": {"pk": course.pk},
+            "course-review": {"pk": course.pk},
+            "course-delete": {"pk": course.pk},
+            "module-create": {"course_pk": course.pk},
+            "module-edit": {"pk": module.pk},
+            "module-delete": {"pk": module.pk},
+            "lesson-create": {"module_pk": module.pk},
+            "lesson-edit": {"pk": lesson.pk},
+            "lesson-delete": {"pk": lesson.pk},
+            "lesson-detail": {"pk": lesson.pk},
+            "lesson-file": {"pk": lesson.pk},
+            "assignment-create": {"module_pk": module.pk},
+            "assignment-edit": {"pk": assignment.pk},
+            "assignment-delete": {"pk": assignment.pk},
+            "assignment-detail": {"pk": assignment.pk},
+            "assignment-submit": {"pk": assignment.pk},
+            "assignment-submit-edit": {"pk": submission.pk},
+            "assignment-grade": {"pk": submission.pk},
+            "submission-file": {"pk": submission.pk},
+            "chat": {"pk": chat.pk},
+            "chat-attachment": {"pk": attachment.pk},
+            "api_user": {"pk": teacher.pk},
+            "api_status_updates": {"pk": student.pk},
+            "api_status_update": {"pk": status_update.pk},
+            "api_notification_read": {"pk": notification.pk},
+            "api_course": {"pk": course.pk},
+            "api_course_bundle": {"pk": course.pk},
+            "api_course_clone": {"pk": course.pk},
+            "api_enrollments": {"pk": course.pk},
+            "api_enrollment": {"pk": enrollment.pk},
+            "api_course_reviews": {"pk": course.pk},
+            "api_course_review": {"pk": review.pk},
+            "api_modules": {"pk": course.pk},
+            "api_module": {"pk": module.pk},
+            "api_lessons": {"pk": module.pk},
+            "api_lesson": {"pk": lesson.pk},
+            "api_lesson_progress": {"pk": lesson.pk},
+            "api_assignments": {"pk": module.pk},
+            "api_assignment": {"pk": assignment.pk},
+            "api_submissions": {"pk": assignment.pk},
+            "api_submission": {"pk": submission.pk},
+            "api_submission_grade": {"pk": submission.pk},
+            "api_chat": {"pk": chat.pk},
+            "api_chat_messages": {"pk": chat.pk},
+            "api_chat_message": {"pk": message.pk},
+            "api_chat_participants": {"pk": chat.pk},
+            "api_chat_participant": {"pk": participant.pk},
+            "api_async_chat_messages": {"pk": chat.pk},
+            "api_async_notification_read": {"pk": notification.pk},
+            "api_async_lesson_progress": {"pk": lesson.pk},
+        }
+
+    # So the highest rated board isn't empty, skipping its query, on the smaller dataset only
+    @override_settings(COURSE_LEADERBOARD_MIN_REVIEWS=1)
+    def test_teacher_views_run_constant_queries(self):
+        # Every route: those without arguments, and the rest with the kwargs seeded above
+        assert check_query_budgets(self.seed) == []
+
+class MetricsTests(BaseAPITestCase):
+    def test_metrics_record_requests_by_route(self):
+        self.client.force_authenticate(user=self.create_student())
+        self.client.get(reverse("api_courses"))
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        body = response.content.decode()
+        assert 'http_request_duration_seconds_count{route="api/courses/",method="GET",status="200"}' in body
+        assert 'http_request_sql_queries_bucket{route="api/courses/",le="+Inf"}' in body
+
+    def test_metrics_forbidden_outside_allowed_ips(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.7")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+class PrebuiltSchemaTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.schema_dir = self.use_temp_directory("OPENAPI_SCHEMA_DIR")
+        clear_schema_artifact()
+        self.addCleanup(clear_schema_artifact)
+
+    def test_schema_served_from_build_with_strong_etag(self):
+        assert [message.id for message in check_openapi_schema(None)] == ["elearning_app.W001"]
+        call_command("build_openapi_schema", stdout=io.StringIO())
+        assert check_openapi_schema(None) == []
+
+        response = self.client.get(reverse("schema"), {"format": "json"})
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(response.content)["info"]["title"] == "OnlineU E-Learning site API"
+        assert not response["ETag"].startswith("W/")
+        response = self.client.get(reverse("schema"), {"format": "json"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_stale_build_fails_check(self):
+        call_command("build_openapi_schema", stdout=io.StringIO())
+        manifest = json.loads((self.schema_dir / MANIFEST_NAME).read_text())
+        manifest["source_hash"] = "0" * 64
+        (self.schema_dir / MANIFEST_NAME).write_text(json.dumps(manifest))
+        assert [message.id for message in check_openapi_schema(None)] == ["elearning_app.E001"]
+
+class AsyncAPITests(BaseAPITestCase):
+    def test_async_notifications_keyset_pages_and_dismiss(self):
+        student = self.create_student()
+        course = self.create_course()
+        notifications = [NotificationFactory(user=student, related_course=course) for _ in range(3)]
+        other = NotificationFactory(user=self.create_student(), related_course=course)
+        self.client.force_login(student)
+
+        first = self.client.get(reverse("api_async_notifications"), {"page_size": 2}).json()
+        second = self.client.get(first["next"]).json()
+        assert len(first["results"]) == 2 and second["next"] is None
+        assert {item["id"] for item in first["results"] + second["results"]} == {n.pk for n in notifications}
+        assert self.client.get(reverse("api_async_notifications"), {"cursor": "bad"}).status_code == status.HTTP_400_BAD_REQUEST
+
+        response = self.client.post(reverse("api_async_notification_read", kwargs={"pk": other.pk}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        response = self.client.post(reverse("api_async_notification_read", kwargs={"pk": notifications[0].pk}))
+        assert response.status_code == status.HTTP_200_OK
+        notifications[0].refresh_from_db()
+        assert notifications[0].read is True
+
+    def test_async_views_require_authentication(self):
+        response = self.client.get(reverse("api_async_notifications"))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+    def test_async_chat_message_post(self):
+        self.use_temp_directory()
+        student = self.create_student()
+        chat = Chat.objects.create(title="Course chat", created_by=student)
+        ChatParticipant.objects.create(chat=chat, user=student)
+        url = reverse("api_async_chat_messages", kwargs={"pk": chat.pk})
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(chat_group_name(chat.pk), channel)
+
+        # Session-authenticated writes need the CSRF token, bearer tokens don't
+        client = APIClient(enforce_csrf_checks=True)
+        client.force_login(student)
+        assert client.post(url, {"text": "Hello"}, format="json").status_code == status.HTTP_403_FORBIDDEN
+        client.logout()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(student).access_token}")
+        response = client.post(url, {
+            "text": "Notes attached",
+            "attachments": [SimpleUploadedFile("a.txt", b"first"), SimpleUploadedFile("b.txt", b"second")],
+        }, format="multipart")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.json()["text"] == "Notes attached"
+        assert len(response.json()["attachments"]) == 2
+        assert ChatMessageAttachments.objects.filter(chat_message__chat=chat).count() == 2
+        event = async_to_sync(channel_layer.receive)(channel)
+        assert event == {"type": "chat_message", "message": "Notes attached", "sender_id": student.pk}
+
+        assert client.post(url, {"text": " "}, format="json").status_code == status.HTTP_400_BAD_REQUEST
+        other_chat = Chat.objects.create(title="Other chat", created_by=student)
+        response = client.post(reverse("api_async_chat_messages", kwargs={"pk": other_chat.pk}), {"text": "Hi"}, format="json")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_async_lesson_progress_put(self):
+        course = self.create_course()
+        module = ModuleFactory(course=course)
+        lesson, last_lesson = (Lesson.objects.create(module=module, title=title) for title in ("Lesson", "Last lesson"))
+        url = reverse("api_async_lesson_progress", kwargs={"pk": lesson.pk})
+        student = self.create_student()
+        self.client.force_login(student)
+        assert self.client.put(url, {"completed": True}, format="json").status_code == status.HTTP_403_FORBIDDEN
+
+        enrollment = EnrollmentFactory(student=student, course=course, status=Enrollment.EnrollmentStatus.ACTIVE)
+        assert self.client.put(url, {"completed": "yes"}, format="json").status_code == status.HTTP_400_BAD_REQUEST
+        assert self.client.put(url, {"completed": True}, format="json").status_code == status.HTTP_200_OK
+        assert self.client.put(url, {"completed": False}, format="json").status_code == status.HTTP_200_OK
+        assert LessonProgress.objects.get(student=student, lesson=lesson).completed is False
+        missing = reverse("api_async_lesson_progress", kwargs={"pk": last_lesson.pk + 1})
+        assert self.client.put(missing, {"completed": True}, format="json").status_code == status.HTTP_404_NOT_FOUND
+
+        # Completing every lesson completes the enrollment
+        for pk in (lesson.pk, last_lesson.pk):
+            response = self.client.put(reverse("api_async_lesson_progress", kwargs={"pk": pk}), {"completed": True}, format="json")
+            assert response.status_code == status.HTTP_200_OK
+        enrollment.refresh_from_db()
+        assert enrollment.status == Enrollment.EnrollmentStatus.COMPLETED
+
+        self.client.force_login(course.taught_by)
+        assert self.client.put(url, {"completed": True}, format="json").status_code == status.HTTP_403_FORBIDDEN
+
+class ProfilePictureTests(BaseAPITestCase):
+    def jpeg(self, color) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", (900, 600), color).save(buffer, format="JPEG")
+        return buffer.getvalue()
+
+    def test_resize_renders_square_variants_under_content_hash(self):
+        self.use_temp_directory()
+        user = self.create_student(profile_picture=SimpleUploadedFile("upload.jpg", self.jpeg("teal")))
+        upload = user.profile_picture.name
+
+        resize_profile_picture(user.pk)
+        user.refresh_from_db()
+        assert user.profile_picture.name == user.profile_picture_variants["jpg"]["200"]
+        assert not user.profile_picture.storage.exists(upload)
+        with Image.open(user.profile_picture.storage.open(user.profile_picture_variants["jpg"]["48"])) as image:
+            assert image.size == (48, 48)
+        assert "400w" in user.avatar_srcsets["jpg"]
+
+    def test_new_picture_clears_variants_until_rendered(self):
+        self.use_temp_directory()
+        user = self.create_student(profile_picture=SimpleUploadedFile("first.jpg", self.jpeg("teal")))
+        resize_profile_picture(user.pk)
+        user.refresh_from_db()
+        first_variants = user.profile_picture_variants
+
+        self.client.force_authenticate(user=user)
+        with mock.patch.object(resize_profile_picture, "delay") as delay:
+            response = self.client.patch(
+                reverse("api_user", kwargs={"pk": user.pk}),
+                {"profile_picture": SimpleUploadedFile("second.jpg", self.jpeg("navy"))}, format="multipart",
+            )
+        assert response.status_code == status.HTTP_200_OK
+        delay.assert_called_once_with(user.pk)
+        user.refresh_from_db()
+        assert user.profile_picture_variants == {}
+
+        resize_profile_picture(user.pk)
+        user.refresh_from_db()
+        assert user.profile_picture_variants["jpg"]["200"] != first_variants["jpg"]["200"]
+        assert not user.profile_picture.storage.exists(first_variants["jpg"]["200"])
+
+class CourseCoverTests(BaseAPITestCase):
+    def test_cover_rendered_as_variants_with_inline_placeholder(self):
+        self.use_temp_directory()
+        buffer = io.BytesIO()
+        Image.new("RGB", (1000, 800), "teal").save(buffer, format="JPEG")
+        course = self.create_course(cover_image=SimpleUploadedFile("cover.jpg", buffer.getvalue()))
+
+        process_course_cover(course.pk)
+        course.refresh_from_db()
+        # Nothing is upscaled past the 1000px upload, and the upload itself is kept
+        assert set(course.cover_image_variants["jpg"]) == {"320", "640", "960"}
+        assert course.cover_image.storage.exists(course.cover_image.name)
+        with Image.open(course.cover_image.storage.open(course.cover_image_variants["jpg"]["640"])) as image:
+            assert image.size == (640, 360)
+        assert course.cover_image_lqip.startswith("data:image/jpeg;base64,")
+        assert "960w" in course.cover_srcsets["jpg"]
+
+    def test_stale_instance_keeps_rendered_variants(self):
+        course = self.create_course()
+        stale = Course.objects.get(pk=course.pk)
+        variants = {"jpg": {"320": "covers/abc/320.jpg"}}
+        Course.objects.filter(pk=course.pk).update(cover_image_variants=variants, cover_image_lqip="data:image/jpeg;base64,")
+        stale.title = "Renamed"
+        stale.save()
+        course.refresh_from_db()
+        assert course.title == "Renamed"
+        assert course.cover_image_variants == variants
+
+class DownloadTests(BaseAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_directory(DOWNLOAD_OFFLOAD=None)
+        self.course = self.create_course()
+        self.lesson = Lesson.objects.create(
+            module=ModuleFactory(course=self.course), title="Notes", lesson_file=SimpleUploadedFile("notes.txt", b"0123456789"),
+        )
+        self.url = reverse("lesson-file", kwargs={"pk": self.lesson.pk})
+
+    def test_only_teacher_and_enrolled_students_download(self):
+        self.client.force_login(self.create_student())
+        assert self.client.get(self.url).status_code == status.HTTP_403_FORBIDDEN
+
+        self.client.force_login(EnrollmentFactory(course=self.course).student)
+        response = self.client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+        assert b"".join(response.streaming_content) == b"0123456789"
+        assert response["Accept-Ranges"] == "bytes"
+        assert "private" in response["Cache-Control"]
+
+    def test_range_requests(self):
+        self.client.force_login(self.course.taught_by)
+        response = self.client.get(self.url, headers={"Range": "bytes=2-5"})
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert b"".join(response.streaming_content) == b"2345"
+        assert response["Content-Range"] == "bytes 2-5/10"
+        etag = response["ETag"]
+
+        response = self.client.get(self.url, headers={"Range": "bytes=-3", "If-Range": etag})
+        assert b"".join(response.streaming_content) == b"789"
+        # A partial copy of another version gets the whole file
+        response = self.client.get(self.url, headers={"Range": "bytes=2-5", "If-Range": '"stale"'})
+        assert response.status_code == status.HTTP_200_OK
+        response = self.client.get(self.url, headers={"Range": "bytes=10-"})
+        assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        assert response["Content-Range"] == "bytes */10"
+        assert self.client.get(self.url, headers={"If-None-Match": etag}).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_private_files_only_linked_through_download_views(self):
+        assert self.lesson.lesson_file.name.startswith("private/lessons/")
+        self.client.force_authenticate(user=self.course.taught_by)
+        response = self.client.get(reverse("api_lesson", kwargs={"pk": self.lesson.pk}))
+        assert response.data["lesson_file"] == f"http://testserver{self.url}"
+
+        request = RequestFactory().get(f"/files/{self.lesson.lesson_file.name}")
+        for path in (self.lesson.lesson_file.name, f"public/../{self.lesson.lesson_file.name}"):
+            with self.assertRaises(Http404):
+                serve_public_media(request, path, document_root=settings.MEDIA_ROOT)
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class CourseMembersTests(BaseAPITestCase):
+    def test_membership_lives_in_shared_cache_until_enrollments_change(self):
+        course = self.create_course()
+        enrollment = EnrollmentFactory(course=course, status=Enrollment.EnrollmentStatus.ACTIVE)
+        assert get_course_members(course.pk)["students"] == {enrollment.student_id}
+        assert shared_cache().get(course_members_key(course.pk)) is not None
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.status = Enrollment.EnrollmentStatus.REMOVED
+            enrollment.save()
+        assert shared_cache().get(course_members_key(course.pk)) is None
+        assert get_course_members(course.pk)["students"] == set()
+
+    def test_live_listeners_get_membership_changes(self):
+        teacher = self.create_teacher()
+        course = self.create_course(taught_by=teacher)
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(course_live_group_name(course.pk), channel)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment = EnrollmentFactory(course=course, status=Enrollment.EnrollmentStatus.ACTIVE)
+        assert async_to_sync(channel_layer.receive)(channel)["changes"] == [[enrollment.student_id, "student"]]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            enrollment.delete()
+        assert async_to_sync(channel_layer.receive)(channel)["changes"] == [[enrollment.student_id, None]]
+
+        new_teacher = self.create_teacher()
+        get_course_members(course.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            course.taught_by = new_teacher
+            course.save()
+        assert async_to_sync(channel_layer.receive)(channel)["changes"] == [[teacher.pk, None], [new_teacher.pk, "teacher"]]
+        assert get_course_members(course.pk)["teacher"] == new_teacher.pk
+
+class GatedChatConsumer(ChatConsumer):
+    """A chat consumer whose client doesn't read anything until the gate is opened"""
+    def __init__(self, gate, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = gate
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        await self.gate.wait()
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class BufferedConsumerTests(SimpleTestCase):
+    async def connect(self, gate) -> WebsocketCommunicator:
+        application = URLRouter([re_path(r"ws/chat/(?P<chat_pk>\w+)/$", GatedChatConsumer.as_asgi(gate=gate))])
+        communicator = WebsocketCommunicator(application, "/ws/chat/1/")
+        connected, _ = await communicator.connect()
+        assert connected
+        return communicator
+
+    async def send_messages(self, *messages):
+        for message in messages:
+            await get_channel_layer().group_send(
+                chat_group_name(1), {"type": "chat_message", "message": message, "sender_id": 1}
+            )
+
+    @override_settings(WEBSOCKET_OUTBOUND_HIGH_WATER=3, WEBSOCKET_SLOW_CONSUMER_GRACE=60)
+    async def test_full_queue_drops_oldest_frames_and_sends_the_rest_as_a_batch(self):
+        gate = asyncio.Event()
+        communicator = await self.connect(gate)
+        before = outbound_metrics.snapshot()
+
+        # The writer picks up the first frame and waits on the client, the next five back up in the queue
+        await self.send_messages("0")
+        assert await communicator.receive_nothing(timeout=0.05)
+        await self.send_messages("1", "2", "3", "4", "5")
+        assert await communicator.receive_nothing(timeout=0.05)
+        assert outbound_metrics.frames_dropped - before["frames_dropped"] == 2
+        assert outbound_metrics.queue_depth - before["queue_depth"] == 3
+
+        gate.set()
+        assert json.loads(await communicator.receive_from()) == {"message": "0", "sender_id": 1}
+        assert json.loads(await communicator.receive_from()) == {
+            "type": "batch",
+            "messages": [{"message": message, "sender_id": 1} for message in ("3", "4", "5")],
+        }
+        assert outbound_metrics.batches_sent - before["batches_sent"] == 1
+        assert outbound_metrics.queue_depth == before["queue_depth"]
+        await communicator.disconnect()
+
+    @override_settings(WEBSOCKET_OUTBOUND_HIGH_WATER=2, WEBSOCKET_SLOW_CONSUMER_GRACE=0)
+    async def test_slow_client_is_closed(self):
+        communicator = await self.connect(asyncio.Event())
+        before = outbound_metrics.snapshot()
+
+        await self.send_messages("0")
+        assert await communicator.receive_nothing(timeout=0.05)
+        await self.send_messages("1", "2", "3")
+        assert await communicator.receive_nothing(timeout=0.05)
+        # Still over the high-water mark once the grace period is over
+        await self.send_messages("4")
+        assert await communicator.receive_output() == {"type": "websocket.close", "code": SLOW_CONSUMER_CLOSE_CODE}
+        assert outbound_metrics.slow_consumer_disconnects - before["slow_consumer_disconnects"] == 1
+        # One frame dropped over the high-water mark, then the two left in the queue
+        assert outbound_metrics.frames_dropped - before["frames_dropped"] == 3
+        assert outbound_metrics.queue_depth == before["queue_depth"]
+        await communicator.disconnect()
@@ -6,10 +6,12 @@ from rest_framework_simplejwt.views import (
 )
 from . import views
 from . import api
+from . import async_api
 
 urlpatterns = [
     # VIEWS
 	path("", views.HomePageView.as_view(), name="index"),
+    path("metrics", views.metrics, name="metrics"),
 
     # Users and status updates
     path("register/", views.user_registration, name="register"),
@@ -39,6 +41,7 @@ urlpatterns = [
     path("lessons/<int:pk>/edit/", login_required(login_url="/login")(views.lesson_edit), name="lesson-edit"),
     path("lessons/<int:pk>/delete/", login_required(login_url="/login")(views.lesson_delete), name="lesson-delete"),
     path("lessons/<int:pk>", login_required(login_url="/login")(views.LessonDetailView.as_view()), name="lesson-detail"),
+    path("lessons/<int:pk>/file", login_required(login_url="/login")(views.lesson_file_download), name="lesson-file"),
 
     # Assignments
     path("modules/<int:module_pk>/assignments/add/", login_required(login_url="/login")(views.assignment_create), name="assignment-create"),
@@ -48,9 +51,11 @@ urlpatterns = [
     path("assignments/<int:pk>/submit/", login_required(login_url="/login")(views.assignment_submit), name="assignment-submit"),
     path("assignments/submissions/<int:pk>/edit/", login_required(login_url="/login")(views.assignment_submit_edit), name="assignment-submit-edit"),
     path("assignments/submissions/<int:pk>/grade/", login_required(login_url="/login")(views.assignment_grade), name="assignment-grade"),
+    path("assignments/submissions/<int:pk>/file", login_required(login_url="/login")(views.submission_file_download), name="submission-file"),
 
     # Chats
     path("chats/<int:pk>", login_required(login_url="/login")(views.ChatRoomView.as_view()), name="chat"),
+    path("chats/attachments/<int:pk>", login_required(login_url="/login")(views.chat_attachment_download), name="chat-attachment"),
 
     # API
     # Tokens
@@ -64,12 +69,17 @@ urlpatterns = [
     path("api/users/", api.UserListView.as_view(), name="api_users"),
     re_path(r"^api/users(?:/(?P<pk>\d+))?/status_updates/$", api.StatusUpdateListCreateView.as_view(), name="api_status_updates"),
     path("api/users/status_updates/<int:pk>/", api.StatusUpdateDetailView.as_view(), name="api_status_update"),
+    path("api/notifications/", api.NotificationListView.as_view(), name="api_notifications"),
     path("api/notifications/<int:pk>/dismiss/", api.NotificationReadView.as_view(), name="api_notification_read"),
     path("api/users/block/", api.UserBlockView.as_view(), name="api_user_block"),
 
     # Courses, Enrollments and Reviews
     path("api/courses/", api.CourseListCreateView.as_view(), name="api_courses"),
+    path("api/courses/search/", api.CourseSearchView.as_view(), name="api_course_search"),
+    path("api/courses/trending/", api.TrendingCoursesView.as_view(), name="api_courses_trending"),
     path("api/courses/<int:pk>/", api.CourseDetailView.as_view(), name="api_course"),
+    path("api/courses/<int:pk>/bundle/", api.CourseBundleView.as_view(), name="api_course_bundle"),
+    path("api/courses/<int:pk>/clone/", api.CourseCloneView.as_view(), name="api_course_clone"),
     path("api/courses/<int:pk>/enrollments/", api.EnrollmentListCreateView.as_view(), name="api_enrollments"),
     path("api/courses/enrollments/<int:pk>/", api.EnrollmentDetailView.as_view(), name="api_enrollment"),
     path("api/courses/<int:pk>/reviews/", api.CourseReviewListCreateView.as_view(), name="api_course_reviews"),
@@ -93,9 +103,19 @@ urlpatterns = [
 
     # Chats
     path("api/chats/", api.ChatListCreateView.as_view(), name="api_chats"),
+    path("api/chats/metrics/", api.ChatMetricsView.as_view(), name="api_chat_metrics"),
     path("api/chats/<int:pk>/", api.ChatDetailView.as_view(), name="api_chat"),
     path("api/chats/<int:pk>/messages/", api.ChatMessageListCreateView.as_view(), name="api_chat_messages"),
     path("api/chats/messages/<int:pk>/", api.ChatMessageDetailView.as_view(), name="api_chat_message"),
     path("api/chats/<int:pk>/participants/", api.ChatParticipantListCreateView.as_view(), name="api_chat_participants"),
     path("api/chats/participants/<int:pk>/", api.ChatParticipantDetailView.as_view(), name="api_chat_participant"),
+
+    # Batch
+    path("api/batch/", api.BatchView.as_view(), name="api_batch"),
+
+    # Async versions of high-frequency endpoints, served on the event loop under ASGI
+    path("api/async/chats/<int:pk>/messages/", async_api.AsyncChatMessageListCreateView.as_view(), name="api_async_chat_messages"),
+    path("api/async/notifications/", async_api.AsyncNotificationListView.as_view(), name="api_async_notifications"),
+    path("api/async/notifications/<int:pk>/dismiss/", async_api.AsyncNotificationReadView.as_view(), name="api_async_notification_read"),
+    path("api/async/lessons/<int:pk>/progress/", async_api.AsyncLessonProgressView.as_view(), name="api_async_lesson_progress"),
 ]
\ No newline at end of file
@@ -1,17 +1,27 @@
+import hashlib
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login
+from django.middleware.csrf import get_token
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Count, Q, Avg, Max
-from django.db.models.functions import Coalesce
+from django.db.models import Count, Max, Q
 from django.views.generic import ListView, DetailView
-from django.contrib.auth.models import Group
 from django.core.exceptions import PermissionDenied
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_htmx.http import HttpResponseClientRefresh as HTMXRefresh, HttpResponseClientRedirect as HTMXRedirect
 from collections import defaultdict
 from .models import *
 from .forms import *
+from .caching import course_validators
+from .downloads import serve_file
+from .leaderboards import get_course_leaderboards
+from .metrics import PROMETHEUS_CONTENT_TYPE, registry as metrics_registry
+from .querybudget import query_budget
+from .search import search_courses
 
 # --- User Authentication ---
 def user_registration(request):
@@ -47,49 +57,88 @@ def user_login(request):
         form = UserLoginForm()
     return render(request, "login.html", {"login_form": form})
 
+# --- Course Catalog ---
+# Fields rendered by the course cards in course_gallery.html; everything else stays deferred
+COURSE_CARD_FIELDS = (
+    "id", "title", "description", "start_date", "end_date", "is_published",
+    "cover_image", "cover_image_variants", "cover_image_lqip",
+    "taught_by__id", "taught_by__first_name", "taught_by__last_name",
+)
+
+def course_card_queryset(queryset):
+    """Projects a course queryset down to the fields course cards render, plus their enrollment and review stats"""
+    return queryset.select_related("taught_by").only(*COURSE_CARD_FIELDS).with_stats().with_status().distinct()
+
+class CourseCatalogMixin:
+    """
+    Paginates a course card listing. HTMX requests get only the next page of cards (and its own "load more"
+    button) so the gallery can grow in place
+    """
+    paginate_by = 12
+    gallery_view = "stats"
+
+    def get_gallery_view(self):
+        return self.gallery_view
+
+    def get_template_names(self):
+        if self.request.htmx:
+            return ["components/course_cards.html"]
+        return super().get_template_names()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["gallery_view"] = self.get_gallery_view()
+        # Current filters, carried over to the "load more" request
+        query = self.request.GET.copy()
+        query.pop("page", None)
+        context["page_query"] = query.urlencode()
+        return context
+
 # --- Home Page ---
-class HomePageView(ListView):
+class HomePageView(CourseCatalogMixin, ListView):
     model = Course
     context_object_name = "courses"
     template_name = "index.html"
+    query_budget = 40
+
+    def get_gallery_view(self):
+        user = self.request.user
+        if user.is_authenticated and user.role == User.UserRole.STUDENT:
+            return "progress"
+        return "stats"
 
     def get_queryset(self):
         user = self.request.user
         blocked_by = []
         if user.is_authenticated:
             blocked_by = user.get_blocked_by()
-        queryset = Course.objects.prefetch_related(
-            "modules", "modules__lessons", "modules__assignments",
-            "enrollments__student", "status_updates"
-        ).exclude(
+        queryset = Course.objects.exclude(
             taught_by__in=blocked_by
-        ).select_related("taught_by")
-
-        user = self.request.user
-        if user.is_authenticated:
-            if user.role == User.UserRole.STUDENT:
-                queryset = queryset.filter(enrollments__student=user)
-            elif user.role == User.UserRole.TEACHER:
-                queryset = queryset.filter(taught_by=user)
-        else:
-            queryset = queryset.filter(is_published=True)
-
-        queryset = queryset.annotate(
-            students_enrolled_count=Count(
-                "enrollments__student", 
-                filter=Q(enrollments__status=Enrollment.EnrollmentStatus.ACTIVE),
-                distinct=True
-            ),
-            average_rating=Coalesce(Avg("course_reviews__rating"), 0.0),
-            review_count=Count("course_reviews", distinct=True)
         )
-        return queryset.distinct()
+
+        if not user.is_authenticated:
+            # Anonymous visitors get the precomputed leaderboards instead (see get_context_data)
+            return Course.objects.none()
+        if user.role == User.UserRole.STUDENT:
+            queryset = queryset.filter(enrollments__student=user)
+        elif user.role == User.UserRole.TEACHER:
+            queryset = queryset.filter(taught_by=user)
+
+        return course_card_queryset(queryset).order_by("-created_at", "-pk")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        courses = context["courses"]
 
+        if user.is_authenticated and user.role == User.UserRole.STUDENT:
+            progress = get_course_progress(context["courses"], [user])
+            for course in context["courses"]:
+                course.user_progress = round(progress[course.pk, user.pk], 1)
+        if self.request.htmx:
+            return context
+
+        # The feed covers all of the user's courses, not just the page of cards shown
+        courses = self.object_list
         if user.is_authenticated:
             blocked_users = user.get_blocked_users()
             context["chats"] = Chat.objects.filter(
@@ -98,7 +147,7 @@ class HomePageView(ListView):
                 participants__user__in=blocked_users
             ).annotate(
                 last_message_time=Max("messages__sent_at")
-            ).order_by("-last_message_time", "-created_at")[:3]
+            ).order_by("-last_message_time", "-created_at").with_last_message()[:3]
             context["more_chats"] = (
                 Chat.objects.filter(participants__user=user, is_active=True).count() > 3
             )
@@ -112,12 +161,10 @@ class HomePageView(ListView):
                 user=user,
                 read=False
             ).order_by("-created_at")
-            if user.role == User.UserRole.STUDENT:
-                for course in courses:
-                    course.user_progress = round(course.get_user_progress(user), 1)
         else:
-            teacher_group, _ = Group.objects.get_or_create(name=User.UserRole.TEACHER)
-            context["teachers"] = teacher_group.user_set.all()
+            leaderboards = get_course_leaderboards()
+            context["leaderboards"] = leaderboards
+            context["teachers"] = leaderboards["teachers"]
 
         return context
 
@@ -126,6 +173,7 @@ class UserDetailView(DetailView):
     model = User
     context_object_name = "profile_user"
     template_name = "user_profile.html"
+    query_budget = 25
 
     def dispatch(self, request, *args, **kwargs):
         profile_user = get_object_or_404(User, pk=kwargs.get("pk"))
@@ -148,15 +196,7 @@ class UserDetailView(DetailView):
         if profile_user.role == User.UserRole.TEACHER:
             context["courses"] = Course.objects.filter(
                 taught_by=profile_user
-            ).annotate(
-                students_enrolled_count=Count(
-                    "enrollments__student", 
-                    filter=Q(enrollments__status=Enrollment.EnrollmentStatus.ACTIVE),
-                    distinct=True
-                ),
-                average_rating=Coalesce(Avg("course_reviews__rating"), 0.0),
-                review_count=Count("course_reviews", distinct=True)
-            )
+            ).with_stats().with_status()
         elif profile_user.role == User.UserRole.STUDENT:
             context["profile_user"].is_blocked = UserBlock.objects.filter(
                 blocked_user=profile_user,
@@ -168,24 +208,28 @@ class UserDetailView(DetailView):
             context["courses"] = Course.objects.filter(
                 enrollments__student=profile_user
             )
-            for course in context["courses"]:
-                course.user_progress = round(course.get_user_progress(profile_user), 1)
 
         if profile_user != self.request.user:
             context["courses"] = context["courses"].filter(is_published=True)
+        if profile_user.role == User.UserRole.STUDENT:
+            context["courses"] = list(context["courses"])
+            progress = get_course_progress(context["courses"], [profile_user])
+            for course in context["courses"]:
+                course.user_progress = round(progress[course.pk, profile_user.pk], 1)
         return context
     
 class UserListView(ListView):
     model = User
     context_object_name = "users"
     template_name = "users.html"
+    query_budget = 20
 
     def get_queryset(self):
         query = self.request.GET.get("query")
-        queryset = User.objects.exclude(is_staff=True)
+        queryset = User.objects.with_role().exclude(is_staff=True)
         if query:
             queryset = queryset.filter(
-                title__icontains=query
+                Q(first_name__icontains=query) | Q(last_name__icontains=query) | Q(email__icontains=query)
             )
 
         return queryset
@@ -213,6 +257,7 @@ def user_edit(request, pk):
     return render(request, "components/forms/user_form.html", {"user_form": form, "user": user})
 
 # --- Status Updates ---
+@query_budget(15)
 def status_update_create(request):
     course_id = request.GET.get("course")
     initial = {}
@@ -255,10 +300,11 @@ def status_update_delete(request, pk):
     return render(request, "components/forms/status_update_delete.html", {"status_update": status_update})
 
 # --- Courses ---
-class CourseListView(ListView):
+class CourseListView(CourseCatalogMixin, ListView):
     model = Course
     context_object_name = "courses"
     template_name = "courses.html"
+    query_budget = 20
 
     def get_queryset(self):
         query = self.request.GET.get("query")
@@ -268,39 +314,55 @@ class CourseListView(ListView):
         if user.is_authenticated:
             blocked_by = user.get_blocked_by()
         
-        queryset = Course.objects.prefetch_related(
-            "modules", "modules__lessons", "modules__assignments",
-            "enrollments__student", "status_updates"
-        ).filter(
+        queryset = Course.objects.filter(
             is_published=True,
             end_date__gte=today
-        ).select_related("taught_by")
+        )
 
         if blocked_by:
             queryset = queryset.exclude(
                 taught_by__in=blocked_by
             )
+        course_status = self.request.GET.get("status")
+        if course_status in ("upcoming", "ongoing"):
+            queryset = queryset.filter_status(course_status)
         if query:
-            queryset = queryset.filter(
-                title__icontains=query
+            return course_card_queryset(search_courses(queryset, query))
+        return course_card_queryset(queryset).order_by("-created_at", "-pk")
+
+def _course_page_validators(request, pk):
+    """
+    Course validators plus what the page renders for the viewer, computed once per request: the CSRF secret the
+    header's HTMX requests send (rotated on login), the viewer's name and avatar and their unread notifications
+    for the course
+    """
+    if not hasattr(request, "_course_page_validators"):
+        validators = course_validators(pk=pk)
+        if validators is not None:
+            get_token(request)
+            validators["etag"] += f"-{request.META['CSRF_COOKIE']}"
+        if validators is not None and request.user.is_authenticated:
+            user = request.user
+            unread = Notification.objects.filter(related_course_id=pk, user=user, read=False).aggregate(
+                count=Count("pk"), latest=Max("pk")
             )
+            validators["etag"] += f"-{user.pk}-{user.full_name}-{user.profile_picture.name}-{unread['count']}-{unread['latest']}"
+        request._course_page_validators = validators
+    return request._course_page_validators
 
-        queryset = queryset.annotate(
-            students_enrolled_count=Count(
-                "enrollments__student", 
-                filter=Q(enrollments__status=Enrollment.EnrollmentStatus.ACTIVE),
-                distinct=True
-            ),
-            average_rating=Coalesce(Avg("course_reviews__rating"), 0.0),
-            review_count=Count("course_reviews", distinct=True)
-        ).distinct()
+def course_page_etag(request, pk):
+    validators = _course_page_validators(request, pk)
+    return validators and hashlib.md5(validators["etag"].encode()).hexdigest()
 
-        return queryset
+def course_page_last_modified(request, pk):
+    validators = _course_page_validators(request, pk)
+    return validators and validators["last_modified"]
 
 class CourseDetailView(DetailView):
     model = Course
     context_object_name = "course"
     template_name = "course.html"
+    query_budget = 40
 
     def dispatch(self, request, *args, **kwargs):
         course = get_object_or_404(Course, pk=kwargs.get("pk"))
@@ -311,21 +373,16 @@ class CourseDetailView(DetailView):
         
         return super().dispatch(request, *args, **kwargs)
 
+    @method_decorator(condition(etag_func=course_page_etag, last_modified_func=course_page_last_modified))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
+        # The syllabus is rendered from a cached fragment, which prefetches modules only on a cache miss
         queryset = Course.objects.prefetch_related(
-            "modules", "modules__lessons", "modules__assignments",
-            "enrollments", "enrollments__student", "status_updates", "course_reviews"
+            "enrollments", "enrollments__student", "status_updates", "course_reviews", "course_reviews__student"
         ).select_related("taught_by")
-        queryset = queryset.annotate(
-            students_enrolled_count=Count(
-                "enrollments__student", 
-                filter=Q(enrollments__status=Enrollment.EnrollmentStatus.ACTIVE),
-                distinct=True
-            ),
-            average_rating=Coalesce(Avg("course_reviews__rating"), 0.0),
-            review_count=Count("course_reviews", distinct=True)
-        )
-        return queryset.distinct()
+        return queryset.with_stats().with_status()
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -336,7 +393,7 @@ class CourseDetailView(DetailView):
                 course.user_progress = round(course.get_user_progress(user), 1)
                 context["user_enrollment"] = user.get_enrollment(course)
                 context["completed_lessons"] = list(user.get_lessons_completed(course).values_list("pk", flat=True))
-                context["submitted_assignments"] = {s.assignment.pk: s for s in user.get_assignments_submitted(course)}
+                context["submitted_assignments"] = {s.assignment_id: s for s in user.get_assignments_submitted(course)}
                 context["user_reviewed"] = course.course_reviews.filter(student=user).exists()
                 context["status_updates"] = StatusUpdate.objects.filter(
                     course=course
@@ -349,11 +406,12 @@ class CourseDetailView(DetailView):
                     student__in=blocked_users
                 ).select_related("assignment", "student").order_by("submitted_on")
                 enrollments = course.enrollments.all()
+                progress = course.get_students_progress([enrollment.student_id for enrollment in enrollments])
                 status_groups = defaultdict(list)
                 for enrollment in enrollments:
                     student = enrollment.student
                     student.enrollment = enrollment
-                    student.course_progress = round(course.get_user_progress(student), 1)
+                    student.course_progress = round(progress[student.pk], 1)
                     status_groups[enrollment.status].append(student)
                 context["enrolled_students"] = [
                     ("Active", status_groups.get(Enrollment.EnrollmentStatus.ACTIVE, [])),
@@ -374,6 +432,7 @@ class LessonDetailView(DetailView):
     model = Lesson
     content_object_name = "lesson"
     template_name = "course_element.html"
+    query_budget = 25
 
     def dispatch(self, request, *args, **kwargs):
         lesson = get_object_or_404(Lesson, pk=kwargs.get("pk"))
@@ -405,7 +464,7 @@ class LessonDetailView(DetailView):
         context["course"] = course
         if user.role == User.UserRole.STUDENT:
             context["completed_lessons"] = list(user.get_lessons_completed(course).values_list("pk", flat=True))
-            context["submitted_assignments"] = {s.assignment.pk: s for s in user.get_assignments_submitted(course)}
+            context["submitted_assignments"] = {s.assignment_id: s for s in user.get_assignments_submitted(course)}
 
         return context
 
@@ -413,6 +472,7 @@ class AssignmentDetailView(DetailView):
     model = Assignment
     content_object_name = "assignment"
     template_name = "course_element.html"
+    query_budget = 25
 
     def dispatch(self, request, *args, **kwargs):
         assignment = get_object_or_404(Assignment, pk=kwargs.get("pk"))
@@ -437,7 +497,7 @@ class AssignmentDetailView(DetailView):
         context["course"] = course
         if user.role == User.UserRole.STUDENT:
             context["completed_lessons"] = list(user.get_lessons_completed(course).values_list("pk", flat=True))
-            submitted_assignments = {s.assignment.pk: s for s in user.get_assignments_submitted(course)}
+            submitted_assignments = {s.assignment_id: s for s in user.get_assignments_submitted(course)}
             context["submitted_assignments"] = submitted_assignments
             if assignment.pk in submitted_assignments:
                 context["submission"] = AssignmentSubmission.objects.get(student=user, assignment=assignment)
@@ -449,9 +509,8 @@ def course_create(request):
     if request.method == "POST":
         form = CourseForm(request.POST, request.FILES)
         if form.is_valid():
-            course = form.save(commit=False)
-            course.taught_by = request.user
-            course.save()
+            form.instance.taught_by = request.user
+            course = form.save()
             return HTMXRedirect(f"courses/{course.pk}")
     else:
         form = CourseForm()
@@ -608,6 +667,7 @@ def assignment_delete(request, pk):
     
     return render(request, "components/forms/assignment_delete.html", {"assignment": assignment})
 
+@query_budget(20)
 def assignment_submit(request, pk):
     assignment = get_object_or_404(Assignment, pk=pk)
     user = request.user
@@ -641,6 +701,7 @@ def assignment_submit_edit(request, pk):
         form = AssignmentSubmissionForm(instance=submission)
     return render(request, "components/forms/submit_assignment_form.html", {"submission_form": form, "mode": "edit", "submission": submission})
 
+@query_budget(20)
 def assignment_grade(request, pk):
     submission = get_object_or_404(AssignmentSubmission, pk=pk)
     if submission.assignment.module.course.taught_by != request.user:
@@ -660,23 +721,65 @@ class ChatRoomView(DetailView):
     model = Chat
     context_object_name = "chat"
     template_name = "chat_room.html"
+    query_budget = 20
 
     def dispatch(self, request, *args, **kwargs):
         chat = get_object_or_404(Chat, pk=kwargs.get("pk"))
-        participants = chat.participants.all()
-        if request.user not in [p.user for p in participants]:
+        if not request.user.is_authenticated or not chat.participants.filter(user=request.user).exists():
             return redirect("/")
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         blocked_users = self.request.user.get_blocked_users()
-        context["messages"] = ChatMessage.objects.filter(chat=context["chat"])
+        context["messages"] = ChatMessage.objects.filter(
+            chat=context["chat"]
+        ).select_related("sender").prefetch_related("attachments")
         context["chats"] = Chat.objects.filter(
             participants__user=self.request.user, is_active=True
         ).exclude(
             participants__user__in=blocked_users
-        )
+        ).with_last_message()
         return context
 
-
+# --- Downloads ---
+def can_access_course_files(user, course) -> bool:
+    """The course's teacher, and its students with an active or completed enrollment the teacher hasn't blocked"""
+    if user.pk == course.taught_by_id:
+        return True
+    return Enrollment.objects.filter(
+        course=course,
+        student=user,
+        status__in=(Enrollment.EnrollmentStatus.ACTIVE, Enrollment.EnrollmentStatus.COMPLETED),
+    ).exclude(student__blocked_users__blocked_by=course.taught_by_id).exists()
+
+@query_budget(4)
+def lesson_file_download(request, pk):
+    lesson = get_object_or_404(Lesson.objects.select_related("module__course"), pk=pk)
+    if not lesson.lesson_file:
+        raise Http404("Lesson has no file")
+    if not can_access_course_files(request.user, lesson.module.course):
+        raise PermissionDenied("Only the course's teacher and students can download its lessons")
+    return serve_file(request, lesson.lesson_file)
+
+@query_budget(4)
+def submission_file_download(request, pk):
+    submission = get_object_or_404(AssignmentSubmission.objects.select_related("assignment__module__course"), pk=pk)
+    if request.user.pk not in (submission.student_id, submission.assignment.module.course.taught_by_id):
+        raise PermissionDenied("Only the student who submitted it and the course's teacher can download a submission")
+    return serve_file(request, submission.file_submission)
+
+@query_budget(4)
+def chat_attachment_download(request, pk):
+    attachment = get_object_or_404(ChatMessageAttachments.objects.select_related("chat_message"), pk=pk)
+    if not ChatParticipant.objects.filter(chat_id=attachment.chat_message.chat_id, user=request.user).exists():
+        raise PermissionDenied("Only the chat's participants can download its attachments")
+    return serve_file(request, attachment.attachment)
+
+# --- Metrics ---
+def metrics(request):
+    """This process's metrics in the Prometheus text format, for scrapers on METRICS_ALLOWED_IPS or staff"""
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ("127.0.0.1", "::1"))
+    if request.META.get("REMOTE_ADDR") not in allowed_ips and not request.user.is_staff:
+        raise PermissionDenied("Metrics are only served to allowed addresses and staff")
+    return HttpResponse(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
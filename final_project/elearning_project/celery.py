@@ -16,4 +16,8 @@ app.conf.beat_schedule = {
         'task': 'yourapp.tasks.notify_upcoming_assignment_deadlines',
         'schedule': crontab(hour=0, minute=0),  # every day at midnight
     },
+    'refresh-course-leaderboards': {
+        'task': 'elearning_app.tasks.refresh_course_leaderboards',
+        'schedule': crontab(minute='*/10'),  # every 10 minutes
+    },
 }
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+from importlib.util import find_spec
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -30,6 +31,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     "rest_framework",
     "channels",
@@ -42,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "elearning_app.metrics.MetricsMiddleware",
+    "elearning_app.querybudget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -57,9 +61,41 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-    )
+    ),
+    "DEFAULT_PAGINATION_CLASS": "elearning_app.pagination.CreatedCursorPagination",
+    # orjson-backed JSON (see elearning_app.renderers), MessagePack when a client sends Accept: application/msgpack
+    "DEFAULT_RENDERER_CLASSES": (
+        "elearning_app.renderers.FastJSONRenderer",
+        *(("elearning_app.renderers.MessagePackRenderer",) if find_spec("msgpack") else ()),
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "elearning_app.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
 }
 
+# API list pagination (see elearning_app.pagination)
+API_PAGE_SIZE = 25  # items per page unless the client asks for ?page_size=
+API_MAX_PAGE_SIZE = 100  # upper bound for ?page_size=
+API_BATCH_MAX_REQUESTS = 20  # sub-requests accepted by a single POST /api/batch/
+
+# Query budgets (see elearning_app.querybudget)
+QUERY_BUDGET_ENABLED = DEBUG  # count each request's queries and flag views over their budget
+QUERY_BUDGET_STRICT = False  # raise QueryBudgetExceeded instead of logging a warning
+QUERY_BUDGET_DEFAULT = 50  # budget of views that don't declare one
+QUERY_BUDGET_DUPLICATE_THRESHOLD = 3  # runs of the same query fingerprint reported as a likely N+1
+
+# Prometheus metrics (see elearning_app.metrics), served at /metrics by each web process
+METRICS_ENABLED = True  # record per-route latency and SQL histograms
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]  # scrapers allowed without a staff session
+METRICS_CELERY_PORT = None  # e.g. 9808: each Celery pool process serves its metrics on the first free port from here
+METRICS_CELERY_PORTS = 16  # ports tried from METRICS_CELERY_PORT, one per pool process
+
+# Prebuilt OpenAPI schema (see elearning_app.schema), generated at deploy time by `manage.py build_openapi_schema`
+OPENAPI_SCHEMA_DIR = BASE_DIR / "openapi"  # None always generates the schema live
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "OnlineU E-Learning site API",
     "DESCRIPTION": "API documentation for the E-Learning platform OnlineU.",
@@ -105,6 +141,31 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Shared API responses (see elearning_app.mixins.ResponseCacheMixin), least recently used evicted first
+    "api": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "api-responses",
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    # Values one process writes and every other web, Daphne and Celery process must see, like course
+    # memberships and the leaderboards (see elearning_app.caching.shared_cache)
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL"),
+    } if os.environ.get("REDIS_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -142,6 +203,23 @@ USE_TZ = True
 STATIC_URL = "static/"
 MEDIA_ROOT = BASE_DIR / "files"
 MEDIA_URL = "/files/"
+# Lesson files, submissions and chat attachments are uploaded under MEDIA_ROOT/private/ and only served by the
+# download views: the web server serving MEDIA_URL must deny it, e.g. nginx's location /files/private/ { return 404; }
+
+# Profile picture variants rendered by tasks.resize_profile_picture (see elearning_app.images)
+AVATAR_SIZES = (48, 96, 200, 400)  # square widths in pixels, each stored as WebP and JPEG
+AVATAR_DEFAULT_SIZE = 200  # the JPEG variant User.profile_picture points at
+AVATAR_QUALITY = {"WEBP": 80, "JPEG": 85}
+
+# Course cover variants rendered by tasks.process_course_cover, cropped to 16:9 (see elearning_app.images)
+COVER_WIDTHS = (320, 640, 960, 1280)  # each stored as WebP and JPEG, none wider than the upload
+COVER_QUALITY = {"WEBP": 80, "JPEG": 85}
+
+# Authorized downloads of lesson files, submissions and chat attachments (see elearning_app.downloads)
+DOWNLOAD_OFFLOAD = None  # "x-accel-redirect" (nginx) or "x-sendfile" (Apache, lighttpd) to have the web server send the file
+DOWNLOAD_ACCEL_PREFIX = "/protected-files/"  # internal nginx location aliasing MEDIA_ROOT, for x-accel-redirect
+DOWNLOAD_CHUNK_SIZE = 256 * 1024  # bytes per read when Django streams the file itself
+DOWNLOAD_MAX_AGE = 60 * 60  # seconds a browser may reuse a download before revalidating it
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -163,5 +241,17 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Per-connection outbound websocket queues (see elearning_app.consumers)
+WEBSOCKET_OUTBOUND_HIGH_WATER = 100  # frames queued per connection before the oldest are dropped
+WEBSOCKET_OUTBOUND_MAX_BATCH = 50  # frames coalesced into a single batch frame
+WEBSOCKET_SLOW_CONSUMER_GRACE = 5.0  # seconds a connection may stay over the high-water mark
+
+# Course leaderboards precomputed by elearning_app.tasks.refresh_course_leaderboards
+COURSE_LEADERBOARD_SIZE = 12  # courses per leaderboard
+COURSE_LEADERBOARD_MIN_REVIEWS = 3  # reviews a course needs to be ranked as highest rated
+
+# Course bundle import (see elearning_app.bundles)
+COURSE_BUNDLE_MAX_BYTES = 500 * 1024 * 1024  # uncompressed size a ZIP bundle may unpack to
+
 CSRF_TRUSTED_ORIGINS = ["https://awd-final-cbg1.onrender.com"]
 CSRF_COOKIE_SECURE = True
\ No newline at end of file
@@ -2,11 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from elearning_app.api import SchemaView, SwaggerView
+from elearning_app.downloads import serve_public_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
 	path("", include("elearning_app.urls")),
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
-    path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    path("api/schema/", SchemaView.as_view(), name="schema"),
+    path("api/docs/", SwaggerView.as_view(url_name="schema"), name="swagger-ui"),
+] + static(settings.MEDIA_URL, view=serve_public_media, document_root=settings.MEDIA_ROOT)
\ No newline at end of file